@@ -0,0 +1,191 @@
+"""Static asset build and serving.
+
+    python assets.py            # after `npm run build`; writes static/dist/
+
+The build copies the app's CSS and JS under content-hashed names
+(js/app.3f2a9c1b04de.js), rewrites the references to them in the HTML
+pages and the service worker, names the service worker's cache after the
+build, and writes gzip (and, with the brotli package, br) variants of
+every text file next to it. static/dist/assets.json records what was
+built.
+
+StaticAssets serves static/dist/ in front of static/: a request for
+/static/js/app.3f2a9c1b04de.js gets the stored br or gzip file the client
+accepts, marked immutable because its name changes with its content.
+Everything else is served with no-cache and revalidated by ETag. With no
+build (or DEBUG=True) the source files are served as they are.
+"""
+import argparse
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+
+import anyio
+from fastapi import HTTPException
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+import compression
+
+SOURCE_DIR = "static"
+BUILD_DIR = os.path.join(SOURCE_DIR, "dist")
+MANIFEST = "assets.json"
+
+# Fingerprinted and referenced as /static/<path> from the pages and the worker
+FINGERPRINTED = ("css/output.css", "js/app.js")
+PAGES = ("index.html", "login.html")
+SERVICE_WORKER = "sw.js"
+COMPRESSIBLE = {".css", ".js", ".html", ".json", ".svg", ".txt"}
+SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+CACHE_NAME_RE = re.compile(r"const CACHE_NAME = '[^']*';")
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def _hashed_name(path, data):
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.{_digest(data)}{ext}"
+
+
+def _write(out, path, data):
+    """Write `data` and whichever compressed variants are smaller; returns their encodings."""
+    target = os.path.join(out, path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with open(target, "wb") as f:
+        f.write(data)
+    if os.path.splitext(path)[1] not in COMPRESSIBLE:
+        return []
+
+    encodings = []
+    for encoding, body in compression.compress(data).items():
+        if len(body) < len(data):
+            with open(target + SUFFIXES[encoding], "wb") as f:
+                f.write(body)
+            encodings.append(encoding)
+    return encodings
+
+
+def _rewrite(text, urls):
+    for source, built in urls.items():
+        text = text.replace(f"/static/{source}", f"/static/{built}")
+    return text
+
+
+def build(source=SOURCE_DIR, out=BUILD_DIR):
+    """Build `source` into `out`, replacing any earlier build; returns the manifest."""
+    def read(path):
+        with open(os.path.join(source, path), "rb") as f:
+            return f.read()
+
+    missing = [p for p in (*FINGERPRINTED, *PAGES, SERVICE_WORKER) if not os.path.exists(os.path.join(source, p))]
+    if missing:
+        raise SystemExit(f"Missing {', '.join(missing)} in {source} (run `npm run build` first for the CSS)")
+
+    # Build next to the live directory and swap it in, so a running server
+    # never sees half a build
+    staging = out + ".tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    files = {}
+    urls = {}
+    for path in FINGERPRINTED:
+        data = read(path)
+        urls[path] = _hashed_name(path, data)
+        files[urls[path]] = _write(staging, urls[path], data)
+
+    pages = {path: _rewrite(read(path).decode(), urls).encode() for path in PAGES}
+    version = _digest(b"".join(urls[p].encode() for p in FINGERPRINTED) + b"".join(pages.values()))
+    for path, data in pages.items():
+        files[path] = _write(staging, path, data)
+
+    worker, found = CACHE_NAME_RE.subn(f"const CACHE_NAME = 'foodmapper-{version}';", read(SERVICE_WORKER).decode())
+    if not found:
+        raise SystemExit(f"No CACHE_NAME declaration in {SERVICE_WORKER}")
+    files[SERVICE_WORKER] = _write(staging, SERVICE_WORKER, _rewrite(worker, urls).encode())
+
+    manifest = {"version": version, "assets": urls, "files": files}
+    with open(os.path.join(staging, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    shutil.rmtree(out, ignore_errors=True)
+    os.rename(staging, out)
+    return manifest
+
+
+def load_manifest(build_dir):
+    try:
+        with open(os.path.join(build_dir, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+class StaticAssets(StaticFiles):
+    """StaticFiles that prefers a build directory and its precompressed variants."""
+
+    def __init__(self, *, directory=SOURCE_DIR, build_dir=BUILD_DIR, **kwargs):
+        super().__init__(directory=directory, **kwargs)
+        self.build_dir = None
+        self.immutable = set()
+        self.manifest = load_manifest(build_dir) if build_dir else None
+        if self.manifest is not None:
+            self.build_dir = os.path.realpath(build_dir)
+            self.all_directories = [build_dir, *self.all_directories]
+            self.immutable = set(self.manifest["assets"].values())
+            print(f"Static assets: serving build {self.manifest['version']} from {build_dir}")
+
+    def _built_path(self, full_path):
+        # Path relative to the build directory, or None for source files
+        if self.build_dir is None:
+            return None
+        relative = os.path.relpath(os.path.realpath(full_path), self.build_dir)
+        return None if relative.startswith("..") else relative.replace(os.sep, "/")
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        request_headers = Headers(scope=scope)
+        built = self._built_path(full_path)
+        encodings = self.manifest["files"].get(built, []) if built is not None else []
+        media_type = mimetypes.guess_type(str(full_path))[0] or "text/plain"
+
+        headers = {"Cache-Control": IMMUTABLE if built in self.immutable else REVALIDATE}
+        if encodings:
+            headers["Vary"] = "Accept-Encoding"
+            encoding = compression.negotiate(request_headers.get("accept-encoding", ""), encodings)
+            if encoding is not None:
+                full_path = f"{full_path}{SUFFIXES[encoding]}"
+                stat_result = os.stat(full_path)
+                headers["Content-Encoding"] = encoding
+
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result,
+                                media_type=media_type, headers=headers)
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+    async def page(self, request, path):
+        """Serve `path` for an app route (/, /share/..., /sw.js) the way /static/<path> would be."""
+        full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path)
+        if stat_result is None:
+            raise HTTPException(status_code=404)
+        return self.file_response(full_path, stat_result, request.scope)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--source", default=SOURCE_DIR)
+    parser.add_argument("--out", default=BUILD_DIR)
+    args = parser.parse_args()
+    manifest = build(args.source, args.out)
+    print(f"Built {len(manifest['files'])} files into {args.out} (version {manifest['version']})")
+    for path, encodings in sorted(manifest["files"].items()):
+        size = os.path.getsize(os.path.join(args.out, path))
+        variants = ", ".join(f"{e} {os.path.getsize(os.path.join(args.out, path + SUFFIXES[e]))}" for e in encodings)
+        print(f"  {path}: {size} bytes" + (f" ({variants})" if variants else ""))
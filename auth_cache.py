@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from sqlalchemy import event, inspect
+
+import models
+
+# What request handlers need to know about the signed-in user. Plain
+# values rather than a User row, so it outlives the session it came from.
+Principal = namedtuple("Principal", "id username email")
+
+TTL_SECONDS = 300  # Upper bound on how stale a cached principal can get
+MAX_ENTRIES = 10000
+
+_entries = OrderedDict()  # token -> (principal, expires_at)
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+
+def get(token):
+    """Cached principal for an already-verified token, or None."""
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(token)
+        if entry is None or entry[1] <= now:
+            if entry is not None:
+                del _entries[token]
+            _stats["misses"] += 1
+            return None
+        _entries.move_to_end(token)
+        _stats["hits"] += 1
+        return entry[0]
+
+
+def put(token, user, token_exp=None):
+    """Cache `user` under `token` until the TTL or the token's own expiry."""
+    principal = Principal(user.id, user.username, user.email)
+    ttl = TTL_SECONDS
+    if token_exp is not None:
+        ttl = min(ttl, token_exp - time.time())
+    if ttl <= 0:
+        return principal
+    with _lock:
+        _entries[token] = (principal, time.monotonic() + ttl)
+        _entries.move_to_end(token)
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+            _stats["evictions"] += 1
+    return principal
+
+
+def invalidate_token(token):
+    with _lock:
+        if _entries.pop(token, None) is not None:
+            _stats["invalidations"] += 1
+
+
+def invalidate_user(username):
+    """Drop every cached token that resolves to `username`."""
+    with _lock:
+        stale = [token for token, (principal, _) in _entries.items() if principal.username == username]
+        for token in stale:
+            del _entries[token]
+        _stats["invalidations"] += len(stale)
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+
+
+def stats():
+    with _lock:
+        return {**_stats, "size": len(_entries), "max_entries": MAX_ENTRIES, "ttl_seconds": TTL_SECONDS}
+
+
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _user_changed(mapper, connection, user):
+    invalidate_user(user.username)
+    # On a rename the cached tokens still carry the old username
+    renamed_from = inspect(user).attrs.username.history.deleted
+    if renamed_from and renamed_from[0] != user.username:
+        invalidate_user(renamed_from[0])
@@ -0,0 +1,182 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import struct
+import tempfile
+import time
+import uuid
+import zlib
+
+# Manifests (per-page hashes) of recent backups, so a later incremental
+# backup can tell which pages changed. Snapshots themselves are never kept.
+BACKUP_DIR = os.getenv("BACKUP_DIR", "./backups")
+KEEP_MANIFESTS = 10
+PAGES_PER_STEP = 1024  # Pages copied per backup step (4 MiB at the default page size)
+CHUNK_SIZE = 1024 * 1024
+DELTA_FORMAT = "foodmapper-delta-1"
+
+
+def _manifest_path(backup_id):
+    return os.path.join(BACKUP_DIR, f"{backup_id}.manifest")
+
+
+def _valid_id(backup_id):
+    return bool(backup_id) and all(c.isalnum() or c == "-" for c in backup_id)
+
+
+def snapshot(db_path, dest_path):
+    """Copy a consistent snapshot of the live database to dest_path.
+
+    Uses the online backup API in PAGES_PER_STEP steps. The source
+    connection holds one read transaction for the whole copy: under WAL
+    that pins a snapshot without blocking writers, and it stops the
+    backup from restarting each time another connection commits.
+    """
+    src = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    dst = sqlite3.connect(dest_path)
+    try:
+        src.execute("BEGIN")
+        src.execute("SELECT count(*) FROM sqlite_master").fetchone()
+        src.backup(dst, pages=PAGES_PER_STEP)
+        src.rollback()
+        # The copy is a standalone file: no -wal sidecar needed to read it
+        dst.execute("PRAGMA journal_mode = DELETE")
+        return dst.execute("PRAGMA page_size").fetchone()[0]
+    finally:
+        dst.close()
+        src.close()
+
+
+def _page_hash(page):
+    return hashlib.blake2b(page, digest_size=8).hexdigest()
+
+
+def save_manifest(backup_id, page_size, hashes):
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    with open(_manifest_path(backup_id), "w") as f:
+        json.dump({"backup_id": backup_id, "created": time.time(), "page_size": page_size, "pages": hashes}, f)
+    manifests = sorted(
+        (os.path.join(BACKUP_DIR, name) for name in os.listdir(BACKUP_DIR) if name.endswith(".manifest")),
+        key=os.path.getmtime,
+    )
+    for old in manifests[:-KEEP_MANIFESTS]:
+        os.remove(old)
+
+
+def load_manifest(backup_id):
+    """The manifest of a previous backup, or None if unknown or expired."""
+    if not _valid_id(backup_id) or not os.path.exists(_manifest_path(backup_id)):
+        return None
+    with open(_manifest_path(backup_id)) as f:
+        return json.load(f)
+
+
+def _gzip_stream(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _pages(path, page_size):
+    with open(path, "rb") as f:
+        while True:
+            page = f.read(page_size)
+            if not page:
+                return
+            yield page
+
+
+def _hashed_chunks(path, page_size, hashes, old, header):
+    # Pages are hashed as they are sent: a full backup sends every page,
+    # a delta (old = the base's hashes) only those whose hash differs
+    if header is not None:
+        yield (json.dumps(header) + "\n").encode()
+    chunk = bytearray()
+    for page_no, page in enumerate(_pages(path, page_size)):
+        digest = _page_hash(page)
+        hashes.append(digest)
+        if old is None:
+            chunk += page
+        elif page_no >= len(old) or old[page_no] != digest:
+            chunk += struct.pack(">I", page_no) + page
+        if len(chunk) >= CHUNK_SIZE:
+            yield bytes(chunk)
+            chunk.clear()
+    if chunk:
+        yield bytes(chunk)
+
+
+def create_backup(db_path, since=None):
+    """Snapshot the database and return (backup_id, kind, gzip chunk iterator).
+
+    kind is "full" (a gzipped SQLite file), or "incremental" when `since`
+    names a known earlier backup: a gzipped delta holding only the pages
+    whose hash changed (see apply_delta). The snapshot lives in a temp
+    directory that is removed once the iterator is exhausted or closed.
+    Pages are hashed while they stream, and the manifest is saved only
+    once the last one is sent, so an interrupted download never becomes
+    the base of a later delta.
+    """
+    base = load_manifest(since) if since else None
+    if since and base is None:
+        raise KeyError(since)
+
+    workdir = tempfile.mkdtemp(prefix="foodmapper-backup-")
+    try:
+        path = os.path.join(workdir, "snapshot.db")
+        page_size = snapshot(db_path, path)
+    except Exception:
+        shutil.rmtree(workdir, ignore_errors=True)
+        raise
+    backup_id = time.strftime("%Y%m%d-%H%M%S") + "-" + uuid.uuid4().hex[:8]
+
+    if base is not None and base["page_size"] == page_size:
+        kind, old = "incremental", base["pages"]
+        header = {
+            "format": DELTA_FORMAT, "base": since, "backup_id": backup_id,
+            "page_size": page_size, "page_count": os.path.getsize(path) // page_size,
+        }
+    else:
+        kind, old, header = "full", None, None
+
+    def stream():
+        hashes = []
+        try:
+            yield from _gzip_stream(_hashed_chunks(path, page_size, hashes, old, header))
+            save_manifest(backup_id, page_size, hashes)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return backup_id, kind, stream()
+
+
+def apply_delta(base_path, delta_path, out_path):
+    """Rebuild a backup by applying a (gunzipped) incremental delta to its base file."""
+    shutil.copyfile(base_path, out_path)
+    with open(delta_path, "rb") as delta, open(out_path, "r+b") as out:
+        header = json.loads(delta.readline())
+        if header.get("format") != DELTA_FORMAT:
+            raise ValueError("not a foodmapper delta")
+        page_size = header["page_size"]
+        out.truncate(header["page_count"] * page_size)
+        while True:
+            prefix = delta.read(4)
+            if not prefix:
+                break
+            (page_no,) = struct.unpack(">I", prefix)
+            out.seek(page_no * page_size)
+            out.write(delta.read(page_size))
+    return header["backup_id"]
+
+
+if __name__ == "__main__":
+    # python backup.py apply base.db delta.bin out.db   (delta already gunzipped)
+    import sys
+    if len(sys.argv) != 5 or sys.argv[1] != "apply":
+        sys.exit("usage: python backup.py apply BASE_DB DELTA OUT_DB")
+    print(apply_delta(*sys.argv[2:]))
@@ -0,0 +1,15 @@
+"""Benchmarks. Run them from the repository root as modules, e.g.
+
+    python -m benchmarks.dataset --out bench.db --users 50 --restaurants 2000
+    python -m benchmarks.suite --dataset bench.db --out results.json
+
+  dataset           synthetic database generator
+  suite             per-endpoint latency, throughput and SQL query counts
+  load_test         mixed login + listing load
+  login_throughput  login rate and its effect on other requests
+  sqlite_profile    SQLite setup: legacy vs production profile
+  bulk_import       bulk import / export rows per second
+  startup           cold-start time
+
+harness and stats hold the helpers they share.
+"""
@@ -0,0 +1,111 @@
+"""Bulk import / export throughput on a generated CSV file.
+
+    python -m benchmarks.bulk_import --rows 100000
+    python -m benchmarks.bulk_import --rows 100000 --format geojson
+
+Builds a fresh database (with the R*Tree, FTS and cluster triggers the
+app installs), generates `--rows` restaurants spread over a few hundred
+cuisines and groups, then reports rows/second for bulk.import_restaurants
+and for each streamed export format. `--baseline N` also times N rows
+inserted one by one the way POST /api/restaurants does, for comparison.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import random
+import tempfile
+import time
+
+TMP = tempfile.mkdtemp(prefix="foodmapper-bulk-")
+os.environ["DATABASE_URL"] = f"sqlite:///{TMP}/bulk.db"
+
+import bulk  # noqa: E402
+import clusters  # noqa: E402
+import migrations  # noqa: E402
+import models  # noqa: E402
+import versions  # noqa: E402
+from database import SessionLocal, engine  # noqa: E402
+
+
+def generate_csv(rows, cuisines=200, groups=20):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(bulk.CSV_FIELDS)
+    for i in range(rows):
+        writer.writerow([
+            f"Restaurant {i}", f"{i} Main St", round(random.uniform(25, 49), 6), round(random.uniform(-124, -67), 6),
+            random.choice(["", 1, 2, 3, 4, 5]), random.choice(bulk.PRICE_RANGES), random.choice(models.STATUSES),
+            "", ";".join(f"Cuisine {random.randrange(cuisines)}" for _ in range(random.randint(0, 3))),
+            f"Group {random.randrange(groups)}" if random.random() < 0.3 else "",
+        ])
+    return buffer.getvalue().encode()
+
+
+def geojson_from_csv(data):
+    rows = csv.DictReader(io.StringIO(data.decode()))
+    return json.dumps({"type": "FeatureCollection", "features": [
+        {"type": "Feature", "geometry": {"type": "Point", "coordinates": [float(r["longitude"]), float(r["latitude"])]},
+         "properties": {k: v for k, v in r.items() if k not in ("latitude", "longitude")}}
+        for r in rows
+    ]}).encode()
+
+
+def per_row_baseline(owner_id, rows):
+    db = SessionLocal()
+    cuisine = db.query(models.Cuisine).first()
+    started = time.perf_counter()
+    for i in range(rows):
+        r = models.Restaurant(name=f"Single {i}", address="1 Main St", latitude=40.0, longitude=-74.0,
+                              price_range="$", status="Visited", owner_id=owner_id, cuisines=[cuisine])
+        db.add(r)
+        db.flush()
+        clusters.apply_change(db, None, clusters.snapshot(r))
+        versions.bump(db, ("owner", owner_id))
+        db.commit()
+    elapsed = time.perf_counter() - started
+    db.close()
+    return rows / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--format", choices=("csv", "geojson"), default="csv")
+    parser.add_argument("--baseline", type=int, default=0)
+    args = parser.parse_args()
+
+    migrations.run(engine)
+    db = SessionLocal()
+    user = models.User(username="bench")
+    db.add(user)
+    db.commit()
+    owner_id = user.id
+    db.close()
+
+    data = generate_csv(args.rows)
+    if args.format == "geojson":
+        data = geojson_from_csv(data)
+    print(f"{args.rows} rows, {len(data) / 1e6:.1f} MB {args.format}")
+
+    db = SessionLocal()
+    source = io.BytesIO(data)
+    records = bulk.read_csv(source) if args.format == "csv" else bulk.read_features(source)
+    result = bulk.import_restaurants(db, owner_id, records)
+    db.close()
+    print(f"  import: {result['imported']} rows in {result['seconds']:.1f}s = {result['rows_per_second']} rows/s "
+          f"({result['skipped']} skipped, chunks of {bulk.CHUNK_SIZE})")
+
+    for fmt in bulk.FORMATS:
+        started = time.perf_counter()
+        size = sum(len(chunk) for chunk in bulk.stream_export(owner_id, fmt))
+        elapsed = time.perf_counter() - started
+        print(f"  export {fmt:>7}: {size / 1e6:.1f} MB in {elapsed:.1f}s = {result['imported'] / elapsed:.0f} rows/s")
+
+    if args.baseline:
+        print(f"  one-by-one inserts: {per_row_baseline(owner_id, args.baseline):.0f} rows/s ({args.baseline} rows)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""Synthetic dataset generator: a realistic foodmapper database of any size.
+
+    python -m benchmarks.dataset --out bench.db --users 50 --restaurants 2000
+    python -m benchmarks.dataset --out bench.db --users 5 --restaurants 100000 --seed 7
+    python -m benchmarks.dataset --database-url postgresql://localhost/foodmapper_bench
+
+Users are bench0001, bench0002, ... all with the password DATASET_PASSWORD.
+Each one keeps restaurants clustered around a home city and a couple of
+others (the way real lists look on the map), tagged with cuisines drawn
+from a long-tailed distribution, spread over statuses, prices and
+ratings, and filed into groups of which some are published and some have
+a share link. The same seed gives the same database, so runs against it
+can be compared.
+
+The schema comes from migrations.run(), so the R*Tree, FTS, PostGIS and
+cluster tables are filled the same way they are in production.
+"""
+import argparse
+import os
+import random
+import time
+import uuid
+
+from sqlalchemy import create_engine, func, select, text
+
+import bulk
+import clusters
+import hashing
+import migrations
+import models
+
+DATASET_PASSWORD = "bench-password"
+
+# (name, lat, lon); each user lives in one and has a few favourites elsewhere
+CITIES = [
+    ("New York", 40.7306, -73.9866), ("Los Angeles", 34.0522, -118.2437), ("Chicago", 41.8781, -87.6298),
+    ("Houston", 29.7604, -95.3698), ("Seattle", 47.6062, -122.3321), ("San Francisco", 37.7749, -122.4194),
+    ("Austin", 30.2672, -97.7431), ("New Orleans", 29.9511, -90.0715), ("Boston", 42.3601, -71.0589),
+    ("Portland", 45.5152, -122.6784), ("Denver", 39.7392, -104.9903), ("Miami", 25.7617, -80.1918),
+    ("London", 51.5074, -0.1278), ("Paris", 48.8566, 2.3522), ("Tokyo", 35.6762, 139.6503),
+    ("Mexico City", 19.4326, -99.1332),
+]
+
+# Ordered by popularity: picked with Zipf-like weights, so a few cuisines
+# cover most restaurants and the rest form a long tail
+CUISINES = [
+    "American", "Italian", "Mexican", "Chinese", "Japanese", "Pizza", "Thai", "Indian", "Burgers", "Cafe",
+    "Sushi", "Bakery", "Korean", "Vietnamese", "Mediterranean", "Seafood", "Barbecue", "French", "Greek",
+    "Ramen", "Tacos", "Middle Eastern", "Deli", "Steakhouse", "Spanish", "Vegetarian", "Southern", "Brunch",
+    "Caribbean", "Ethiopian", "Peruvian", "Turkish", "Lebanese", "Filipino", "Cajun", "Dim Sum", "Noodles",
+    "Dessert", "Brazilian", "Persian", "Taiwanese", "Malaysian", "German", "Polish", "Georgian",
+]
+
+NAME_FIRST = [
+    "Golden", "Little", "Blue", "Red", "Lucky", "Old", "Happy", "Green", "Silver", "Corner", "Royal", "Sunny",
+    "Smoky", "Hidden", "Twin", "Wild", "Salt", "Copper", "Olive", "Harbor", "Union", "Maple", "Iron", "Velvet",
+]
+NAME_SECOND = [
+    "Dragon", "Spoon", "Door", "Lantern", "Kitchen", "Table", "Garden", "Oven", "Fork", "Bowl", "Pepper",
+    "Tavern", "House", "Grill", "Counter", "Market", "Leaf", "Anchor", "Bistro", "Noodle", "Hearth", "Canteen",
+]
+STREETS = ["Main", "Oak", "Pine", "Maple", "Cedar", "Elm", "Washington", "Lake", "Hill", "Park", "Market", "Broadway"]
+STREET_SUFFIXES = ["St", "Ave", "Blvd", "Rd", "Way"]
+GROUP_NAMES = ["Date Night", "Cheap Eats", "Brunch Spots", "Out of Town", "Take Visitors", "Late Night",
+               "Coffee", "Special Occasions", "Lunch Near Work", "Patio", "Tried Once", "Family"]
+
+STATUS_WEIGHTS = {"Want to go": 50, "Visited": 35, "Favorite": 15}
+PRICE_WEIGHTS = {"$": 30, "$$": 45, "$$$": 18, "$$$$": 7}
+RATING_WEIGHTS = {1: 3, 2: 7, 3: 20, 4: 40, 5: 30}
+NOTES = ["Get the special.", "Cash only.", "Book ahead on weekends.", "Great patio.", "Ask for the back room.",
+         "Long lines after 7.", "Try the dumplings.", "Good for groups."]
+
+PUBLISHED_SHARE = 0.3
+SHARED_SHARE = 0.3
+
+
+def _next_id(conn, table):
+    return (conn.execute(select(func.max(table.c.id))).scalar() or 0) + 1
+
+
+def _weighted(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def _restaurant(rng, cities, cuisine_weights, cuisine_ids):
+    # Mostly near home, a few scattered over other cities; ~5 km spread
+    city = cities[0] if rng.random() < 0.7 else rng.choice(cities[1:] or cities)
+    _, lat, lon = city
+    status = _weighted(rng, STATUS_WEIGHTS)
+    cuisine_count = rng.choices((1, 2, 3), weights=(70, 25, 5))[0]
+    return {
+        "name": f"{rng.choice(NAME_FIRST)} {rng.choice(NAME_SECOND)}",
+        "address": f"{rng.randint(1, 9999)} {rng.choice(STREETS)} {rng.choice(STREET_SUFFIXES)}",
+        "latitude": round(rng.gauss(lat, 0.05), 6),
+        "longitude": round(rng.gauss(lon, 0.06), 6),
+        "rating": None if status == "Want to go" else _weighted(rng, RATING_WEIGHTS),
+        "price_range": _weighted(rng, PRICE_WEIGHTS),
+        "status": status,
+        "personal_notes": rng.choice(NOTES) if rng.random() < 0.3 else None,
+        "cuisines": set(rng.choices(cuisine_ids, weights=cuisine_weights, k=cuisine_count)),
+    }
+
+
+def generate(engine, users=20, restaurants_per_user=500, groups_per_user=4, seed=1):
+    """Fill `engine`'s database with synthetic users, restaurants and groups; returns a summary."""
+    assert set(STATUS_WEIGHTS) == set(models.STATUSES) and set(PRICE_WEIGHTS) <= set(bulk.PRICE_RANGES)
+    started = time.perf_counter()
+    rng = random.Random(seed)
+    migrations.run(engine)
+    password_hash = hashing.pwd_context.hash(DATASET_PASSWORD)
+
+    U, C, R, G = (m.__table__ for m in (models.User, models.Cuisine, models.Restaurant, models.Group))
+    rc, rg = models.restaurant_cuisines, models.restaurant_groups
+    summary = {"users": users, "restaurants": 0, "groups": 0, "published_groups": 0, "shared_groups": 0, "seed": seed}
+
+    with engine.begin() as conn:
+        existing = {name: id_ for name, id_ in conn.execute(select(C.c.name, C.c.id))}
+        missing = [name for name in CUISINES if name not in existing]
+        next_cuisine = _next_id(conn, C)
+        if missing:
+            conn.execute(C.insert(), [{"id": next_cuisine + i, "name": name} for i, name in enumerate(missing)])
+            existing.update((name, next_cuisine + i) for i, name in enumerate(missing))
+        cuisine_ids = [existing[name] for name in CUISINES]
+        cuisine_weights = [1 / rank for rank in range(1, len(CUISINES) + 1)]
+
+        user_id, restaurant_id, group_id = _next_id(conn, U), _next_id(conn, R), _next_id(conn, G)
+        for _ in range(users):
+            username = f"bench{user_id:04d}"
+            conn.execute(U.insert(), [{"id": user_id, "username": username, "hashed_password": password_hash}])
+            cities = rng.sample(CITIES, 3)
+
+            rows, cuisine_links, ids = [], [], []
+            for _ in range(restaurants_per_user):
+                r = _restaurant(rng, cities, cuisine_weights, cuisine_ids)
+                cuisine_links.extend({"restaurant_id": restaurant_id, "cuisine_id": c} for c in r.pop("cuisines"))
+                rows.append({**r, "id": restaurant_id, "owner_id": user_id})
+                ids.append(restaurant_id)
+                restaurant_id += 1
+            if rows:
+                conn.execute(R.insert(), rows)
+                conn.execute(rc.insert(), cuisine_links)
+
+            # Group names are unique across users in the app, so suffix the username
+            group_rows, memberships = [], []
+            for name in rng.sample(GROUP_NAMES, min(groups_per_user, len(GROUP_NAMES))):
+                published = rng.random() < PUBLISHED_SHARE
+                token = str(uuid.UUID(int=rng.getrandbits(128))) if rng.random() < SHARED_SHARE else None
+                group_rows.append({"id": group_id, "name": f"{name} ({username})", "owner_id": user_id,
+                                   "is_published": int(published), "share_token": token})
+                size = max(1, int(len(ids) * rng.uniform(0.05, 0.15))) if ids else 0
+                memberships.extend({"restaurant_id": rid, "group_id": group_id} for rid in rng.sample(ids, size))
+                summary["published_groups"] += published
+                summary["shared_groups"] += token is not None
+                group_id += 1
+            if group_rows:
+                conn.execute(G.insert(), group_rows)
+            if memberships:
+                conn.execute(rg.insert(), memberships)
+            summary["restaurants"] += len(rows)
+            summary["groups"] += len(group_rows)
+            user_id += 1
+
+        # Bulk inserts bypass clusters.apply_change, so build the clusters in one pass
+        clusters.rebuild(conn)
+        if conn.dialect.name == "postgresql":
+            # The ids above were given explicitly; move the sequences past them
+            for table in (U, C, R, G):
+                conn.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), (SELECT max(id) FROM {table.name}))"
+                ))
+
+    summary["seconds"] = round(time.perf_counter() - started, 2)
+    return summary
+
+
+def describe(engine):
+    """Row counts of a dataset database, recorded alongside benchmark results."""
+    G = models.Group
+    with engine.connect() as conn:
+        def count(*where, table=G):
+            return conn.execute(select(func.count()).select_from(table).where(*where)).scalar()
+
+        return {
+            "users": count(models.User.username.like("bench%"), table=models.User),
+            "restaurants": count(table=models.Restaurant),
+            "groups": count(),
+            "published_groups": count(G.is_published == 1),
+            "shared_groups": count(G.share_token.isnot(None)),
+        }
+
+
+def usernames(engine):
+    with engine.connect() as conn:
+        return list(conn.execute(
+            select(models.User.username).where(models.User.username.like("bench%")).order_by(models.User.id)
+        ).scalars())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", default="bench.db", help="SQLite file to create")
+    parser.add_argument("--database-url", help="Fill this (empty) database instead, e.g. a Postgres one")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--restaurants", type=int, default=500, help="Restaurants per user")
+    parser.add_argument("--groups", type=int, default=4, help="Groups per user")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    if args.database_url:
+        engine = create_engine(args.database_url)
+    elif os.path.exists(args.out):
+        raise SystemExit(f"{args.out} already exists")
+    else:
+        engine = create_engine(f"sqlite:///{args.out}")
+    summary = generate(engine, args.users, args.restaurants, args.groups, args.seed)
+    print(", ".join(f"{k} {v}" for k, v in summary.items()))
@@ -0,0 +1,52 @@
+import contextlib
+import os
+import subprocess
+import threading
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+@contextlib.asynccontextmanager
+async def in_process_app():
+    """Serve main.app in this process: yields (base_url, transport) for httpx clients.
+
+    DATABASE_URL / SECRET_KEY must be set before this is entered; main is
+    imported here. ASGITransport does not send lifespan events, so startup
+    runs here too.
+    """
+    from main import app
+    async with app.router.lifespan_context(app):
+        yield "http://testserver", httpx.ASGITransport(app=app)
+
+
+class QueryCounter:
+    """Counts SQL statements on the app's engines (in-process runs only)."""
+
+    def __init__(self):
+        from sqlalchemy import event
+
+        import database
+
+        self.count = 0
+        self._lock = threading.Lock()
+        engines = {id(e): e for e in (database.engine, database.read_engine)}
+        for eng in engines.values():
+            event.listen(eng, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        with self._lock:
+            self.count += 1
+
+    def reset(self):
+        with self._lock:
+            count, self.count = self.count, 0
+        return count
@@ -0,0 +1,69 @@
+"""Concurrent login + list-read load test against a running server.
+
+    python -m benchmarks.load_test --url http://127.0.0.1:8000 --users 20 --rounds 10
+    python -m benchmarks.load_test --in-process   # no server needed
+
+`--in-process` drives main.app through httpx's ASGI transport on the same
+event loop (set DATABASE_URL/SECRET_KEY as for the server).
+
+Each virtual user logs in and then reads its restaurant list `--reads`
+times, all users at once. Reports p50/p95/p99/max latency per operation,
+which is where a blocked event loop shows up: one slow handler delays
+every other in-flight request.
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from benchmarks.harness import in_process_app
+from benchmarks.stats import format_latency
+
+
+async def virtual_user(base_url, transport, username, password, reads, timings):
+    async with httpx.AsyncClient(base_url=base_url, transport=transport, timeout=60) as client:
+        start = time.perf_counter()
+        res = await client.post("/api/token", data={"username": username, "password": password})
+        timings["login"].append(time.perf_counter() - start)
+        res.raise_for_status()
+        for _ in range(reads):
+            start = time.perf_counter()
+            res = await client.get("/api/restaurants")
+            timings["list"].append(time.perf_counter() - start)
+            res.raise_for_status()
+
+
+async def run(args):
+    if not args.in_process:
+        await run_load(args, None)
+        return
+    async with in_process_app() as (args.url, transport):
+        await run_load(args, transport)
+
+
+async def run_load(args, transport):
+    timings = {"login": [], "list": []}
+    started = time.perf_counter()
+    for _ in range(args.rounds):
+        await asyncio.gather(*[
+            virtual_user(args.url, transport, args.username, args.password, args.reads, timings)
+            for _ in range(args.users)
+        ])
+    elapsed = time.perf_counter() - started
+
+    print(f"{args.users} concurrent users x {args.rounds} rounds in {elapsed:.1f}s")
+    for op, samples in timings.items():
+        print(format_latency(op, samples))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--username", default="Adam")
+    parser.add_argument("--password", default="admin")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--reads", type=int, default=5)
+    parser.add_argument("--in-process", action="store_true", help="Serve main.app in-process instead of over HTTP")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,81 @@
+"""Login throughput under concurrency, and what it does to other requests.
+
+    python -m benchmarks.login_throughput --url http://127.0.0.1:8000 --concurrency 32 --seconds 10
+    python -m benchmarks.login_throughput --in-process   # no server needed
+
+`--concurrency` clients log in back to back for `--seconds` while a probe
+requests GET /api/config every 50 ms. Reports successful logins/s, login
+latency, how many were shed with 503 (hashing queue full, see
+hashing.py), and the probe's latency: if hashing blocked the event loop
+or starved the request threadpool, the probe shows it.
+
+PASSWORD_HASH_WORKERS / PASSWORD_HASH_QUEUE_LIMIT / PASSWORD_HASH_ROUNDS
+apply to the server (or to this process with --in-process).
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from benchmarks.harness import in_process_app
+from benchmarks.stats import format_latency
+
+PROBE_INTERVAL = 0.05
+
+
+async def login_loop(client, args, deadline, results):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        res = await client.post("/api/token", data={"username": args.username, "password": args.password})
+        elapsed = time.perf_counter() - start
+        if res.status_code == 200:
+            results["login"].append(elapsed)
+        elif res.status_code == 503:
+            results["shed"] += 1
+            await asyncio.sleep(float(res.headers.get("retry-after", "1")))
+        else:
+            res.raise_for_status()
+
+
+async def probe_loop(client, deadline, results):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        (await client.get("/api/config")).raise_for_status()
+        results["probe"].append(time.perf_counter() - start)
+        await asyncio.sleep(PROBE_INTERVAL)
+
+
+async def run_load(args, transport):
+    results = {"login": [], "probe": [], "shed": 0}
+    limits = httpx.Limits(max_connections=args.concurrency + 1)
+    async with httpx.AsyncClient(base_url=args.url, transport=transport, timeout=60, limits=limits) as client:
+        deadline = time.perf_counter() + args.seconds
+        await asyncio.gather(
+            probe_loop(client, deadline, results),
+            *[login_loop(client, args, deadline, results) for _ in range(args.concurrency)],
+        )
+
+    print(f"{args.concurrency} concurrent clients for {args.seconds:.0f}s")
+    print(f"{len(results['login']) / args.seconds:.1f} logins/s, {results['shed']} shed with 503")
+    print(format_latency("login", results["login"]))
+    print(format_latency("probe", results["probe"]))
+
+
+async def run(args):
+    if not args.in_process:
+        await run_load(args, None)
+        return
+    async with in_process_app() as (args.url, transport):
+        await run_load(args, transport)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--username", default="Adam")
+    parser.add_argument("--password", default="admin")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--in-process", action="store_true", help="Serve main.app in-process instead of over HTTP")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,110 @@
+"""Mixed read/write throughput: legacy SQLite setup vs the production profile.
+
+    python -m benchmarks.sqlite_profile --seconds 10 --readers 8 --writers 4
+
+Each run builds a fresh database file, seeds it, then lets reader threads
+list restaurants while writer threads insert and commit, for a fixed
+time. "legacy" is the old setup (one default pool, rollback journal, no
+pragmas); "profile" is database.create_engines() with the SQLite profile
+and the single-writer / reader-pool split.
+"""
+import argparse
+import random
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+import models
+from database import create_engines
+from serializers import restaurant_select, serialize_restaurants
+
+
+def seed(engine, rows):
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(models.User.__table__.insert(), [{"id": 1, "username": "bench"}])
+        conn.execute(models.Restaurant.__table__.insert(), [
+            {"name": f"Seed {i}", "address": "1 Main St", "latitude": random.uniform(30, 45),
+             "longitude": random.uniform(-120, -70), "price_range": "$$", "status": "Visited", "owner_id": 1}
+            for i in range(rows)
+        ])
+
+
+def run(label, write_engine, read_engine, args):
+    WriteSession = sessionmaker(bind=write_engine)
+    ReadSession = sessionmaker(bind=read_engine)
+    stop = time.perf_counter() + args.seconds
+    counts = {"reads": 0, "writes": 0, "locked": 0}
+    lock = threading.Lock()
+
+    def count(key):
+        with lock:
+            counts[key] += 1
+
+    def reader():
+        query = restaurant_select().where(models.Restaurant.owner_id == 1).order_by(models.Restaurant.name).limit(100)
+        while time.perf_counter() < stop:
+            db = ReadSession()
+            try:
+                serialize_restaurants(db, query)
+                count("reads")
+            except OperationalError:
+                count("locked")
+            finally:
+                db.close()
+
+    def writer():
+        while time.perf_counter() < stop:
+            db = WriteSession()
+            try:
+                db.add(models.Restaurant(name="New", address="2 Main St", latitude=40.0, longitude=-74.0,
+                                         price_range="$", status="Want to go", owner_id=1))
+                db.commit()
+                count("writes")
+            except OperationalError:
+                db.rollback()
+                count("locked")
+            finally:
+                db.close()
+
+    threads = [threading.Thread(target=reader) for _ in range(args.readers)]
+    threads += [threading.Thread(target=writer) for _ in range(args.writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    print(
+        f"{label:>8}: {counts['reads'] / args.seconds:8.0f} reads/s  {counts['writes'] / args.seconds:6.0f} writes/s  "
+        f"{counts['locked']} 'database is locked' errors"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{tmp}/legacy.db"
+        legacy = create_engine(url, connect_args={"check_same_thread": False})
+        seed(legacy, args.rows)
+        run("legacy", legacy, legacy, args)
+        legacy.dispose()
+
+        url = f"sqlite:///{tmp}/profile.db"
+        write_engine, read_engine = create_engines(url)
+        seed(write_engine, args.rows)
+        run("profile", write_engine, read_engine, args)
+        write_engine.dispose()
+        read_engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
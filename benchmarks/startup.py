@@ -0,0 +1,93 @@
+"""Cold-start budget: import time and time to first response.
+
+    python -m benchmarks.startup --runs 5
+    python -m benchmarks.startup --runs 5 --record startup.jsonl --budget-ms 2000
+
+Each run starts a fresh interpreter, so nothing is cached between runs,
+and measures:
+
+  import     `import main` (module-level work: routes, schemas, imports)
+  startup    the lifespan (migrations check, settings report, admin user)
+  first      the first GET /api/config once startup has finished
+  total      import + startup + first: what a new worker costs before it serves
+
+The first run uses an empty database, so it also pays for creating the
+schema; the medians cover the later runs against the existing file,
+which is the usual restart / scale-from-zero case. `--record` appends
+the medians and the git commit to a JSON-lines file so regressions show
+up over time; `--budget-ms` exits non-zero when the median total exceeds
+it (e.g. in CI).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.harness import ROOT, git_commit
+
+# The test client is imported after main (it pulls in httpx, which the app
+# itself should not need at startup) and its own import is not counted
+CHILD = """
+import json, os, sys, time
+sys.path.insert(0, os.getcwd())
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+loaded = {name: name in sys.modules for name in ("authlib", "httpx")}
+from fastapi.testclient import TestClient
+t1b = time.perf_counter()
+with TestClient(main.app) as client:
+    t2 = time.perf_counter()
+    client.get("/api/config").raise_for_status()
+    t3 = time.perf_counter()
+print(json.dumps({"import": t1 - t0, "startup": t2 - t1b, "first": t3 - t2, "total": (t1 - t0) + (t3 - t1b),
+                  "loaded": loaded}))
+"""
+
+PHASES = ("import", "startup", "first", "total")
+
+
+def measure(env):
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="Runs against the existing database (after the fresh one)")
+    parser.add_argument("--record", help="Append the results to this JSON-lines file")
+    parser.add_argument("--budget-ms", type=float, help="Fail if the median total exceeds this")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**os.environ, "DATABASE_URL": f"sqlite:///{tmp}/startup.db", "SECRET_KEY": os.getenv("SECRET_KEY", "bench")}
+        fresh = measure(env)
+        warm = [measure(env) for _ in range(args.runs)]
+
+    def row(label, result):
+        print(f"{label:>8}: " + "  ".join(f"{p} {result[p] * 1000:7.1f}ms" for p in PHASES))
+
+    row("fresh db", fresh)
+    medians = {p: statistics.median(r[p] for r in warm) for p in PHASES}
+    row("median", medians)
+    print("imported by main: " + ", ".join(f"{name} {loaded}" for name, loaded in warm[-1]["loaded"].items()))
+
+    if args.record:
+        record = {"commit": git_commit(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "runs": args.runs,
+                  "fresh_ms": {p: round(fresh[p] * 1000, 1) for p in PHASES},
+                  "median_ms": {p: round(medians[p] * 1000, 1) for p in PHASES}}
+        with open(args.record, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+    if args.budget_ms is not None and medians["total"] * 1000 > args.budget_ms:
+        sys.exit(f"Startup budget exceeded: {medians['total'] * 1000:.0f}ms > {args.budget_ms:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+import statistics
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))]
+
+
+def latency_summary(seconds):
+    """p50/p95/p99/max/mean in milliseconds for a list of durations in seconds."""
+    if not seconds:
+        return {"n": 0}
+    ms = [s * 1000 for s in seconds]
+    return {
+        "n": len(ms),
+        "p50": round(statistics.median(ms), 2),
+        "p95": round(percentile(ms, 95), 2),
+        "p99": round(percentile(ms, 99), 2),
+        "max": round(max(ms), 2),
+        "mean": round(statistics.fmean(ms), 2),
+    }
+
+
+def format_latency(label, seconds):
+    s = latency_summary(seconds)
+    if not s["n"]:
+        return f"{label:>7}: n=0"
+    return f"{label:>7}: n={s['n']} p50={s['p50']:.1f}ms p95={s['p95']:.1f}ms p99={s['p99']:.1f}ms max={s['max']:.1f}ms"
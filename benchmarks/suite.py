@@ -0,0 +1,316 @@
+"""Endpoint benchmark suite: latency, throughput and SQL queries per endpoint.
+
+    python -m benchmarks.suite --users 10 --restaurants 500 --out results.json
+    python -m benchmarks.suite --dataset bench.db --out after.json --compare before.json
+    python -m benchmarks.suite --url http://127.0.0.1:8000 --dataset bench.db   # server running on bench.db
+    BENCH_DATABASE_URL=postgresql://localhost/foodmapper_bench python -m benchmarks.suite --out pg.json
+
+Runs the main.py endpoints against a dataset from benchmarks.dataset,
+either a copy of `--dataset` or one generated for this run. By default
+the app is served in-process through httpx's ASGI transport; with `--url`
+the requests go to a running server, which must be using the same
+dataset file (query counts are then not available).
+
+With BENCH_DATABASE_URL set, the app runs against that database instead
+of a SQLite copy: a dedicated Postgres database, say, filled with a
+generated dataset on first use and reused as it is after that. Results
+record which backend they came from.
+
+Every scenario runs twice:
+
+  sequential  `--samples` requests one at a time: latency with no
+              contention, and the SQL statements each request executes
+  concurrent  `--requests` requests from `--concurrency` workers spread
+              over the logged-in users: p50/p95/p99 and requests/s
+
+Clients do not send If-None-Match, so every request does the full work.
+`--out` writes the results with the commit, dataset and settings as
+JSON; `--compare` prints the change against an earlier results file.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sqlite3
+import tempfile
+import time
+
+# database.py reads these at import: point the app at this run's copy
+DB_PATH = os.path.join(tempfile.mkdtemp(prefix="foodmapper-suite-"), "suite.db")
+DATABASE_URL = os.getenv("BENCH_DATABASE_URL") or f"sqlite:///{DB_PATH}"
+os.environ["DATABASE_URL"] = DATABASE_URL
+os.environ.setdefault("SECRET_KEY", "bench")
+
+import httpx  # noqa: E402
+from sqlalchemy import create_engine, text  # noqa: E402
+
+import migrations  # noqa: E402
+from benchmarks import dataset  # noqa: E402
+from benchmarks.harness import QueryCounter, git_commit, in_process_app  # noqa: E402
+from benchmarks.stats import latency_summary  # noqa: E402
+
+
+# name -> (method, path, params); paths and params are filled in from the
+# client's context (see discover()) when the request is made
+SCENARIOS = {
+    "restaurants": ("GET", "/api/restaurants", {}),
+    "restaurants_columnar": ("GET", "/api/restaurants", {"format": "columnar"}),
+    "restaurants_page": ("GET", "/api/restaurants", {"sort_by": "rating", "limit": 50}),
+    "restaurants_facets": ("GET", "/api/restaurants", {"status": "Visited", "with_facets": "true", "limit": 50}),
+    "search": ("GET", "/api/restaurants", {"search": "{term}", "limit": 50}),
+    "viewport": ("GET", "/api/restaurants", {"bbox": "{bbox}"}),
+    "viewport_columnar": ("GET", "/api/restaurants", {"bbox": "{bbox}", "format": "columnar"}),
+    "nearby": ("GET", "/api/restaurants/nearby", {"lat": "{lat}", "lon": "{lon}", "k": 20}),
+    "clusters": ("GET", "/api/restaurants/clusters", {"zoom": 10, "bbox": "{bbox}"}),
+    "choose": ("GET", "/api/restaurants/choose", {"n": 5, "weight": "rating"}),
+    "cuisines": ("GET", "/api/cuisines", {}),
+    "groups": ("GET", "/api/groups", {}),
+    "public_groups": ("GET", "/api/groups/public", {}),
+    "public_group": ("GET", "/api/groups/{public_group}/public", {}),
+    "share": ("GET", "/api/share/{token}", {}),
+    "share_clusters": ("GET", "/api/share/{token}/clusters", {"zoom": 8}),
+    "sync": ("GET", "/api/sync", {"since": "{sync_cursor}"}),
+    "sync_full": ("GET", "/api/sync", {}),
+    "create_restaurant": ("POST", "/api/restaurants", None),
+    "login": ("POST", "/api/token", None),
+}
+
+# Scenarios that change data; left out with --read-only (e.g. against a shared server)
+WRITES = {"create_restaurant"}
+
+
+class Client:
+    """One logged-in dataset user and the ids its requests refer to."""
+
+    def __init__(self, http, username):
+        self.http = http
+        self.username = username
+        self.context = {}
+        self.cuisine_ids = []
+
+    async def login(self):
+        res = await self.http.post("/api/token", data={"username": self.username, "password": dataset.DATASET_PASSWORD})
+        res.raise_for_status()
+
+    async def discover(self, rng):
+        groups = (await self.http.get("/api/groups")).json()
+        public = (await self.http.get("/api/groups/public")).json()
+        token = (await self.http.post(f"/api/groups/{groups[0]['id']}/share")).json()["share_token"]
+        first = (await self.http.get("/api/restaurants", params={"limit": 1})).json()[0]
+        sync_cursor = (await self.http.get("/api/sync", params={"since": 0})).json()["cursor"]
+        lat, lon = first["latitude"], first["longitude"]
+        self.context = {
+            "lat": lat, "lon": lon,
+            "bbox": f"{lon - 0.1},{lat - 0.1},{lon + 0.1},{lat + 0.1}",
+            "term": rng.choice(dataset.NAME_FIRST).lower(),
+            "token": token,
+            "public_group": public[0]["id"] if public else groups[0]["id"],
+            "sync_cursor": sync_cursor,
+        }
+        self.cuisine_ids = [c["id"] for c in first["cuisines"]]
+
+    async def request(self, scenario, rng):
+        method, path, params = SCENARIOS[scenario]
+        if scenario == "login":
+            return await self.http.post(path, data={"username": self.username, "password": dataset.DATASET_PASSWORD})
+        if scenario == "create_restaurant":
+            ctx = self.context
+            return await self.http.post(path, json={
+                "name": f"Bench {rng.getrandbits(32):08x}", "address": "1 Bench St",
+                "latitude": ctx["lat"] + rng.uniform(-0.05, 0.05), "longitude": ctx["lon"] + rng.uniform(-0.05, 0.05),
+                "price_range": "$$", "status": "Want to go", "cuisine_ids": self.cuisine_ids,
+            })
+        params = {k: v.format(**self.context) if isinstance(v, str) else v for k, v in params.items()}
+        return await self.http.request(method, path.format(**self.context), params=params)
+
+
+async def sequential(clients, scenario, samples, counter, rng):
+    timings, queries, errors = [], [], 0
+    for i in range(samples):
+        client = clients[i % len(clients)]
+        if counter:
+            counter.reset()
+        start = time.perf_counter()
+        res = await client.request(scenario, rng)
+        timings.append(time.perf_counter() - start)
+        if counter:
+            queries.append(counter.reset())
+        errors += res.status_code >= 400
+    result = latency_summary(timings)
+    result["errors"] = errors
+    if queries:
+        result["queries"] = round(sum(queries) / len(queries), 2)
+        result["queries_max"] = max(queries)
+    return result
+
+
+async def concurrent(clients, scenario, requests, concurrency, rng):
+    timings, errors = [], 0
+    remaining = iter(range(requests))
+
+    async def worker(n):
+        nonlocal errors
+        client = clients[n % len(clients)]
+        for _ in remaining:
+            start = time.perf_counter()
+            res = await client.request(scenario, rng)
+            timings.append(time.perf_counter() - start)
+            errors += res.status_code >= 400
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker(n) for n in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    result = latency_summary(timings)
+    result["errors"] = errors
+    result["rps"] = round(len(timings) / elapsed, 1)
+    return result
+
+
+def print_row(name, result):
+    seq, conc = result["sequential"], result["concurrent"]
+    queries = f"{seq['queries']:6.1f}" if "queries" in seq else "     -"
+    print(f"{name:>20} {queries} {seq['p50']:9.1f} {conc['p50']:9.1f} {conc['p95']:9.1f} {conc['p99']:9.1f} "
+          f"{conc['rps']:8.1f} {seq['errors'] + conc['errors']:6d}")
+
+
+def compare(results, previous):
+    print(f"\nChange against {previous['meta'].get('commit')} ({previous['meta'].get('time')}):")
+    # Files from before the backend was recorded all ran on SQLite
+    backends = [meta.get("database", {}).get("name", "sqlite") for meta in (previous["meta"], results["meta"])]
+    if backends[0] != backends[1]:
+        print(f"(backends differ: {backends[0]} then {backends[1]})")
+    print(f"{'scenario':>20} {'queries':>13} {'seq p50 ms':>17} {'p95 ms':>17} {'req/s':>17}")
+
+    def delta(old, new):
+        if old is None or new is None:
+            return f"{'-':>17}"
+        change = f"{(new - old) / old * 100:+.0f}%" if old else ""
+        return f"{old:>7.1f}>{new:<7.1f}{change:>5}"
+
+    for name, result in results["scenarios"].items():
+        before = previous["scenarios"].get(name)
+        if not before:
+            continue
+        old_q, new_q = before["sequential"].get("queries"), result["sequential"].get("queries")
+        queries = f"{old_q:>5.1f}>{new_q:<5.1f}" if old_q is not None and new_q is not None else "-"
+        print(f"{name:>20} {queries:>13} {delta(before['sequential']['p50'], result['sequential']['p50'])} "
+              f"{delta(before['concurrent']['p95'], result['concurrent']['p95'])} "
+              f"{delta(before['concurrent']['rps'], result['concurrent']['rps'])}")
+
+
+async def run_suite(args, base_url, transport, usernames, counter):
+    rng = random.Random(args.seed)
+    scenarios = [s for s in (args.scenario or SCENARIOS) if not (args.read_only and s in WRITES)]
+    limits = httpx.Limits(max_connections=args.concurrency + 1)
+    https = [httpx.AsyncClient(base_url=base_url, transport=transport, timeout=60, limits=limits)
+             for _ in usernames[:args.clients]]
+    try:
+        clients = [Client(http, username) for http, username in zip(https, usernames)]
+        for client in clients:
+            await client.login()
+            await client.discover(rng)
+
+        print(f"{'scenario':>20} {'q/req':>6} {'seq p50':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+              f"{'req/s':>8} {'errors':>6}")
+        results = {}
+        for name in scenarios:
+            await sequential(clients, name, min(3, args.samples), None, rng)  # warm caches and pools
+            results[name] = {
+                "method": SCENARIOS[name][0],
+                "path": SCENARIOS[name][1],
+                "sequential": await sequential(clients, name, args.samples, counter, rng),
+                "concurrent": await concurrent(clients, name, args.requests, args.concurrency, rng),
+            }
+            print_row(name, results[name])
+        return results
+    finally:
+        for http in https:
+            await http.aclose()
+
+
+def server_version(engine):
+    with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            return conn.execute(text("SHOW server_version")).scalar()
+        return sqlite3.sqlite_version
+
+
+async def main(args):
+    if os.getenv("BENCH_DATABASE_URL"):
+        if args.dataset:
+            raise SystemExit("--dataset is a SQLite file; with BENCH_DATABASE_URL the dataset lives in that database")
+        url = DATABASE_URL
+        engine = create_engine(url)
+        migrations.run(engine)
+        if not dataset.usernames(engine):
+            print(f"Generating {args.users} users x {args.restaurants} restaurants...")
+            dataset.generate(engine, args.users, args.restaurants, args.groups, args.seed)
+        engine.dispose()
+    elif args.url:
+        if not args.dataset:
+            raise SystemExit("--url needs --dataset: the file the server is using, to find the bench users")
+        url = f"sqlite:///{args.dataset}"
+    else:
+        url = DATABASE_URL
+        if args.dataset:
+            import backup
+            backup.snapshot(args.dataset, DB_PATH)
+        else:
+            print(f"Generating {args.users} users x {args.restaurants} restaurants...")
+            dataset.generate(create_engine(url), args.users, args.restaurants, args.groups, args.seed)
+
+    engine = create_engine(url)
+    usernames, described = dataset.usernames(engine), dataset.describe(engine)
+    backend = {"name": engine.dialect.name, "version": server_version(engine)}
+    engine.dispose()
+    if not usernames:
+        raise SystemExit(f"No bench users in {engine.url!r}; create them with python -m benchmarks.dataset")
+
+    if args.url:
+        scenarios = await run_suite(args, args.url, None, usernames, None)
+    else:
+        async with in_process_app() as (base_url, transport):
+            scenarios = await run_suite(args, base_url, transport, usernames, QueryCounter())
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "mode": "url" if args.url else "in-process",
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "database": backend,
+            "cpus": os.cpu_count(),
+            "dataset": described,
+            "settings": {k: getattr(args, k) for k in ("clients", "samples", "requests", "concurrency", "seed")},
+        },
+        "scenarios": scenarios,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote {args.out}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dataset", help="Existing dataset file (copied unless --url is given)")
+    parser.add_argument("--users", type=int, default=10, help="Users to generate when no --dataset is given")
+    parser.add_argument("--restaurants", type=int, default=500, help="Restaurants per generated user")
+    parser.add_argument("--groups", type=int, default=4, help="Groups per generated user")
+    parser.add_argument("--url", help="Benchmark a running server instead of serving main.app in-process")
+    parser.add_argument("--clients", type=int, default=10, help="Users logged in at once")
+    parser.add_argument("--samples", type=int, default=20, help="Sequential requests per scenario")
+    parser.add_argument("--requests", type=int, default=200, help="Concurrent requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS), help="Only run these (repeatable)")
+    parser.add_argument("--read-only", action="store_true", help="Skip scenarios that write")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Print the change against an earlier results file")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,352 @@
+import csv
+import io
+import json
+import time
+
+from sqlalchemy import insert, select
+
+import clusters
+import events
+import models
+import sync
+import versions
+from serializers import iter_restaurant_batches, restaurant_select
+
+FORMATS = ("csv", "geojson", "takeout")
+MEDIA_TYPES = {"csv": "text/csv", "geojson": "application/geo+json", "takeout": "application/geo+json"}
+EXTENSIONS = {"csv": "csv", "geojson": "geojson", "takeout": "json"}
+
+# cuisines and groups are ";"-separated names in CSV files
+CSV_FIELDS = (
+    "name", "address", "latitude", "longitude", "rating", "price_range",
+    "status", "personal_notes", "cuisines", "groups",
+)
+DEFAULT_STATUS = "Want to go"
+PRICE_RANGES = ("", "$", "$$", "$$$", "$$$$")
+
+CHUNK_SIZE = 1000  # Rows per transaction
+MAX_REPORTED_ERRORS = 100
+
+
+def detect_format(filename):
+    """Pick an import format from the upload's file name, or None."""
+    name = (filename or "").lower()
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith((".geojson", ".json")):
+        # Takeout exports are GeoJSON too; read_features() handles both shapes
+        return "geojson"
+    return None
+
+
+# --- Parsing ---
+
+def _text(value, field):
+    # Uploaded JSON can hold any type where a string belongs; numbers are
+    # taken as their text, anything else is a row error
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise ValueError(f"{field} must be text")
+
+
+def _object(value):
+    return value if isinstance(value, dict) else {}
+
+
+def _split_names(value, field):
+    if isinstance(value, list):
+        names = [_text(v.get("name") if isinstance(v, dict) else v, field) for v in value]
+    elif value is None or isinstance(value, str):
+        names = (value or "").split(";")
+    else:
+        raise ValueError(f"{field} must be a list or ;-separated names")
+    return [n.strip() for n in names if n.strip()]
+
+
+def validate(raw):
+    """Normalise one parsed record into column values, or raise ValueError."""
+    name = _text(raw.get("name"), "name").strip()
+    if not name:
+        raise ValueError("name is required")
+    try:
+        lat = float(raw.get("latitude"))
+        lon = float(raw.get("longitude"))
+    except (TypeError, ValueError):
+        raise ValueError("latitude and longitude must be numbers")
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError("coordinates out of range")
+    if lat == 0 and lon == 0:
+        # Takeout uses 0,0 for places it could not locate
+        raise ValueError("missing coordinates")
+
+    rating = raw.get("rating")
+    if rating in (None, ""):
+        rating = None
+    else:
+        try:
+            rating = int(float(rating))
+        except (TypeError, ValueError, OverflowError):
+            raise ValueError("rating must be a number")
+        if not 1 <= rating <= 5:
+            raise ValueError("rating must be between 1 and 5")
+
+    price_range = _text(raw.get("price_range"), "price_range").strip()
+    if price_range not in PRICE_RANGES:
+        raise ValueError(f"price_range must be one of {', '.join(PRICE_RANGES[1:])}")
+    status = _text(raw.get("status"), "status").strip() or DEFAULT_STATUS
+    if status not in models.STATUSES:
+        raise ValueError(f"status must be one of {', '.join(models.STATUSES)}")
+
+    return {
+        "name": name,
+        "address": _text(raw.get("address"), "address").strip(),
+        "latitude": lat,
+        "longitude": lon,
+        "rating": rating,
+        "price_range": price_range,
+        "status": status,
+        "personal_notes": _text(raw.get("personal_notes"), "personal_notes") or None,
+        "cuisines": _split_names(raw.get("cuisines"), "cuisines"),
+        "groups": _split_names(raw.get("groups"), "groups"),
+    }
+
+
+def read_csv(binary_file):
+    """Yield one dict per CSV row, reading the upload incrementally."""
+    text_file = io.TextIOWrapper(binary_file, encoding="utf-8-sig", newline="")
+    try:
+        yield from csv.DictReader(text_file)
+    finally:
+        text_file.detach()  # Leave the upload itself open for FastAPI to close
+
+
+def _feature_record(feature):
+    # Anything that is not the expected shape reads as missing, and
+    # validate() then reports the row
+    props = _object(feature.get("properties"))
+    coords = _object(feature.get("geometry")).get("coordinates")
+    if not isinstance(coords, list):
+        coords = [None, None]
+    record = dict(props)
+    record.setdefault("longitude", coords[0])
+    record.setdefault("latitude", coords[1] if len(coords) > 1 else None)
+
+    # Current Takeout "Saved Places": properties.location.{name,address}, Comment
+    location = _object(props.get("location"))
+    # Older Takeout: Title, Location.{Address, Geo Coordinates}
+    legacy = _object(props.get("Location"))
+    record.setdefault("name", location.get("name") or props.get("Title"))
+    record.setdefault("address", location.get("address") or legacy.get("Address"))
+    if props.get("Comment"):
+        record.setdefault("personal_notes", props["Comment"])
+    geo = _object(legacy.get("Geo Coordinates"))
+    if record["latitude"] is None and geo:
+        record["latitude"], record["longitude"] = geo.get("Latitude"), geo.get("Longitude")
+    return record
+
+
+def read_features(binary_file):
+    """Yield one dict per GeoJSON / Takeout feature.
+
+    The stdlib has no incremental JSON parser, so the document is parsed
+    in one go; validation and inserts still run per row and per chunk.
+    """
+    data = json.load(binary_file)
+    features = data.get("features", []) if isinstance(data, dict) else data
+    if not isinstance(features, list):
+        raise ValueError("expected a FeatureCollection or a list of features")
+    for feature in features:
+        yield _feature_record(feature if isinstance(feature, dict) else {})
+
+
+# --- Import ---
+
+class _Resolver:
+    """Name -> id lookups for cuisines (shared) and the owner's groups, creating missing ones."""
+
+    def __init__(self, db, owner_id):
+        self.db = db
+        self.owner_id = owner_id
+        self.cuisines = {name.lower(): cid for cid, name in db.execute(select(models.Cuisine.id, models.Cuisine.name))}
+        # Group names are not unique per owner; the oldest match wins
+        self.groups = {
+            name.lower(): gid
+            for gid, name in db.execute(
+                select(models.Group.id, models.Group.name).where(models.Group.owner_id == owner_id).order_by(models.Group.id.desc())
+            )
+        }
+        self.created_cuisines = False
+
+    def _missing(self, known, names):
+        missing = {}
+        for name in names:
+            if name.lower() not in known:
+                missing.setdefault(name.lower(), name)
+        return list(missing.values())
+
+    def resolve(self, rows, stamp):
+        new_cuisines = self._missing(self.cuisines, (n for r in rows for n in r["cuisines"]))
+        if new_cuisines:
+            created = self.db.execute(
+                insert(models.Cuisine).returning(models.Cuisine.id, models.Cuisine.name),
+                [{"name": n} | stamp for n in new_cuisines],
+            )
+            created = created.all()
+            self.cuisines.update((name.lower(), cid) for cid, name in created)
+            sync.track(self.db, models.Cuisine, [cid for cid, _ in created])
+            self.created_cuisines = True
+
+        new_groups = self._missing(self.groups, (n for r in rows for n in r["groups"]))
+        if new_groups:
+            created = self.db.execute(
+                insert(models.Group).returning(models.Group.id, models.Group.name),
+                [{"name": n, "owner_id": self.owner_id, "is_published": 0} | stamp for n in new_groups],
+            )
+            created = created.all()
+            self.groups.update((name.lower(), gid) for gid, name in created)
+            sync.track(self.db, models.Group, [gid for gid, _ in created])
+        return new_groups
+
+
+def _insert_chunk(db, resolver, owner_id, rows):
+    R = models.Restaurant
+    # Core inserts skip the ORM flush hook, so stamp the rows for /api/sync here
+    seq, now = sync.stamp(db)
+    stamp = {"change_seq": seq, "updated_at": now}
+    resolver.resolve(rows, stamp)
+    ids = db.execute(
+        insert(R).returning(R.id, sort_by_parameter_order=True),
+        [
+            {k: r[k] for k in ("name", "address", "latitude", "longitude", "rating", "price_range", "status", "personal_notes")}
+            | {"owner_id": owner_id}
+            | stamp
+            for r in rows
+        ],
+    ).scalars().all()
+    sync.track(db, R, ids)
+
+    cuisine_links, group_links, points, touched_groups = [], [], [], set()
+    for rid, r in zip(ids, rows):
+        cuisine_ids = {resolver.cuisines[n.lower()] for n in r["cuisines"]}
+        group_ids = {resolver.groups[n.lower()] for n in r["groups"]}
+        cuisine_links.extend({"restaurant_id": rid, "cuisine_id": cid} for cid in cuisine_ids)
+        group_links.extend({"restaurant_id": rid, "group_id": gid} for gid in group_ids)
+        touched_groups.update(group_ids)
+        points.append(clusters.ClusterPoint(rid, r["latitude"], r["longitude"], r["status"], owner_id, tuple(sorted(group_ids))))
+
+    if cuisine_links:
+        db.execute(models.restaurant_cuisines.insert(), cuisine_links)
+    if group_links:
+        db.execute(models.restaurant_groups.insert(), group_links)
+    clusters.add_points(db, points)
+    versions.bump(db, ("owner", owner_id))
+    versions.bump_groups(db, touched_groups)
+    # Too many rows for a delta; watchers reload
+    events.reset(db, touched_groups)
+    if resolver.created_cuisines:
+        versions.bump(db, versions.CUISINES)
+        resolver.created_cuisines = False
+    db.commit()
+
+
+def import_restaurants(db, owner_id, records):
+    """Validate `records` and insert them for `owner_id` in CHUNK_SIZE transactions.
+
+    Invalid rows are skipped and reported (row numbers are 1-based data
+    rows); valid rows in earlier chunks stay committed if a later one fails.
+    """
+    started = time.perf_counter()
+    resolver = _Resolver(db, owner_id)
+    imported, skipped, errors = 0, 0, []
+    chunk = []
+    for row_number, raw in enumerate(records, start=1):
+        try:
+            chunk.append(validate(raw))
+        except ValueError as e:
+            skipped += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({"row": row_number, "error": str(e)})
+            continue
+        if len(chunk) >= CHUNK_SIZE:
+            _insert_chunk(db, resolver, owner_id, chunk)
+            imported += len(chunk)
+            chunk = []
+    if chunk:
+        _insert_chunk(db, resolver, owner_id, chunk)
+        imported += len(chunk)
+
+    elapsed = time.perf_counter() - started
+    return {
+        "imported": imported,
+        "skipped": skipped,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round((imported + skipped) / elapsed) if elapsed else None,
+    }
+
+
+# --- Export ---
+
+def export_query(owner_id):
+    return restaurant_select().where(models.Restaurant.owner_id == owner_id).order_by(models.Restaurant.id)
+
+
+def _names(items):
+    return [item["name"] for item in items]
+
+
+def _csv_rows(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_FIELDS)
+    for batch in batches:
+        for r in batch:
+            writer.writerow([
+                r["name"], r["address"], r["latitude"], r["longitude"],
+                "" if r["rating"] is None else r["rating"], r["price_range"], r["status"],
+                r["personal_notes"] or "", ";".join(_names(r["cuisines"])), ";".join(_names(r["groups"])),
+            ])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _geojson_feature(r):
+    props = {k: r[k] for k in ("name", "address", "rating", "price_range", "status", "personal_notes")}
+    props["cuisines"] = _names(r["cuisines"])
+    props["groups"] = _names(r["groups"])
+    return {"type": "Feature", "geometry": {"type": "Point", "coordinates": [r["longitude"], r["latitude"]]}, "properties": props}
+
+
+def _takeout_feature(r):
+    # Same shape as Google Takeout's "Saved Places.json"
+    props = {"location": {"name": r["name"], "address": r["address"]}}
+    if r["personal_notes"]:
+        props["Comment"] = r["personal_notes"]
+    return {"type": "Feature", "geometry": {"type": "Point", "coordinates": [r["longitude"], r["latitude"]]}, "properties": props}
+
+
+def _feature_collection(batches, to_feature):
+    yield '{"type":"FeatureCollection","features":['
+    first = True
+    for batch in batches:
+        if not batch:
+            continue
+        body = ",".join(json.dumps(to_feature(r), ensure_ascii=False, separators=(",", ":")) for r in batch)
+        yield body if first else "," + body
+        first = False
+    yield "]}\n"
+
+
+def stream_export(owner_id, fmt, batch_size=1000):
+    """Yield the owner's restaurants as `fmt`, one chunk per batch of rows."""
+    batches = iter_restaurant_batches(export_query(owner_id), batch_size)
+    if fmt == "csv":
+        return _csv_rows(batches)
+    return _feature_collection(batches, _geojson_feature if fmt == "geojson" else _takeout_feature)
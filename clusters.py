@@ -0,0 +1,229 @@
+import math
+from collections import namedtuple
+
+from sqlalchemy import delete, or_, select, text
+
+import models
+
+MAX_CLUSTER_ZOOM = 15  # From zoom 16 the map draws individual markers
+CELLS_PER_TILE = 4  # 64px cells on 256px Web Mercator tiles
+MAX_MERCATOR_LAT = 85.05112878
+
+# What clustering needs to know about a restaurant, captured before and
+# after a write so the difference can be applied to the stored cells.
+ClusterPoint = namedtuple("ClusterPoint", "id latitude longitude status owner_id group_ids")
+
+UPSERT_SQL = text("""
+    INSERT INTO marker_clusters (scope, scope_id, zoom, cell_x, cell_y, status, count, lat_sum, lon_sum, id_sum)
+    VALUES (:scope, :scope_id, :zoom, :cell_x, :cell_y, :status, :count, :lat_sum, :lon_sum, :id_sum)
+    ON CONFLICT (scope, scope_id, zoom, cell_x, cell_y, status) DO UPDATE SET
+        count = marker_clusters.count + excluded.count,
+        lat_sum = marker_clusters.lat_sum + excluded.lat_sum,
+        lon_sum = marker_clusters.lon_sum + excluded.lon_sum,
+        id_sum = marker_clusters.id_sum + excluded.id_sum
+""")
+
+PRUNE_SQL = text("""
+    DELETE FROM marker_clusters
+    WHERE scope = :scope AND scope_id = :scope_id AND zoom = :zoom
+      AND cell_x = :cell_x AND cell_y = :cell_y AND status = :status AND count <= 0
+""")
+
+
+def _project(lat, lon):
+    """Web Mercator position of (lat, lon) in the unit square."""
+    lat = max(-MAX_MERCATOR_LAT, min(MAX_MERCATOR_LAT, lat))
+    s = math.sin(math.radians(lat))
+    return (lon + 180.0) / 360.0, 0.5 - math.log((1 + s) / (1 - s)) / (4 * math.pi)
+
+
+def _grid(x, y, zoom):
+    n = (1 << zoom) * CELLS_PER_TILE
+    return min(n - 1, max(0, int(x * n))), min(n - 1, max(0, int(y * n)))
+
+
+def cell(lat, lon, zoom):
+    """Web Mercator grid cell containing (lat, lon) at `zoom`."""
+    return _grid(*_project(lat, lon), zoom)
+
+
+def _cells(lat, lon):
+    """(zoom, cell_x, cell_y) for every clustered zoom, projecting only once."""
+    x, y = _project(lat, lon)
+    return [(zoom, *_grid(x, y, zoom)) for zoom in range(MAX_CLUSTER_ZOOM + 1)]
+
+
+def snapshot(restaurant):
+    """Capture a restaurant's clustering inputs (None if it has no location)."""
+    if restaurant is None or restaurant.latitude is None or restaurant.longitude is None:
+        return None
+    return ClusterPoint(
+        restaurant.id,
+        restaurant.latitude,
+        restaurant.longitude,
+        restaurant.status or "",
+        restaurant.owner_id,
+        tuple(sorted(g.id for g in restaurant.groups)),
+    )
+
+
+def _scopes(point):
+    scopes = [("group", gid) for gid in point.group_ids]
+    if point.owner_id is not None:
+        scopes.append(("owner", point.owner_id))
+    return scopes
+
+
+def _deltas(point, sign):
+    rows = []
+    for zoom, cell_x, cell_y in _cells(point.latitude, point.longitude):
+        for scope, scope_id in _scopes(point):
+            rows.append({
+                "scope": scope, "scope_id": scope_id, "zoom": zoom,
+                "cell_x": cell_x, "cell_y": cell_y, "status": point.status,
+                "count": sign, "lat_sum": sign * point.latitude,
+                "lon_sum": sign * point.longitude, "id_sum": sign * point.id,
+            })
+    return rows
+
+
+def apply_change(db, old, new):
+    """Move one restaurant from `old` to `new` in the stored clusters.
+
+    Either side may be None (create/delete). Runs inside the caller's
+    transaction, so the clusters commit together with the restaurant.
+    """
+    if old == new:
+        return
+    removed = _deltas(old, -1) if old else []
+    added = _deltas(new, 1) if new else []
+    db.execute(UPSERT_SQL, removed + added)
+    if removed:
+        db.execute(PRUNE_SQL, removed)
+
+
+def drop_group(db, group_id):
+    db.execute(delete(models.MarkerCluster).where(
+        models.MarkerCluster.scope == "group", models.MarkerCluster.scope_id == group_id
+    ))
+
+
+def _aggregate(points):
+    """Sum many points into per-cell rows, ready for insert or UPSERT_SQL."""
+    cells = {}
+    for point in points:
+        scopes = _scopes(point)
+        for zoom, cell_x, cell_y in _cells(point.latitude, point.longitude):
+            for scope, scope_id in scopes:
+                key = (scope, scope_id, zoom, cell_x, cell_y, point.status)
+                acc = cells.get(key)
+                if acc is None:
+                    cells[key] = [1, point.latitude, point.longitude, point.id]
+                else:
+                    acc[0] += 1
+                    acc[1] += point.latitude
+                    acc[2] += point.longitude
+                    acc[3] += point.id
+    return [
+        {"scope": k[0], "scope_id": k[1], "zoom": k[2], "cell_x": k[3], "cell_y": k[4], "status": k[5],
+         "count": v[0], "lat_sum": v[1], "lon_sum": v[2], "id_sum": v[3]}
+        for k, v in cells.items()
+    ]
+
+
+def add_points(db, points):
+    """Add many new restaurants at once: one UPSERT row per touched cell, not per point."""
+    rows = _aggregate(points)
+    if rows:
+        db.execute(UPSERT_SQL, rows)
+
+
+def rebuild(db):
+    """Recompute every cluster from scratch (backfill for existing databases)."""
+    R = models.Restaurant
+    rg = models.restaurant_groups
+    memberships = {}
+    for restaurant_id, group_id in db.execute(select(rg.c.restaurant_id, rg.c.group_id)):
+        memberships.setdefault(restaurant_id, []).append(group_id)
+
+    rows = db.execute(
+        select(R.id, R.latitude, R.longitude, R.status, R.owner_id)
+        .where(R.latitude.isnot(None), R.longitude.isnot(None))
+    )
+    cells = _aggregate(
+        ClusterPoint(rid, lat, lon, status or "", owner_id, tuple(memberships.get(rid, ())))
+        for rid, lat, lon, status, owner_id in rows
+    )
+
+    db.execute(delete(models.MarkerCluster))
+    if cells:
+        db.execute(models.MarkerCluster.__table__.insert(), cells)
+    return len(cells)
+
+
+def install_clusters(db):
+    """Backfill clusters once for databases that predate them (caller commits)."""
+    has_clusters = db.execute(select(models.MarkerCluster.zoom).limit(1)).first()
+    has_points = db.execute(select(models.Restaurant.id).where(models.Restaurant.latitude.isnot(None)).limit(1)).first()
+    if has_points and not has_clusters:
+        print(f"Clusters: rebuilt {rebuild(db)} cells.")
+
+
+def _cell_ranges(bbox, zoom):
+    min_lon, min_lat, max_lon, max_lat = bbox
+    x0, y_north = cell(max_lat, min_lon, zoom)
+    x1, y_south = cell(min_lat, max_lon, zoom)
+    if min_lon <= max_lon:
+        x_ranges = [(x0, x1)]
+    else:
+        n = (1 << zoom) * CELLS_PER_TILE
+        x_ranges = [(x0, n - 1), (0, x1)]
+    return x_ranges, (y_north, y_south)
+
+
+def read_clusters(db, scope, scope_id, zoom, bbox=None, statuses=None):
+    """Clusters for one scope at `zoom`, merged across statuses per cell."""
+    C = models.MarkerCluster
+    query = select(C.cell_x, C.cell_y, C.status, C.count, C.lat_sum, C.lon_sum, C.id_sum).where(
+        C.scope == scope, C.scope_id == scope_id, C.zoom == zoom
+    )
+    if statuses:
+        query = query.where(C.status.in_(statuses))
+    if bbox:
+        x_ranges, (y0, y1) = _cell_ranges(bbox, zoom)
+        query = query.where(or_(*[C.cell_x.between(a, b) for a, b in x_ranges]), C.cell_y.between(y0, y1))
+
+    merged = {}
+    for cell_x, cell_y, status, count, lat_sum, lon_sum, id_sum in db.execute(query):
+        acc = merged.setdefault((cell_x, cell_y), {"count": 0, "lat_sum": 0.0, "lon_sum": 0.0, "id_sum": 0, "statuses": {}})
+        acc["count"] += count
+        acc["lat_sum"] += lat_sum
+        acc["lon_sum"] += lon_sum
+        acc["id_sum"] += id_sum
+        acc["statuses"][status] = acc["statuses"].get(status, 0) + count
+
+    cells = [
+        {
+            "count": acc["count"],
+            "latitude": acc["lat_sum"] / acc["count"],
+            "longitude": acc["lon_sum"] / acc["count"],
+            "statuses": acc["statuses"],
+            "restaurant_id": acc["id_sum"] if acc["count"] == 1 else None,
+            "restaurant": None,
+        }
+        for acc in merged.values()
+    ]
+
+    # A cell of one is drawn as that restaurant's marker, which may not be on
+    # the client's current list page: send what the marker and popup show
+    singles = [c["restaurant_id"] for c in cells if c["restaurant_id"] is not None]
+    if singles:
+        R = models.Restaurant
+        rows = {
+            row.id: dict(row._mapping)
+            for row in db.execute(select(R.id, R.name, R.address, R.latitude, R.longitude, R.status).where(R.id.in_(singles)))
+        }
+        for c in cells:
+            if c["restaurant_id"] is not None:
+                c["restaurant"] = rows.get(c["restaurant_id"])
+    return cells
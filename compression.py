@@ -0,0 +1,40 @@
+"""Compressed variants of responses, shared by response_cache and assets.
+
+Bodies are compressed once (per cached version, or at build time) at the
+highest levels, so the cost is paid off by every later hit.
+"""
+import gzip
+import re
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip alone still covers every browser
+    brotli = None
+
+# br first: it is the smaller of the two when both exist
+ENCODINGS = ("br", "gzip")
+REFUSED_RE = re.compile(r"q\s*=\s*0(\.0*)?")
+
+
+def compress(data):
+    """{encoding: bytes} for gzip and, with the brotli package, br."""
+    variants = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}  # mtime=0: same input, same bytes
+    if brotli is not None:
+        variants["br"] = brotli.compress(data, quality=11)
+    return variants
+
+
+def accepted(accept_encoding):
+    """Codings an Accept-Encoding header takes; "gzip;q=0" is a refusal."""
+    codings = set()
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.partition(";")
+        if not REFUSED_RE.fullmatch(params.strip()):
+            codings.add(coding.strip())
+    return codings
+
+
+def negotiate(accept_encoding, available):
+    """The preferred encoding in `available` that the client takes, or None."""
+    codings = accepted(accept_encoding)
+    return next((e for e in ENCODINGS if e in available and e in codings), None)
@@ -1,16 +1,146 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 import os
 
-# Use DATABASE_URL env var if available (Render), else fallback to local file
-SQLITE_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./foodmapper_v2.db")
+# Use DATABASE_URL env var if available (Render), else fallback to local file.
+# A postgresql:// URL (Render and Heroku hand out postgres://) selects the
+# Postgres profile below.
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./foodmapper_v2.db")
+if DATABASE_URL.startswith("postgres://"):
+    DATABASE_URL = "postgresql://" + DATABASE_URL[len("postgres://"):]
+# Optional read replica for the reader pool (Postgres only)
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
 
-engine = create_engine(
-    SQLITE_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+# --- SQLite profile ---
+# Applied to every new connection. WAL lets readers run alongside the
+# writer; NORMAL sync is durable across app crashes (only an OS crash can
+# lose the last commits); busy_timeout makes lock waits retry instead of
+# failing with "database is locked". Override any of them via env vars.
+SQLITE_PRAGMAS = {
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),  # Negative means KiB: 64 MiB
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+}
+SQLITE_READ_POOL_SIZE = int(os.getenv("SQLITE_READ_POOL_SIZE", "8"))
+
+# --- Postgres profile ---
+# The pool is per process: size it so workers x (size + overflow) stays
+# under the server's max_connections. pre_ping replaces connections the
+# server or a proxy closed while idle, recycle retires them before such
+# timeouts, and statement_timeout stops one runaway query from holding a
+# connection (and its locks) for good. Times are in milliseconds.
+PG_POOL = {
+    "pool_size": int(os.getenv("PG_POOL_SIZE", "10")),
+    "max_overflow": int(os.getenv("PG_MAX_OVERFLOW", "10")),
+    "pool_timeout": int(os.getenv("PG_POOL_TIMEOUT", "30")),
+    "pool_recycle": int(os.getenv("PG_POOL_RECYCLE", "1800")),
+}
+PG_SETTINGS = {
+    "statement_timeout": int(os.getenv("PG_STATEMENT_TIMEOUT_MS", "15000")),
+    "lock_timeout": int(os.getenv("PG_LOCK_TIMEOUT_MS", "5000")),
+    "idle_in_transaction_session_timeout": int(os.getenv("PG_IDLE_IN_TRANSACTION_TIMEOUT_MS", "60000")),
+}
+PG_APPLICATION_NAME = os.getenv("PG_APPLICATION_NAME", "foodmapper")
+
+
+def is_sqlite(url):
+    return url.startswith("sqlite")
+
+
+def is_postgres(url):
+    return url.startswith("postgresql")
+
+
+def apply_sqlite_profile(engine, pragmas, read_only=False):
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        if read_only:
+            # Reader connections can never take the write lock by accident
+            cursor.execute("PRAGMA query_only = ON")
+        cursor.close()
+
+
+def create_postgres_engine(url, pool=PG_POOL, settings=PG_SETTINGS):
+    # Session settings go in the startup packet, so they cost no round trip
+    options = " ".join(f"-c {name}={value}" for name, value in settings.items())
+    connect_args = {"options": options, "application_name": PG_APPLICATION_NAME}
+    return create_engine(url, connect_args=connect_args, pool_pre_ping=True, **pool)
+
+
+def create_engines(url, pragmas=SQLITE_PRAGMAS, read_pool_size=SQLITE_READ_POOL_SIZE, read_url=None):
+    """Return (write_engine, read_engine) for `url`.
+
+    SQLite allows one writer at a time, so writes share a single pooled
+    connection and queue in the pool instead of colliding on the database
+    lock; reads get their own pool and, under WAL, never wait for the
+    writer. Postgres handles concurrency itself and gets one pooled engine
+    for both roles, unless `read_url` points the readers at a replica.
+    Other backends get one engine with pre-ping and default pooling.
+    """
+    if is_postgres(url):
+        engine = create_postgres_engine(url)
+        return engine, create_postgres_engine(read_url) if read_url else engine
+    if not is_sqlite(url):
+        engine = create_engine(url, pool_pre_ping=True)
+        return engine, engine
+
+    # Request handlers run in the threadpool, so connections must be
+    # usable from whichever worker thread picks them up
+    connect_args = {"check_same_thread": False}
+    write_engine = create_engine(url, connect_args=connect_args, pool_size=1, max_overflow=0)
+    read_engine = create_engine(url, connect_args=connect_args, pool_size=read_pool_size, max_overflow=read_pool_size)
+    if pragmas:
+        apply_sqlite_profile(write_engine, pragmas)
+        apply_sqlite_profile(read_engine, pragmas, read_only=True)
+    return write_engine, read_engine
+
+
+def sqlite_settings(engine):
+    """Effective values of the profile pragmas, as SQLite reports them."""
+    if not is_sqlite(str(engine.url)):
+        return {}
+    with engine.connect() as conn:
+        return {name: conn.execute(text(f"PRAGMA {name}")).scalar() for name in (*SQLITE_PRAGMAS, "query_only")}
+
+
+def postgres_settings(engine):
+    """Effective values of the profile settings, as the server reports them."""
+    if engine.dialect.name != "postgresql":
+        return {}
+    with engine.connect() as conn:
+        return {name: conn.execute(text(f"SHOW {name}")).scalar() for name in (*PG_SETTINGS, "server_version")}
+
+
+def report_database_settings():
+    """Print the effective connection settings at startup and flag drift from the profile."""
+    if is_postgres(DATABASE_URL):
+        roles = (("writer", engine),) if read_engine is engine else (("writer", engine), ("reader", read_engine))
+        for role, eng in roles:
+            print(f"Postgres {role} (pool {eng.pool.size()}+{PG_POOL['max_overflow']}): "
+                  + ", ".join(f"{k}={v}" for k, v in postgres_settings(eng).items()))
+        return
+    if not is_sqlite(DATABASE_URL):
+        return
+    for role, eng in (("writer", engine), ("reader", read_engine)):
+        settings = sqlite_settings(eng)
+        print(f"SQLite {role} (pool {eng.pool.size()}): " + ", ".join(f"{k}={v}" for k, v in settings.items()))
+    journal = sqlite_settings(engine)["journal_mode"]
+    if str(journal).lower() != str(SQLITE_PRAGMAS["journal_mode"]).lower():
+        # e.g. WAL is unavailable for in-memory databases and some network filesystems
+        print(f"WARNING: SQLite journal_mode is {journal}, expected {SQLITE_PRAGMAS['journal_mode']}")
+
+
+engine, read_engine = create_engines(DATABASE_URL, read_url=DATABASE_READ_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
 Base = declarative_base()
 
@@ -20,3 +150,11 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def get_read_db():
+    # For handlers that only read: served by the reader pool
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
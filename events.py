@@ -0,0 +1,207 @@
+"""Live updates for shared and published groups, sent as Server-Sent Events.
+
+Write endpoints call publish() or reset() next to their
+versions.bump_groups() calls. The events wait on the session and are sent
+only after it commits, so viewers never see a change that was rolled
+back; a group nobody is watching costs nothing beyond a dict lookup.
+
+Each connection is one coroutine waiting on an asyncio.Event, with a
+bounded deque of pre-encoded messages. Messages for a group are encoded
+once and shared by all its viewers. A viewer that falls QUEUE_SIZE
+messages behind (its socket stopped draining) is disconnected; like
+every new connection, its reconnect starts with a "ready" event, and the
+client reloads the list on that. Streams:
+
+    event: ready    connected; (re)load the list now
+    event: change   {"upserted": [restaurant, ...], "removed": [id, ...]}
+    event: reset    the group's restaurants all changed (a rename, say); reload
+
+After a group is unpublished or deleted its viewers get a reset and are
+disconnected; their reconnect re-checks access.
+"""
+import asyncio
+import json
+from collections import deque
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+import models
+from database import ReadSessionLocal
+from serializers import restaurant_select, serialize_restaurants
+
+QUEUE_SIZE = 64  # Messages a viewer may fall behind before it is dropped
+MAX_SUBSCRIBERS = 10000
+HEARTBEAT_SECONDS = 20  # Keeps proxies from timing out idle streams
+RETRY_MS = 5000
+
+READY = f"retry: {RETRY_MS}\nevent: ready\ndata: {{}}\n\n".encode()
+RESET = b"event: reset\ndata: {}\n\n"
+HEARTBEAT = b": ping\n\n"
+STREAM_HEADERS = {"Cache-Control": "no-store", "X-Accel-Buffering": "no"}  # X-Accel: don't let nginx buffer it
+
+
+class Subscriber:
+    __slots__ = ("pending", "wake", "closed")
+
+    def __init__(self):
+        self.pending = deque()
+        self.wake = asyncio.Event()
+        self.closed = False
+
+
+# Channels are changed only on the event loop; writer threads just check
+# membership before queueing anything
+_loop = None
+_channels = {}  # group id -> set of Subscriber
+_stats = {"subscribers": 0, "connections": 0, "messages": 0, "evictions": 0, "resets": 0}
+
+
+def watched(group_ids):
+    return [gid for gid in group_ids if gid in _channels]
+
+
+def _pending(db, gid):
+    return db.info.setdefault("group_events", {}).setdefault(gid, {"upserted": set(), "removed": set(), "reset": None})
+
+
+def publish(db, group_ids, upserted=(), removed=()):
+    """Send restaurant changes to the viewers of `group_ids` once `db` commits."""
+    for gid in watched(group_ids):
+        change = _pending(db, gid)
+        change["upserted"].update(upserted)
+        change["removed"].update(removed)
+
+
+def reset(db, group_ids):
+    """Tell the viewers of `group_ids` to reload once `db` commits."""
+    for gid in watched(group_ids):
+        change = _pending(db, gid)
+        change["reset"] = change["reset"] or "reload"
+
+
+def close(db, group_ids):
+    """Like reset(), then disconnect them: for groups that were unpublished or deleted."""
+    for gid in watched(group_ids):
+        _pending(db, gid)["reset"] = "close"
+
+
+def _message(name, payload):
+    return f"event: {name}\ndata: {json.dumps(payload, separators=(',', ':'))}\n\n".encode()
+
+
+def _messages(pending):
+    """Encode one message per group, reading the restaurants as committed."""
+    messages = []
+    upserted = {rid for change in pending.values() if not change["reset"] for rid in change["upserted"]}
+    rows, members = {}, set()
+    if upserted:
+        with ReadSessionLocal() as db:
+            rows = {r["id"]: r for r in serialize_restaurants(db, restaurant_select().where(models.Restaurant.id.in_(upserted)))}
+            rg = models.restaurant_groups
+            members = set(db.execute(
+                select(rg.c.group_id, rg.c.restaurant_id)
+                .where(rg.c.restaurant_id.in_(upserted), rg.c.group_id.in_(list(pending)))
+            ).tuples())
+
+    for gid, change in pending.items():
+        if change["reset"]:
+            messages.append((gid, change["reset"]))
+            continue
+        # Whatever left the group since (or was deleted) goes out as removed
+        current = sorted(rid for rid in change["upserted"] if (gid, rid) in members and rid in rows)
+        removed = sorted(change["removed"] | (change["upserted"] - set(current)))
+        if current or removed:
+            messages.append((gid, _message("change", {"upserted": [rows[rid] for rid in current], "removed": removed})))
+    return messages
+
+
+def _deliver(messages):
+    # On the event loop
+    for gid, message in messages:
+        for sub in list(_channels.get(gid, ())):
+            if message in ("reload", "close"):
+                # A reset replaces whatever was still queued
+                sub.pending.clear()
+                sub.pending.append(RESET)
+                if message == "close":
+                    _close(gid, sub)
+                _stats["resets"] += 1
+            elif len(sub.pending) >= QUEUE_SIZE:
+                sub.pending.clear()
+                _close(gid, sub)
+                _stats["evictions"] += 1
+            else:
+                sub.pending.append(message)
+                _stats["messages"] += 1
+            sub.wake.set()
+
+
+def _close(gid, sub):
+    sub.closed = True
+    _unsubscribe(gid, sub)
+
+
+def _unsubscribe(gid, sub):
+    subscribers = _channels.get(gid)
+    if subscribers is not None and sub in subscribers:
+        subscribers.discard(sub)
+        _stats["subscribers"] -= 1
+        if not subscribers:
+            del _channels[gid]
+
+
+@event.listens_for(Session, "after_commit")
+def _send_after_commit(session):
+    pending = session.info.pop("group_events", None)
+    if not pending or _loop is None:
+        return
+    # The write is committed by now; failing here must not fail the request
+    try:
+        _loop.call_soon_threadsafe(_deliver, _messages(pending))
+    except Exception as e:
+        print(f"Live updates for groups {sorted(pending)} not sent: {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_on_rollback(session):
+    session.info.pop("group_events", None)
+
+
+async def _stream(group_id):
+    global _loop
+    _loop = asyncio.get_running_loop()
+    sub = Subscriber()
+    _channels.setdefault(group_id, set()).add(sub)
+    _stats["subscribers"] += 1
+    _stats["connections"] += 1
+    try:
+        yield READY
+        while True:
+            try:
+                await asyncio.wait_for(sub.wake.wait(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield HEARTBEAT
+                continue
+            sub.wake.clear()
+            if sub.pending:
+                chunk = b"".join(sub.pending)
+                sub.pending.clear()
+                yield chunk
+            if sub.closed:
+                return
+    finally:
+        _unsubscribe(group_id, sub)
+
+
+def stream_response(group_id):
+    """The event stream for one group's viewers."""
+    if _stats["subscribers"] >= MAX_SUBSCRIBERS:
+        raise HTTPException(status_code=503, detail="Too many live viewers", headers={"Retry-After": "30"})
+    return StreamingResponse(_stream(group_id), media_type="text/event-stream", headers=STREAM_HEADERS)
+
+
+def stats():
+    return {**_stats, "channels": len(_channels)}
@@ -0,0 +1,66 @@
+from sqlalchemy import distinct, func, select
+
+import models
+
+R = models.Restaurant
+rc = models.restaurant_cuisines
+rg = models.restaurant_groups
+
+
+def facet_clauses(status=None, cuisine_id=None, price_range=None, group_id=None, min_rating=None):
+    """WHERE clauses for the list filters, keyed by facet.
+
+    Multi-valued facets are ORed within the facet and ANDed across facets.
+    Keeping them keyed lets facet_counts() drop a facet's own clause when
+    counting that facet.
+    """
+    clauses = {}
+    if status:
+        clauses["status"] = R.status.in_(status)
+    if price_range:
+        clauses["price_range"] = R.price_range.in_(price_range)
+    if cuisine_id:
+        clauses["cuisine_id"] = R.id.in_(select(rc.c.restaurant_id).where(rc.c.cuisine_id.in_(cuisine_id)))
+    if group_id:
+        clauses["group_id"] = R.id.in_(select(rg.c.restaurant_id).where(rg.c.group_id.in_(group_id)))
+    if min_rating is not None:
+        clauses["rating"] = R.rating >= min_rating
+    return clauses
+
+
+def _others(clauses, facet):
+    return [clause for name, clause in clauses.items() if name != facet]
+
+
+def facet_counts(db, base_filters, clauses):
+    """Per-value counts for every facet, one GROUP BY query each.
+
+    Each facet is counted under all the *other* active filters, so picking
+    "Thai" still shows how many restaurants every other cuisine would give.
+    """
+    def column_counts(column, facet):
+        rows = db.execute(
+            select(column, func.count()).where(*base_filters, *_others(clauses, facet))
+            .group_by(column).order_by(column)
+        )
+        return [{"value": value, "count": count} for value, count in rows]
+
+    def link_counts(table, fk, model, facet):
+        rows = db.execute(
+            select(model.id, model.name, func.count(distinct(R.id)))
+            .select_from(R)
+            .join(table, table.c.restaurant_id == R.id)
+            .join(model, model.id == fk)
+            .where(*base_filters, *_others(clauses, facet))
+            .group_by(model.id, model.name)
+            .order_by(model.name)
+        )
+        return [{"value": value, "name": name, "count": count} for value, name, count in rows]
+
+    return {
+        "status": column_counts(R.status, "status"),
+        "price_range": column_counts(R.price_range, "price_range"),
+        "rating": column_counts(R.rating, "rating"),
+        "cuisine_id": link_counts(rc, rc.c.cuisine_id, models.Cuisine, "cuisine_id"),
+        "group_id": link_counts(rg, rg.c.group_id, models.Group, "group_id"),
+    }
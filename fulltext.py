@@ -0,0 +1,134 @@
+import re
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, func, literal_column, select, text
+
+import models
+
+# Like the R*Tree, the FTS5 table is owned by install_search_index() rather
+# than create_all(); this Table only lets queries refer to its columns.
+fts_metadata = MetaData()
+
+restaurant_fts = Table(
+    "restaurant_fts", fts_metadata,
+    Column("rowid", Integer, primary_key=True),  # == restaurants.id
+    Column("name", String),
+    Column("address", String),
+    Column("personal_notes", String),
+    Column("cuisines", String),
+)
+
+# Snippet markers: control characters the client escapes around before
+# turning them into <mark> tags, so user text never reaches innerHTML raw.
+SNIPPET_OPEN = "\x02"
+SNIPPET_CLOSE = "\x03"
+
+# bm25 column weights: name, address, personal_notes, cuisines
+BM25_WEIGHTS = (10.0, 2.0, 1.0, 4.0)
+
+CUISINE_NAMES_SQL = (
+    "(SELECT group_concat(c.name, ' ') FROM restaurant_cuisines rc "
+    "JOIN cuisines c ON c.id = rc.cuisine_id WHERE rc.restaurant_id = {id})"
+)
+
+FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS restaurant_fts
+       USING fts5(name, address, personal_notes, cuisines,
+                  tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4')""",
+    f"""CREATE TRIGGER IF NOT EXISTS restaurants_fts_insert AFTER INSERT ON restaurants
+       BEGIN
+           INSERT INTO restaurant_fts(rowid, name, address, personal_notes, cuisines)
+           VALUES (new.id, new.name, new.address, new.personal_notes, {CUISINE_NAMES_SQL.format(id="new.id")});
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS restaurants_fts_update AFTER UPDATE OF name, address, personal_notes ON restaurants
+       BEGIN
+           UPDATE restaurant_fts SET name = new.name, address = new.address, personal_notes = new.personal_notes
+           WHERE rowid = new.id;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS restaurants_fts_delete AFTER DELETE ON restaurants
+       BEGIN
+           DELETE FROM restaurant_fts WHERE rowid = old.id;
+       END""",
+    f"""CREATE TRIGGER IF NOT EXISTS restaurant_cuisines_fts_insert AFTER INSERT ON restaurant_cuisines
+       BEGIN
+           UPDATE restaurant_fts SET cuisines = {CUISINE_NAMES_SQL.format(id="new.restaurant_id")}
+           WHERE rowid = new.restaurant_id;
+       END""",
+    f"""CREATE TRIGGER IF NOT EXISTS restaurant_cuisines_fts_delete AFTER DELETE ON restaurant_cuisines
+       BEGIN
+           UPDATE restaurant_fts SET cuisines = {CUISINE_NAMES_SQL.format(id="old.restaurant_id")}
+           WHERE rowid = old.restaurant_id;
+       END""",
+    f"""CREATE TRIGGER IF NOT EXISTS cuisines_fts_update AFTER UPDATE OF name ON cuisines
+       BEGIN
+           UPDATE restaurant_fts SET cuisines = {CUISINE_NAMES_SQL.format(id="restaurant_fts.rowid")}
+           WHERE rowid IN (SELECT restaurant_id FROM restaurant_cuisines WHERE cuisine_id = new.id);
+       END""",
+]
+
+BACKFILL_SQL = f"""
+    INSERT INTO restaurant_fts(rowid, name, address, personal_notes, cuisines)
+    SELECT r.id, r.name, r.address, r.personal_notes, {CUISINE_NAMES_SQL.format(id="r.id")}
+    FROM restaurants r
+"""
+
+
+def has_fts(engine):
+    return engine.dialect.name == "sqlite"
+
+
+def install_search_index(conn):
+    """Create the FTS5 index and its sync triggers, backfilling on first run (SQLite only)."""
+    if not has_fts(conn):
+        return
+    exists = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'restaurant_fts'")
+    ).first()
+    for ddl in FTS_DDL:
+        conn.execute(text(ddl))
+    if not exists:
+        conn.execute(text(BACKFILL_SQL))
+        print("Search index: backfilled restaurant_fts.")
+
+
+def rebuild_search_index(engine):
+    """Repopulate the index from scratch (e.g. after editing rows outside the app)."""
+    if not has_fts(engine):
+        return
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM restaurant_fts"))
+        conn.execute(text(BACKFILL_SQL))
+
+
+def match_query(value: str):
+    """Turn free text into an FTS5 query where every word must match as a prefix.
+
+    Each word is quoted, so FTS5 syntax in user input (NEAR, -, :, ^, ...)
+    is never interpreted. Returns None when there is nothing to search for.
+    """
+    terms = re.findall(r"\w+", value)
+    if not terms:
+        return None
+    return " ".join(f'"{t}"*' for t in terms)
+
+
+def search_clause(fts_query: str):
+    """WHERE clause form of a search, for queries that only need to filter (e.g. facet counts)."""
+    return models.Restaurant.id.in_(
+        select(restaurant_fts.c.rowid).where(literal_column("restaurant_fts").op("MATCH")(fts_query))
+    )
+
+
+def apply_search(query, fts_query: str, ranked: bool = False):
+    """Restrict a restaurant_select() to FTS matches and add a highlighted snippet.
+
+    With `ranked`, results are ordered by bm25 relevance (best first).
+    """
+    fts = literal_column("restaurant_fts")
+    query = (
+        query.join(restaurant_fts, restaurant_fts.c.rowid == models.Restaurant.id)
+        .where(fts.op("MATCH")(fts_query))
+        .add_columns(func.snippet(fts, -1, SNIPPET_OPEN, SNIPPET_CLOSE, "…", 12).label("snippet"))
+    )
+    if ranked:
+        query = query.order_by(func.bm25(fts, *BM25_WEIGHTS))
+    return query
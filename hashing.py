@@ -0,0 +1,94 @@
+"""Password hashing on a dedicated, bounded thread pool.
+
+pbkdf2 is deliberately slow. Running it on the event loop stalls every
+request, and running it on the shared threadpool lets a burst of logins
+take the threads that ordinary handlers need. It gets its own small pool
+instead; passlib's pbkdf2 backend (hashlib / OpenSSL) releases the GIL,
+so the pool's threads hash in parallel. Once HASH_QUEUE_LIMIT hashes are
+queued or running, new ones are refused with Overloaded rather than
+queueing without bound. A slot is held until the hash itself finishes,
+not until the request stops waiting: a client that disconnects mid-login
+cannot stop a running hash, so its slot is freed only when that hash ends.
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from passlib.context import CryptContext
+
+# Work factor for new hashes. Existing hashes with a different round
+# count are rehashed the next time their owner logs in.
+HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", "29000"))  # passlib's pbkdf2_sha256 default
+HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", str(HASH_WORKERS * 16)))
+RETRY_AFTER_SECONDS = 1
+
+pwd_context = CryptContext(
+    schemes=["pbkdf2_sha256"],
+    deprecated="auto",
+    pbkdf2_sha256__default_rounds=HASH_ROUNDS,
+    pbkdf2_sha256__min_rounds=HASH_ROUNDS,
+    pbkdf2_sha256__max_rounds=HASH_ROUNDS,
+)
+
+
+class Overloaded(Exception):
+    """The hashing queue is full; the caller should answer 503 with Retry-After."""
+
+
+_executor = None
+# Released from the pool's threads, so guarded by _lock
+_lock = threading.Lock()
+_in_flight = 0
+_stats = {"completed": 0, "failed": 0, "rejected": 0, "rehashed": 0}
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="password-hash")
+    return _executor
+
+
+def _release(future):
+    global _in_flight
+    # Runs when the job ends: finished, failed, or cancelled before it started
+    with _lock:
+        _in_flight -= 1
+        _stats["failed" if future.cancelled() or future.exception() else "completed"] += 1
+
+
+async def _run(fn, *args):
+    global _in_flight
+    with _lock:
+        if _in_flight >= HASH_QUEUE_LIMIT:
+            _stats["rejected"] += 1
+            raise Overloaded()
+        _in_flight += 1
+    future = _get_executor().submit(fn, *args)
+    future.add_done_callback(_release)
+    # Cancelling the wait cancels a job still queued; a running one finishes
+    return await asyncio.wrap_future(future)
+
+
+async def verify(password, hashed):
+    """Check `password`; returns (valid, new_hash), new_hash set when the stored hash should be replaced."""
+    valid, new_hash = await _run(pwd_context.verify_and_update, password, hashed)
+    if new_hash:
+        _stats["rehashed"] += 1
+    return valid, new_hash
+
+
+async def hash_password(password):
+    return await _run(pwd_context.hash, password)
+
+
+def stats():
+    return {
+        **_stats,
+        "in_flight": _in_flight,
+        "workers": HASH_WORKERS,
+        "queue_limit": HASH_QUEUE_LIMIT,
+        "rounds": HASH_ROUNDS,
+    }
@@ -1,27 +1,54 @@
-from fastapi import FastAPI, Depends, HTTPException, status
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, RedirectResponse
+from fastapi import FastAPI, Depends, File, HTTPException, Query, UploadFile, status
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import text
+from sqlalchemy import select, update
 from typing import List, Optional
 from pydantic import BaseModel, ConfigDict
 import models
-from database import engine, get_db
+from database import engine, read_engine, SessionLocal, ReadSessionLocal, get_db, get_read_db, report_database_settings
+from serializers import FastJSONResponse, restaurant_select, serialize_restaurants, serialize_restaurant, stream_restaurants_ndjson, to_columns
+import spatial
+import clusters
+import fulltext
+import facets
+import pagination
+import sampling
+import auth_cache
+import versions
+import response_cache
+import backup
+import bulk
+import migrations
+import hashing
+import metrics
+import sync
+import assets
+import events
 import os
+import csv
 from dotenv import load_dotenv
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 import uuid
+import secrets
+from contextlib import asynccontextmanager
 
 load_dotenv()
 
-models.Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Runs once per worker before it serves, not on every import of this
+    # module (the reloader, tooling and tests import it too)
+    print(f"--- Database Connection: {engine.url} ---")
+    migrations.run(engine)
+    sync.prune_tombstones(engine)
+    report_database_settings()
+    create_default_admin()
+    yield
 
-print(f"--- Database Connection: {engine.url} ---")
-
-app = FastAPI()
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 
 # --- Auth Configuration ---
 SECRET_KEY = os.getenv("SECRET_KEY")
@@ -31,14 +58,11 @@ if not SECRET_KEY:
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 # Reduced from 30 days
 
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/token")
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    # Blocking; request handlers use the bounded pool in hashing.py instead
+    return hashing.pwd_context.hash(password)
 
 # --- Startup & Default User ---
 def create_default_admin():
@@ -61,8 +85,6 @@ def create_default_admin():
     finally:
         db.close()
 
-create_default_admin()
-
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -83,7 +105,34 @@ def get_token_from_cookie(request: Request):
         return None
     return token
 
-async def get_current_user_cookie(request: Request, db: Session = Depends(get_db)):
+def load_principal(token: str, db: Session):
+    """Verify a token and look its user up, filling the principal cache.
+
+    Returns None if the token is invalid or the user is gone. Blocking:
+    call it through run_in_threadpool from async code.
+    """
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    username = payload.get("sub")
+    if not username:
+        return None
+    user = db.query(models.User).filter(models.User.username == username).first()
+    if user is None:
+        return None
+    return auth_cache.put(token, user, payload.get("exp"))
+
+async def resolve_user(token: str, db: Session):
+    # A cached token was already verified, so hits need neither the JWT
+    # decode nor the database and stay on the event loop. Misses do both
+    # in the threadpool, so a slow query never stalls other requests.
+    principal = auth_cache.get(token)
+    if principal is None:
+        principal = await run_in_threadpool(load_principal, token, db)
+    return principal
+
+async def get_current_user_cookie(request: Request, db: Session = Depends(get_read_db)):
     token = get_token_from_cookie(request)
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -93,47 +142,68 @@ async def get_current_user_cookie(request: Request, db: Session = Depends(get_db
         # Check if we are in a "public" route or just failing auth
         # For get_current_user, we expect auth.
         raise credentials_exception
-    
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-        
-    user = db.query(models.User).filter(models.User.username == username).first()
+
+    user = await resolve_user(token, db)
     if user is None:
         raise credentials_exception
     return user
 
-async def get_optional_user_cookie(request: Request, db: Session = Depends(get_db)):
+async def get_optional_user_cookie(request: Request, db: Session = Depends(get_read_db)):
     token = get_token_from_cookie(request)
     if not token:
         return None
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if not username: return None
-        user = db.query(models.User).filter(models.User.username == username).first()
-        return user
-    except:
-        return None
+    return await resolve_user(token, db)
 
 
 @app.get("/api/users/me")
-def read_users_me(current_user: models.User = Depends(get_current_user_cookie)):
+def read_users_me(current_user: auth_cache.Principal = Depends(get_current_user_cookie)):
     return {"username": current_user.username, "email": current_user.email}
 
 @app.post("/api/logout")
-def logout(response: Response):
+def logout(request: Request, response: Response):
+    token = get_token_from_cookie(request)
+    if token:
+        auth_cache.invalidate_token(token)
     response.delete_cookie("access_token")
     return {"ok": True}
 
+def find_password_user(username: str):
+    # Own short session: no reader connection stays checked out while the hash is computed
+    db = ReadSessionLocal()
+    try:
+        return db.execute(
+            select(models.User.id, models.User.username, models.User.hashed_password)
+            .where(models.User.username == username)
+        ).first()
+    finally:
+        db.close()
+
+def store_password_hash(user_id: int, hashed_password: str):
+    db = SessionLocal()
+    try:
+        db.execute(update(models.User).where(models.User.id == user_id).values(hashed_password=hashed_password))
+        db.commit()
+    finally:
+        db.close()
+
 @app.post("/api/token")
-async def login_for_access_token(response: Response, form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.username == form_data.username).first()
-    if not user or not user.hashed_password or not verify_password(form_data.password, user.hashed_password):
+async def login_for_access_token(response: Response, form_data: OAuth2PasswordRequestForm = Depends()):
+    user = await run_in_threadpool(find_password_user, form_data.username)
+    valid = False
+    if user and user.hashed_password:
+        # The hash check runs on its own bounded pool (see hashing.py)
+        try:
+            valid, new_hash = await hashing.verify(form_data.password, user.hashed_password)
+        except hashing.Overloaded:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many sign-ins in progress, please retry",
+                headers={"Retry-After": str(hashing.RETRY_AFTER_SECONDS)},
+            )
+        if valid and new_hash:
+            # Stored with an outdated work factor: upgrade it now that we have the password
+            await run_in_threadpool(store_password_hash, user.id, new_hash)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -162,70 +232,158 @@ if os.getenv("DEBUG") == "True":
 
 from starlette.middleware.sessions import SessionMiddleware
 from starlette.requests import Request  # Re-import to be safe or use existing
-from authlib.integrations.starlette_client import OAuth
 
 # Add SessionMiddleware for Authlib
 app.add_middleware(SessionMiddleware, secret_key=SECRET_KEY, https_only=False, same_site='lax')
+# Added last so it is outermost and times everything below it
+app.add_middleware(metrics.MetricsMiddleware)
+metrics.instrument(engine, read_engine)
+
+_oauth = None
+
+def get_oauth():
+    # Authlib is only needed for Google sign-in, so it is imported and the
+    # client registered on the first login instead of at startup
+    global _oauth
+    if _oauth is None:
+        from authlib.integrations.starlette_client import OAuth
+        oauth = OAuth()
+        oauth.register(
+            name='google',
+            client_id=os.getenv("GOOGLE_CLIENT_ID"),
+            client_secret=os.getenv("GOOGLE_CLIENT_SECRET"),
+            server_metadata_url='https://accounts.google.com/.well-known/openid-configuration',
+            client_kwargs={
+                'scope': 'openid email profile'
+            }
+        )
+        _oauth = oauth
+    return _oauth
 
-oauth = OAuth()
-oauth.register(
-    name='google',
-    client_id=os.getenv("GOOGLE_CLIENT_ID"),
-    client_secret=os.getenv("GOOGLE_CLIENT_SECRET"),
-    server_metadata_url='https://accounts.google.com/.well-known/openid-configuration',
-    client_kwargs={
-        'scope': 'openid email profile'
-    }
-)
+@app.get("/api/admin/auth-cache")
+def read_auth_cache_stats(current_user: auth_cache.Principal = Depends(get_current_user_cookie)):
+    if current_user.username != "Adam":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return auth_cache.stats()
+
+@app.get("/api/admin/password-hashing")
+def read_password_hashing_stats(current_user: auth_cache.Principal = Depends(get_current_user_cookie)):
+    if current_user.username != "Adam":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return hashing.stats()
+
+@app.get("/api/admin/response-cache")
+def read_response_cache_stats(current_user: auth_cache.Principal = Depends(get_current_user_cookie)):
+    if current_user.username != "Adam":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return response_cache.stats()
+
+@app.get("/api/admin/live-updates")
+def read_live_update_stats(current_user: auth_cache.Principal = Depends(get_current_user_cookie)):
+    if current_user.username != "Adam":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return events.stats()
+
+@app.get("/api/admin/slow-queries")
+def read_slow_queries(current_user: auth_cache.Principal = Depends(get_current_user_cookie)):
+    if current_user.username != "Adam":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return {"threshold_ms": metrics.SLOW_QUERY_MS, "queries": metrics.slow_queries()}
+
+# Scrapers send METRICS_TOKEN as a bearer token; without one set, only
+# local scrapers (loopback) are served
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+LOOPBACK_HOSTS = {"127.0.0.1", "::1", "localhost"}
+
+@app.get("/metrics", include_in_schema=False)
+def read_metrics(request: Request):
+    if METRICS_TOKEN:
+        if not secrets.compare_digest(request.headers.get("authorization", "").encode(), f"Bearer {METRICS_TOKEN}".encode()):
+            raise HTTPException(status_code=401, detail="Not authenticated")
+    elif not request.client or request.client.host not in LOOPBACK_HOSTS:
+        raise HTTPException(status_code=403, detail="Set METRICS_TOKEN to scrape metrics remotely")
+    body = metrics.render({
+        "auth_cache": auth_cache.stats(),
+        "response_cache": response_cache.stats(),
+        "password_hashing": hashing.stats(),
+        "live_updates": events.stats(),
+    })
+    return Response(body, media_type="text/plain; version=0.0.4; charset=utf-8")
 
 # --- Admin Backup Endpoint ---
 @app.get("/api/admin/backup")
-def download_database(current_user: models.User = Depends(get_current_user_cookie)):
+def download_database(since: Optional[str] = None, current_user: auth_cache.Principal = Depends(get_current_user_cookie)):
+    """Gzipped online snapshot of the database; `since` a previous X-Backup-Id for only the changed pages."""
     if current_user.username != "Adam":
         raise HTTPException(status_code=403, detail="Not authorized")
     
     # Check if using SQLite
-    db_url = os.getenv("DATABASE_URL", "sqlite:///./foodmapper_v2.db")
-    if not db_url.startswith("sqlite"):
+    if engine.dialect.name != "sqlite":
         raise HTTPException(status_code=400, detail="Backup only supported for SQLite")
     
-    # Extract path from URL (remove sqlite:///)
-    # Handle absolute paths (sqlite:////data/...) vs relative (sqlite:///./...)
-    if db_url.startswith("sqlite:////"):
-        file_path = db_url[10:] # remove sqlite:/// leaving /data/...
-    elif db_url.startswith("sqlite:///"):
-        file_path = db_url[10:] # relative path?
-    else:
-        file_path = "foodmapper_v2.db"
-
-    if not os.path.exists(file_path):
-         # Try common fallback if url parsing failed or using relative defaults
-         if os.path.exists("foodmapper_v2.db"):
-             file_path = "foodmapper_v2.db"
-         else:
-             raise HTTPException(status_code=404, detail=f"Database file not found at {file_path}")
+    file_path = engine.url.database
+    if not file_path or not os.path.exists(file_path):
+        raise HTTPException(status_code=404, detail=f"Database file not found at {file_path}")
 
-    return FileResponse(path=file_path, filename="foodmapper_backup.db", media_type='application/x-sqlite3')
+    # Copied with the online backup API from a pinned read snapshot, so
+    # writers keep going while it runs and the copy is never torn
+    try:
+        backup_id, kind, chunks = backup.create_backup(file_path, since)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Unknown or expired backup id; take a full backup")
+
+    suffix = "delta.gz" if kind == "incremental" else "db.gz"
+    headers = {
+        "Content-Disposition": f'attachment; filename="foodmapper_backup_{backup_id}.{suffix}"',
+        "X-Backup-Id": backup_id,
+        "X-Backup-Kind": kind,
+    }
+    return StreamingResponse(chunks, media_type="application/gzip", headers=headers)
 
 
 @app.get("/login/google")
 async def login_google(request: Request):
     # Force use of 127.0.0.1 if that is what we are using, or respect host
     redirect_uri = request.url_for('auth_google_callback')
-    return await oauth.google.authorize_redirect(request, redirect_uri, prompt='select_account')
+    return await get_oauth().google.authorize_redirect(request, redirect_uri, prompt='select_account')
+
+def get_or_create_google_user(db: Session, email: str):
+    """Username for a Google account, creating the user on first login (blocking)."""
+    user = db.query(models.User).filter(models.User.email == email).first()
+    
+    if not user:
+        print(f"Creating new user for {email}", flush=True)
+        # Create new user
+        base_username = email.split('@')[0]
+        username = base_username
+        counter = 1
+        while db.query(models.User).filter(models.User.username == username).first():
+            username = f"{base_username}{counter}"
+            counter += 1
+        
+        user = models.User(
+            username=username,
+            email=email,
+            oauth_provider="google",
+            hashed_password=None 
+        )
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+    return user.username
 
 @app.get("/auth/google/callback")
 async def auth_google_callback(request: Request, db: Session = Depends(get_db)):
     print("\n--- Callback Received ---", flush=True)
     try:
         print("Processing token...", flush=True)
-        token = await oauth.google.authorize_access_token(request)
+        token = await get_oauth().google.authorize_access_token(request)
         print(f"Token received Keys: {token.keys()}", flush=True)
         
         user_info = token.get('userinfo')
         if not user_info:
              print("Fetching userinfo manually...", flush=True)
-             user_info = await oauth.google.post('https://www.googleapis.com/oauth2/v3/userinfo', token=token)
+             user_info = await get_oauth().google.post('https://www.googleapis.com/oauth2/v3/userinfo', token=token)
              user_info = user_info.json()
              
         print(f"User info: {user_info}", flush=True)
@@ -234,31 +392,11 @@ async def auth_google_callback(request: Request, db: Session = Depends(get_db)):
         if not email:
             raise HTTPException(status_code=400, detail="No email provided by Google")
 
-        user = db.query(models.User).filter(models.User.email == email).first()
-        
-        if not user:
-            print(f"Creating new user for {email}", flush=True)
-            # Create new user
-            base_username = email.split('@')[0]
-            username = base_username
-            counter = 1
-            while db.query(models.User).filter(models.User.username == username).first():
-                username = f"{base_username}{counter}"
-                counter += 1
-            
-            user = models.User(
-                username=username,
-                email=email,
-                oauth_provider="google",
-                hashed_password=None 
-            )
-            db.add(user)
-            db.commit()
-            db.refresh(user)
+        username = await run_in_threadpool(get_or_create_google_user, db, email)
             
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
-            data={"sub": user.username}, expires_delta=access_token_expires
+            data={"sub": username}, expires_delta=access_token_expires
         )
         
         # CHANGED: Set Cookie via RedirectResponse
@@ -287,49 +425,10 @@ async def favicon():
 async def favicon_png():
     return FileResponse("static/favicon.png")
 
-# --- Migration Logic ---
-# Run once on startup to migrate single-cuisine data to multi-cuisine table
-def migrate_data():
-    db = next(get_db())
-    try:
-        # Check if restaurant_cuisines is empty
-        conn = db.connection()
-        # Using text() for raw SQL check or just ORM if simpler. ORM is safer.
-        # But association table isn't a mapped class directly available easily in this setup without a model.
-        # Let's use direct SQL to check count of the association table
-        result = db.execute(text("SELECT count(*) FROM restaurant_cuisines"))
-        count = result.scalar()
-        
-        if count == 0:
-            print("Migrating data: Populating restaurant_cuisines from legacy cuisine_id...")
-            restaurants = db.query(models.Restaurant).all()
-            migrated = 0
-            for r in restaurants:
-                if r.cuisine_id:
-                    # Find cuisine
-                    c = db.query(models.Cuisine).filter(models.Cuisine.id == r.cuisine_id).first()
-                    if c:
-                        r.cuisines.append(c)
-                        migrated += 1
-            db.commit()
-            print(f"Migration complete: Updated {migrated} restaurants.")
-        
-        # Check for is_published column in groups
-        try:
-            db.execute(text("SELECT is_published FROM groups LIMIT 1"))
-        except Exception:
-            print("Migrating schema: Adding is_published to groups table...")
-            db.execute(text("ALTER TABLE groups ADD COLUMN is_published INTEGER DEFAULT 0"))
-            db.commit()
-            print("Schema migration complete.")
-
-    except Exception as e:
-        print(f"Migration warning: {e}")
-    finally:
-        db.close()
-
-# Invoke migration
-migrate_data()
+@app.get("/sw.js", include_in_schema=False)
+async def service_worker(request: Request):
+    # Served from the root so its scope covers the app and /api/, not just /static/
+    return await static_files.page(request, "sw.js")
 
 # --- Pydantic Schemas ---
 class CuisineBase(BaseModel):
@@ -387,23 +486,26 @@ class Restaurant(BaseModel): # Redefining to flatten structure
 # --- API Routes ---
 
 @app.post("/api/cuisines", response_model=Cuisine)
-def create_cuisine(cuisine: CuisineCreate, current_user: models.User = Depends(get_current_user_cookie), db: Session = Depends(get_db)):
+def create_cuisine(cuisine: CuisineCreate, current_user: auth_cache.Principal = Depends(get_current_user_cookie), db: Session = Depends(get_db)):
     db_cuisine = db.query(models.Cuisine).filter(models.Cuisine.name == cuisine.name).first()
     if db_cuisine:
         return db_cuisine
     new_cuisine = models.Cuisine(name=cuisine.name)
     db.add(new_cuisine)
+    versions.bump(db, versions.CUISINES)
     db.commit()
     db.refresh(new_cuisine)
     return new_cuisine
 
 @app.get("/api/cuisines", response_model=List[Cuisine])
-def read_cuisines(db: Session = Depends(get_db)):
+def read_cuisines(request: Request, db: Session = Depends(get_read_db)):
     # Cuisines can be public for now, or protected. Let's keep public metadata public.
-    return db.query(models.Cuisine).all()
+    etag = versions.check_etag(request, db, versions.CUISINES)
+    cuisines = [Cuisine.model_validate(c).model_dump() for c in db.query(models.Cuisine).all()]
+    return versions.tagged(FastJSONResponse(cuisines), etag)
 
 @app.delete("/api/cuisines/{cuisine_id}")
-def delete_cuisine(cuisine_id: int, current_user: models.User = Depends(get_current_user_cookie), db: Session = Depends(get_db)):
+def delete_cuisine(cuisine_id: int, current_user: auth_cache.Principal = Depends(get_current_user_cookie), db: Session = Depends(get_db)):
     c = db.query(models.Cuisine).filter(models.Cuisine.id == cuisine_id).first()
     if not c:
         raise HTTPException(status_code=404, detail="Cuisine not found")
@@ -412,11 +514,12 @@ def delete_cuisine(cuisine_id: int, current_user: models.User = Depends(get_curr
         raise HTTPException(status_code=400, detail="Cannot delete cuisine that is being used by restaurants.")
 
     db.delete(c)
+    versions.bump(db, versions.CUISINES)
     db.commit()
     return {"ok": True}
 
 @app.post("/api/groups", response_model=Group)
-def create_group(group: GroupCreate, current_user: models.User = Depends(get_current_user_cookie), db: Session = Depends(get_db)):
+def create_group(group: GroupCreate, current_user: auth_cache.Principal = Depends(get_current_user_cookie), db: Session = Depends(get_db)):
     # Check if exists for this user (or global if we want simple unique names)
     db_group = db.query(models.Group).filter(models.Group.name == group.name).first()
     if db_group:
@@ -424,40 +527,55 @@ def create_group(group: GroupCreate, current_user: models.User = Depends(get_cur
     
     new_group = models.Group(name=group.name, owner_id=current_user.id)
     db.add(new_group)
+    versions.bump(db, ("owner", current_user.id))
     db.commit()
     db.refresh(new_group)
     return new_group
 
 @app.get("/api/groups", response_model=List[Group])
-def read_groups(current_user: models.User = Depends(get_current_user_cookie), db: Session = Depends(get_db)):
-    return db.query(models.Group).filter(models.Group.owner_id == current_user.id).all()
+def read_groups(request: Request, current_user: auth_cache.Principal = Depends(get_current_user_cookie), db: Session = Depends(get_read_db)):
+    etag = versions.check_etag(request, db, ("owner", current_user.id))
+    groups = db.query(models.Group).filter(models.Group.owner_id == current_user.id).all()
+    return versions.tagged(FastJSONResponse([Group.model_validate(g).model_dump() for g in groups]), etag)
 
 @app.delete("/api/groups/{group_id}")
-def delete_group(group_id: int, current_user: models.User = Depends(get_current_user_cookie), db: Session = Depends(get_db)):
+def delete_group(group_id: int, current_user: auth_cache.Principal = Depends(get_current_user_cookie), db: Session = Depends(get_db)):
     g = db.query(models.Group).filter(models.Group.id == group_id).first()
     if not g:
         raise HTTPException(status_code=404, detail="Group not found")
+    neighbours = versions.bump_group_neighbours(db, group_id)
+    versions.bump(db, ("owner", g.owner_id), versions.PUBLIC_GROUPS)
+    events.close(db, [group_id])
+    events.reset(db, neighbours)
     db.delete(g)
-    db.commit()
-    db.delete(g)
+    clusters.drop_group(db, group_id)
     db.commit()
     return {"ok": True}
 
 @app.put("/api/groups/{group_id}", response_model=Group)
-def update_group(group_id: int, group: GroupCreate, current_user: models.User = Depends(get_current_user_cookie), db: Session = Depends(get_db)):
+def update_group(group_id: int, group: GroupCreate, current_user: auth_cache.Principal = Depends(get_current_user_cookie), db: Session = Depends(get_db)):
     g = db.query(models.Group).filter(models.Group.id == group_id, models.Group.owner_id == current_user.id).first()
     if not g:
         raise HTTPException(status_code=404, detail="Group not found")
     
+    unpublished = g.is_published and not group.is_published
     g.name = group.name
-    g.is_published = group.is_published
+    g.is_published = int(group.is_published)
+    neighbours = versions.bump_group_neighbours(db, group_id)
+    versions.bump(db, ("owner", current_user.id), versions.PUBLIC_GROUPS)
+    # Restaurant JSON carries group names, so every member changed
+    (events.close if unpublished else events.reset)(db, [group_id])
+    events.reset(db, neighbours)
     db.commit()
     db.refresh(g)
     return g
 
 @app.get("/api/groups/public")
-def read_public_groups(db: Session = Depends(get_db)):
-    groups = db.query(models.Group).filter(models.Group.is_published == True).options(joinedload(models.Group.owner)).all()
+def read_public_groups(request: Request, db: Session = Depends(get_read_db)):
+    return response_cache.respond(request, db, [versions.PUBLIC_GROUPS], lambda: public_groups_payload(db))
+
+def public_groups_payload(db: Session):
+    groups = db.query(models.Group).filter(models.Group.is_published == 1).options(joinedload(models.Group.owner)).all()
     # Pydantic v2 from_attributes sometimes is tricky with nested optionals if not perfect.
     # Let's manual return to be 100% sure.
     res = []
@@ -475,15 +593,15 @@ def read_public_groups(db: Session = Depends(get_db)):
     return res
 
 @app.get("/api/groups/{group_id}/public", response_model=List[Restaurant])
-def view_public_group(group_id: int, db: Session = Depends(get_db)):
-    group = db.query(models.Group).filter(models.Group.id == group_id, models.Group.is_published == True).first()
-    if not group:
+def view_public_group(group_id: int, request: Request, format: Optional[str] = Query(None, pattern="^columnar$"), db: Session = Depends(get_read_db)):
+    group_id = db.query(models.Group.id).filter(models.Group.id == group_id, models.Group.is_published == 1).scalar()
+    if group_id is None:
          raise HTTPException(status_code=404, detail="Public group not found")
-    return group.restaurants
+    return group_list_response(request, db, group_id, format)
 
 
 @app.post("/api/groups/{group_id}/share")
-def share_group(group_id: int, current_user: models.User = Depends(get_current_user_cookie), db: Session = Depends(get_db)):
+def share_group(group_id: int, current_user: auth_cache.Principal = Depends(get_current_user_cookie), db: Session = Depends(get_db)):
     g = db.query(models.Group).filter(models.Group.id == group_id).first()
     if not g:
          raise HTTPException(status_code=404, detail="Group not found")
@@ -497,16 +615,65 @@ def share_group(group_id: int, current_user: models.User = Depends(get_current_u
     return {"share_token": token}
 
 @app.get("/api/share/{token}", response_model=List[Restaurant])
-def view_shared_group(token: str, db: Session = Depends(get_db)):
-    group = db.query(models.Group).filter(models.Group.share_token == token).first()
-    if not group:
+def view_shared_group(token: str, request: Request, format: Optional[str] = Query(None, pattern="^columnar$"), db: Session = Depends(get_read_db)):
+    group_id = db.query(models.Group.id).filter(models.Group.share_token == token).scalar()
+    if group_id is None:
          raise HTTPException(status_code=404, detail="Shared group not found")
     
     # Return restaurants in this group
-    return group.restaurants
+    return group_list_response(request, db, group_id, format)
+
+@app.get("/api/share/{token}/clusters")
+def read_shared_group_clusters(token: str, request: Request, zoom: int = Query(..., ge=0, le=clusters.MAX_CLUSTER_ZOOM), bbox: Optional[str] = None, db: Session = Depends(get_read_db)):
+    group_id = db.query(models.Group.id).filter(models.Group.share_token == token).scalar()
+    if group_id is None:
+         raise HTTPException(status_code=404, detail="Shared group not found")
+    etag = versions.check_etag(request, db, ("group", group_id))
+    return versions.tagged(FastJSONResponse(clusters.read_clusters(db, "group", group_id, zoom, parse_bbox_param(bbox))), etag)
+
+@app.get("/api/groups/{group_id}/public/clusters")
+def read_public_group_clusters(group_id: int, request: Request, zoom: int = Query(..., ge=0, le=clusters.MAX_CLUSTER_ZOOM), bbox: Optional[str] = None, db: Session = Depends(get_read_db)):
+    group_id = db.query(models.Group.id).filter(models.Group.id == group_id, models.Group.is_published == 1).scalar()
+    if group_id is None:
+         raise HTTPException(status_code=404, detail="Public group not found")
+    etag = versions.check_etag(request, db, ("group", group_id))
+    return versions.tagged(FastJSONResponse(clusters.read_clusters(db, "group", group_id, zoom, parse_bbox_param(bbox))), etag)
+
+def find_group_id(*criteria):
+    with ReadSessionLocal() as db:
+        return db.query(models.Group.id).filter(*criteria).scalar()
+
+# Live changes to a shared or published list, as Server-Sent Events (see events.py).
+# Async so that idle viewers hold no worker thread
+@app.get("/api/share/{token}/events", include_in_schema=False)
+async def shared_group_events(token: str):
+    group_id = await run_in_threadpool(find_group_id, models.Group.share_token == token)
+    if group_id is None:
+        raise HTTPException(status_code=404, detail="Shared group not found")
+    return events.stream_response(group_id)
+
+@app.get("/api/groups/{group_id}/public/events", include_in_schema=False)
+async def public_group_events(group_id: int):
+    group_id = await run_in_threadpool(find_group_id, models.Group.id == group_id, models.Group.is_published == 1)
+    if group_id is None:
+        raise HTTPException(status_code=404, detail="Public group not found")
+    return events.stream_response(group_id)
+
+def group_list_response(request: Request, db: Session, group_id: int, format: Optional[str] = None):
+    # Public and share-link views of a group are the same payload, cached once per format
+    if format == "columnar":
+        build = lambda: to_columns(serialize_restaurants(db, group_restaurants_query(group_id), link_ids=True))
+    else:
+        build = lambda: serialize_restaurants(db, group_restaurants_query(group_id))
+    return response_cache.respond(request, db, [("group", group_id), versions.CUISINES], build, format or "json")
+
+def group_restaurants_query(group_id: int):
+    # Same ordering as the owner's default list view
+    member_ids = select(models.restaurant_groups.c.restaurant_id).where(models.restaurant_groups.c.group_id == group_id)
+    return restaurant_select().where(models.Restaurant.id.in_(member_ids)).order_by(models.Restaurant.name.asc(), models.Restaurant.id.asc())
 
 @app.post("/api/restaurants", response_model=Restaurant)
-def create_restaurant(r: RestaurantCreate, current_user: models.User = Depends(get_current_user_cookie), db: Session = Depends(get_db)):
+def create_restaurant(r: RestaurantCreate, current_user: auth_cache.Principal = Depends(get_current_user_cookie), db: Session = Depends(get_db)):
     db_rest = models.Restaurant(
         name=r.name,
         address=r.address,
@@ -531,42 +698,240 @@ def create_restaurant(r: RestaurantCreate, current_user: models.User = Depends(g
         db_rest.groups = groups
 
     db.add(db_rest)
+    db.flush()
+    clusters.apply_change(db, None, clusters.snapshot(db_rest))
+    versions.bump(db, ("owner", current_user.id))
+    versions.bump_groups(db, [g.id for g in db_rest.groups])
+    events.publish(db, [g.id for g in db_rest.groups], upserted=[db_rest.id])
     db.commit()
-    db.refresh(db_rest)
-    return db_rest
+    return FastJSONResponse(serialize_restaurant(db, db_rest.id))
+
+@app.post("/api/restaurants/bulk")
+def bulk_import_restaurants(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, pattern="^(csv|geojson|takeout)$"),
+    current_user: auth_cache.Principal = Depends(get_current_user_cookie),
+    db: Session = Depends(get_db),
+):
+    fmt = format or bulk.detect_format(file.filename)
+    if fmt is None:
+        raise HTTPException(status_code=400, detail="Unknown file type; pass format=csv|geojson|takeout")
+    records = bulk.read_csv(file.file) if fmt == "csv" else bulk.read_features(file.file)
+    try:
+        result = bulk.import_restaurants(db, current_user.id, records)
+    except (ValueError, csv.Error) as e:
+        # Malformed files (JSONDecodeError and UnicodeDecodeError are ValueErrors);
+        # bad rows are reported in the result instead
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"Could not parse {fmt} file: {e}")
+    print(f"Bulk import for {current_user.username}: {result['imported']} imported, "
+          f"{result['skipped']} skipped, {result['rows_per_second']} rows/s")
+    return result
+
+@app.get("/api/restaurants/export")
+def export_restaurants(
+    format: str = Query("csv", pattern="^(csv|geojson|takeout)$"),
+    current_user: auth_cache.Principal = Depends(get_current_user_cookie),
+):
+    filename = f"foodmapper-restaurants.{bulk.EXTENSIONS[format]}"
+    return StreamingResponse(
+        bulk.stream_export(current_user.id, format),
+        media_type=bulk.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@app.get("/api/sync")
+def sync_replica(
+    since: Optional[int] = Query(None, ge=0),
+    current_user: auth_cache.Principal = Depends(get_current_user_cookie),
+    db: Session = Depends(get_read_db)
+):
+    """Restaurants, cuisines and groups changed after cursor `since` (all of them without one), plus deletions."""
+    # no-store: a replayed old delta would move the replica's cursor backwards
+    return FastJSONResponse(sync.changes(db, current_user.id, since), headers={"Cache-Control": "no-store"})
+
+class NearbyRestaurant(Restaurant):
+    distance_miles: float
+
+@app.get("/api/restaurants/nearby", response_model=List[NearbyRestaurant])
+def read_nearby_restaurants(
+    request: Request,
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    k: int = Query(20, ge=1, le=100),
+    max_miles: Optional[float] = Query(None, gt=0),
+    status: Optional[List[str]] = Query(None),
+    cuisine_id: Optional[List[int]] = Query(None),
+    price_range: Optional[List[str]] = Query(None),
+    group_id: Optional[List[int]] = Query(None),
+    min_rating: Optional[int] = Query(None, ge=1, le=5),
+    current_user: auth_cache.Principal = Depends(get_current_user_cookie),
+    db: Session = Depends(get_read_db)
+):
+    etag = versions.check_etag(request, db, ("owner", current_user.id), versions.CUISINES)
+
+    clauses = facets.facet_clauses(status, cuisine_id, price_range, group_id, min_rating)
+    filters = [models.Restaurant.owner_id == current_user.id, *clauses.values()]
+    hits = spatial.nearest(db, engine, filters, lat, lon, k, max_miles)
+    if not hits:
+        return versions.tagged(FastJSONResponse([]), etag)
+
+    distances = dict(hits)
+    rows = serialize_restaurants(db, restaurant_select().where(models.Restaurant.id.in_(list(distances))))
+    for row in rows:
+        row["distance_miles"] = round(distances[row["id"]], 3)
+    rows.sort(key=lambda row: row["distance_miles"])
+    return versions.tagged(FastJSONResponse(rows), etag)
+
+@app.get("/api/restaurants/choose", response_model=List[Restaurant])
+def choose_restaurants(
+    n: int = Query(5, ge=1, le=50),
+    weight: str = Query("none"),
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lon: Optional[float] = Query(None, ge=-180, le=180),
+    status: Optional[List[str]] = Query(None),
+    cuisine_id: Optional[List[int]] = Query(None),
+    price_range: Optional[List[str]] = Query(None),
+    group_id: Optional[List[int]] = Query(None),
+    min_rating: Optional[int] = Query(None, ge=1, le=5),
+    current_user: auth_cache.Principal = Depends(get_current_user_cookie),
+    db: Session = Depends(get_read_db)
+):
+    if weight not in sampling.WEIGHTINGS:
+        raise HTTPException(status_code=400, detail=f"weight must be one of: {', '.join(sampling.WEIGHTINGS)}")
+    if weight == "distance" and (lat is None or lon is None):
+        raise HTTPException(status_code=400, detail="Distance weighting needs lat and lon")
+
+    clauses = facets.facet_clauses(status, cuisine_id, price_range, group_id, min_rating)
+    filters = [models.Restaurant.owner_id == current_user.id, *clauses.values()]
+    picks = sampling.choose(db, filters, n, weight, lat, lon)
+    if not picks:
+        return FastJSONResponse([])
+
+    # Keep the draw order: the first pick is the "winner"
+    rows = {row["id"]: row for row in serialize_restaurants(db, restaurant_select().where(models.Restaurant.id.in_(picks)))}
+    return FastJSONResponse([rows[i] for i in picks if i in rows])
+
+def parse_bbox_param(bbox: Optional[str]):
+    if not bbox:
+        return None
+    try:
+        return spatial.parse_bbox(bbox)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid bbox: {e}")
+
+@app.get("/api/restaurants/clusters")
+def read_restaurant_clusters(
+    request: Request,
+    zoom: int = Query(..., ge=0, le=clusters.MAX_CLUSTER_ZOOM),
+    bbox: Optional[str] = None,
+    status: Optional[List[str]] = Query(None),
+    current_user: auth_cache.Principal = Depends(get_current_user_cookie),
+    db: Session = Depends(get_read_db)
+):
+    etag = versions.check_etag(request, db, ("owner", current_user.id))
+    return versions.tagged(FastJSONResponse(clusters.read_clusters(db, "owner", current_user.id, zoom, parse_bbox_param(bbox), status)), etag)
 
 @app.get("/api/restaurants", response_model=List[Restaurant])
 def read_restaurants(
+    request: Request,
     search: Optional[str] = None,
     sort_by: Optional[str] = "name",
-    current_user: models.User = Depends(get_current_user_cookie),
-    db: Session = Depends(get_db)
+    bbox: Optional[str] = None,
+    status: Optional[List[str]] = Query(None),
+    cuisine_id: Optional[List[int]] = Query(None),
+    price_range: Optional[List[str]] = Query(None),
+    group_id: Optional[List[int]] = Query(None),
+    min_rating: Optional[int] = Query(None, ge=1, le=5),
+    with_facets: bool = False,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    format: Optional[str] = Query(None, pattern="^columnar$"),
+    current_user: auth_cache.Principal = Depends(get_current_user_cookie),
+    db: Session = Depends(get_read_db)
 ):
-    query = db.query(models.Restaurant).filter(models.Restaurant.owner_id == current_user.id)
+    # Answered from two version numbers when the client's copy is current
+    etag = versions.check_etag(request, db, ("owner", current_user.id), versions.CUISINES)
+
+    base_filters = [models.Restaurant.owner_id == current_user.id]
+    
+    if bbox:
+        # Viewport query: minLon,minLat,maxLon,maxLat (served from the R*Tree on SQLite)
+        base_filters.append(spatial.bbox_filter(engine, parse_bbox_param(bbox)))
     
-    if search:
+    fts_query = None
+    if search and fulltext.has_fts(engine):
+        # FTS5 prefix match over name/address/notes/cuisines, with a highlighted snippet
+        fts_query = fulltext.match_query(search)
+    if search and not fts_query:
+        # No FTS5 index, or no words for it to match (e.g. "!!!"): substring match
         search_term = f"%{search}%"
-        query = query.filter(
+        base_filters.append(
             (models.Restaurant.name.ilike(search_term)) | 
             (models.Restaurant.address.ilike(search_term)) |
             (models.Restaurant.personal_notes.ilike(search_term))
         )
     
-    if sort_by == "rating":
-        # Sort by rating desc (nulls last)
-        query = query.order_by(models.Restaurant.rating.desc().nullslast())
+    # Facet filters are evaluated in SQL; multi-valued params OR within a facet
+    clauses = facets.facet_clauses(status, cuisine_id, price_range, group_id, min_rating)
+    query = restaurant_select().where(*base_filters, *clauses.values())
+    # Relevance only means something with a full-text query; otherwise default to name
+    if sort_by == "relevance" and not fts_query:
+        sort_by = "name"
+    elif sort_by not in ("relevance", "rating"):
+        sort_by = "name"
+    if fts_query:
+        query = fulltext.apply_search(query, fts_query, ranked=(sort_by == "relevance"))
+    # id is always the final tie-break, so (sort key, id) identifies a row for keyset paging
+    query = query.order_by(*pagination.sort_order(sort_by))
+    
+    if (limit or cursor) and sort_by not in pagination.KEYSET_SORTS:
+        raise HTTPException(status_code=400, detail="Pagination is only supported for name and rating sorts")
+    if cursor:
+        try:
+            cursor_sort, key, last_id = pagination.decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        if cursor_sort != sort_by:
+            raise HTTPException(status_code=400, detail="Cursor does not match sort_by")
+        query = query.where(pagination.after_cursor(sort_by, key, last_id))
+    
+    if "application/x-ndjson" in request.headers.get("accept", ""):
+        # Opt-in streaming: rows are written as they come off the cursor
+        if limit:
+            query = query.limit(limit)
+        return versions.tagged(StreamingResponse(stream_restaurants_ndjson(query), media_type="application/x-ndjson"), etag)
+    
+    # Fixed number of queries regardless of list size; rows go straight to JSON
+    headers = {}
+    columnar = format == "columnar"
+    if limit:
+        # One extra row tells us whether another page exists
+        rows = serialize_restaurants(db, query.limit(limit + 1), link_ids=columnar)
+        if len(rows) > limit:
+            rows = rows[:limit]
+            headers["X-Next-Cursor"] = pagination.encode_cursor(sort_by, rows[-1])
     else:
-        # Default name
-        query = query.order_by(models.Restaurant.name.asc())
-        
-    return query.all()
+        rows = serialize_restaurants(db, query, link_ids=columnar)
+    if columnar:
+        # Parallel arrays for map rendering; cuisines and groups by id
+        rows = to_columns(rows)
+    if not with_facets:
+        return versions.tagged(FastJSONResponse(rows, headers=headers), etag)
+    
+    # Counts per cuisine/status/price/rating/group for the filter dropdowns
+    if fts_query:
+        base_filters.append(fulltext.search_clause(fts_query))
+    return versions.tagged(FastJSONResponse({"restaurants": rows, "facets": facets.facet_counts(db, base_filters, clauses)}, headers=headers), etag)
 
 @app.put("/api/restaurants/{restaurant_id}", response_model=Restaurant)
-def update_restaurant(restaurant_id: int, restaurant: RestaurantCreate, current_user: models.User = Depends(get_current_user_cookie), db: Session = Depends(get_db)):
+def update_restaurant(restaurant_id: int, restaurant: RestaurantCreate, current_user: auth_cache.Principal = Depends(get_current_user_cookie), db: Session = Depends(get_db)):
     db_restaurant = db.query(models.Restaurant).filter(models.Restaurant.id == restaurant_id, models.Restaurant.owner_id == current_user.id).first()
     if not db_restaurant:
         # Verify if it exists at all to give better error?? No, standard 404 is safer for privacy.
         raise HTTPException(status_code=404, detail="Restaurant not found")
+    before = clusters.snapshot(db_restaurant)
+    before_groups = [g.id for g in db_restaurant.groups]
     
     # Update scalar fields
     data = restaurant.dict(exclude={'cuisine_ids', 'group_ids'})
@@ -591,16 +956,25 @@ def update_restaurant(restaurant_id: int, restaurant: RestaurantCreate, current_
         glist = db.query(models.Group).filter(models.Group.id.in_(restaurant.group_ids), models.Group.owner_id == current_user.id).all()
         db_restaurant.groups.extend(glist)
     
+    clusters.apply_change(db, before, clusters.snapshot(db_restaurant))
+    versions.bump(db, ("owner", current_user.id))
+    versions.bump_groups(db, {*before_groups, *(g.id for g in db_restaurant.groups)})
+    after_groups = {g.id for g in db_restaurant.groups}
+    events.publish(db, after_groups, upserted=[restaurant_id])
+    events.publish(db, set(before_groups) - after_groups, removed=[restaurant_id])
     db.commit()
-    db.refresh(db_restaurant)
-    return db_restaurant
+    return FastJSONResponse(serialize_restaurant(db, db_restaurant.id))
 
 @app.delete("/api/restaurants/{restaurant_id}")
-def delete_restaurant(restaurant_id: int, current_user: models.User = Depends(get_current_user_cookie), db: Session = Depends(get_db)):
+def delete_restaurant(restaurant_id: int, current_user: auth_cache.Principal = Depends(get_current_user_cookie), db: Session = Depends(get_db)):
     db_restaurant = db.query(models.Restaurant).filter(models.Restaurant.id == restaurant_id, models.Restaurant.owner_id == current_user.id).first()
     if not db_restaurant:
         raise HTTPException(status_code=404, detail="Restaurant not found")
     
+    clusters.apply_change(db, clusters.snapshot(db_restaurant), None)
+    versions.bump(db, ("owner", current_user.id))
+    versions.bump_groups(db, [g.id for g in db_restaurant.groups])
+    events.publish(db, [g.id for g in db_restaurant.groups], removed=[restaurant_id])
     db.delete(db_restaurant)
     db.commit()
     return {"ok": True}
@@ -610,20 +984,23 @@ def delete_restaurant(restaurant_id: int, current_user: models.User = Depends(ge
 def get_config():
     return {"googleMapsApiKey": os.getenv("GOOGLE_MAPS_API_KEY")}
 
-# Serve Static Files (Frontend)
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Serve Static Files (Frontend): the `python assets.py` build if there is
+# one, the sources in development
+static_files = assets.StaticAssets(build_dir=None if os.getenv("DEBUG") == "True" else assets.BUILD_DIR)
+app.mount("/static", static_files, name="static")
 
 @app.get("/")
-async def read_index():
-    return FileResponse("static/index.html")
+async def read_index(request: Request):
+    return await static_files.page(request, "index.html")
 
 @app.get("/share/{token}")
-async def read_share_index(token: str):
-    return FileResponse("static/index.html")
+async def read_share_index(token: str, request: Request):
+    return await static_files.page(request, "index.html")
 
 if __name__ == "__main__":
     import uvicorn
     # Use 0.0.0.0 for cloud deployment to accept external connections
     # Use PORT env variable provided by Render (default 8000 for local)
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run("main:app", host="0.0.0.0", port=port, reload=True)
+    # The reloader re-imports the app in a child process; only worth it in development
+    uvicorn.run("main:app", host="0.0.0.0", port=port, reload=os.getenv("DEBUG") == "True")
@@ -0,0 +1,254 @@
+"""Request and SQL metrics, served as Prometheus text on /metrics.
+
+MetricsMiddleware times every HTTP request and counts it by route
+template (not raw path, so ids do not explode the label set), method and
+status. The SQLAlchemy hooks installed by instrument() time every
+statement and charge it to the request that ran it, found through a
+context variable (Starlette copies the context into the threadpool, so
+sync handlers are covered). Each response carries a Server-Timing header
+with its SQL count and time. Event streams (text/event-stream) stay open
+for as long as the viewer does, so once their headers are sent they
+leave the in-flight gauge for an open-streams one and are kept out of
+the latency histograms. Statements slower than SLOW_QUERY_MS are
+printed and kept in a short log, with their parameters reduced to type
+names.
+"""
+import contextvars
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from datetime import datetime, timezone
+
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "250"))
+SLOW_QUERY_LOG_SIZE = 100
+
+# Prometheus' default buckets, in seconds
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+BACKGROUND = "(background)"  # Route label for SQL outside any request (startup, migrations)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class RequestStats:
+    """SQL work done on behalf of one request."""
+
+    __slots__ = ("route", "queries", "db_seconds")
+
+    def __init__(self):
+        self.route = None
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+_lock = threading.Lock()
+_current = contextvars.ContextVar("request_stats", default=None)
+_in_flight = 0
+_streams = 0  # Open event streams, not counted in _in_flight
+_requests = {}  # (method, route, status) -> count
+_latency = {}  # (method, route) -> Histogram
+_queries = {}  # route -> [statements, seconds]
+_query_latency = Histogram(QUERY_BUCKETS)
+_slow = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+_slow_total = 0
+
+
+def route_label(scope):
+    # Set by the router once it has matched; mounts (static files) only set root_path
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    if "endpoint" in scope:
+        return scope.get("root_path") or "/"
+    return "(unmatched)"
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        global _in_flight, _streams
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        status = 500
+        streaming = False
+
+        async def send_with_timing(message):
+            nonlocal status, streaming
+            global _in_flight, _streams
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                # Time to headers; for streamed bodies that is time to first byte
+                headers.append("Server-Timing", server_timing(stats, time.perf_counter() - start))
+                if headers.get("content-type", "").startswith("text/event-stream"):
+                    streaming = True
+                    with _lock:
+                        _in_flight -= 1
+                        _streams += 1
+            await send(message)
+
+        with _lock:
+            _in_flight += 1
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            elapsed = time.perf_counter() - start
+            _current.reset(token)
+            method = scope["method"] if scope["method"] in METHODS else "OTHER"
+            route = route_label(scope)
+            with _lock:
+                if streaming:
+                    _streams -= 1
+                else:
+                    _in_flight -= 1
+                    _latency.setdefault((method, route), Histogram(REQUEST_BUCKETS)).observe(elapsed)
+                _requests[method, route, status] = _requests.get((method, route, status), 0) + 1
+                totals = _queries.setdefault(route, [0, 0.0])
+                totals[0] += stats.queries
+                totals[1] += stats.db_seconds
+
+
+def server_timing(stats, elapsed):
+    with _lock:
+        queries, db_seconds = stats.queries, stats.db_seconds
+    return f'db;dur={db_seconds * 1000:.1f};desc="{queries} queries", app;dur={elapsed * 1000:.1f}'
+
+
+def _redact(parameters, executemany):
+    # Keep the shape for debugging, never the values
+    if executemany:
+        return f"{len(parameters)} rows"
+    if isinstance(parameters, dict):
+        return {k: type(v).__name__ for k, v in parameters.items()}
+    return [type(v).__name__ for v in parameters or ()]
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # One statement at a time per connection, so one slot is enough
+    conn.info["query_started"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    global _slow_total
+    elapsed = time.perf_counter() - conn.info.pop("query_started", time.perf_counter())
+    stats = _current.get()
+    with _lock:
+        _query_latency.observe(elapsed)
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+        else:
+            totals = _queries.setdefault(BACKGROUND, [0, 0.0])
+            totals[0] += 1
+            totals[1] += elapsed
+    if elapsed * 1000 < SLOW_QUERY_MS:
+        return
+
+    entry = {
+        "at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "ms": round(elapsed * 1000, 1),
+        "statement": " ".join(statement.split()),
+        "parameters": _redact(parameters, executemany),
+    }
+    with _lock:
+        _slow_total += 1
+        _slow.append(entry)
+    print(f"Slow query ({entry['ms']:.0f}ms): {entry['statement']} {entry['parameters']}")
+
+
+def instrument(*engines):
+    """Time every statement run on these engines."""
+    for engine in {id(e): e for e in engines}.values():
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def slow_queries():
+    with _lock:
+        return list(reversed(_slow))
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _histogram_lines(name, histogram, **labels):
+    cumulative = 0
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        cumulative += count
+        yield f"{name}_bucket{_labels(**labels, le=bound)} {cumulative}"
+    cumulative += histogram.counts[-1]
+    yield f"{name}_bucket{_labels(**labels, le='+Inf')} {cumulative}"
+    yield f"{name}_sum{_labels(**labels) if labels else ''} {histogram.sum:.6f}"
+    yield f"{name}_count{_labels(**labels) if labels else ''} {cumulative}"
+
+
+def render(components=None):
+    """Prometheus text exposition; `components` maps a name to a stats() dict to include as gauges."""
+    lines = []
+    with _lock:
+        lines += ["# HELP foodmapper_http_requests_in_flight Requests being handled.",
+                  "# TYPE foodmapper_http_requests_in_flight gauge",
+                  f"foodmapper_http_requests_in_flight {_in_flight}"]
+        lines += ["# HELP foodmapper_http_streams_open Event streams being served.",
+                  "# TYPE foodmapper_http_streams_open gauge",
+                  f"foodmapper_http_streams_open {_streams}"]
+
+        lines += ["# HELP foodmapper_http_requests_total Requests by method, route template and status.",
+                  "# TYPE foodmapper_http_requests_total counter"]
+        for (method, route, status), count in sorted(_requests.items()):
+            lines.append(f"foodmapper_http_requests_total{_labels(method=method, route=route, status=status)} {count}")
+
+        lines += ["# HELP foodmapper_http_request_duration_seconds Request latency, to the end of the body (event streams excluded).",
+                  "# TYPE foodmapper_http_request_duration_seconds histogram"]
+        for (method, route), histogram in sorted(_latency.items()):
+            lines += _histogram_lines("foodmapper_http_request_duration_seconds", histogram, method=method, route=route)
+
+        lines += ["# HELP foodmapper_db_queries_total SQL statements, by the route that ran them.",
+                  "# TYPE foodmapper_db_queries_total counter"]
+        lines += [f"foodmapper_db_queries_total{_labels(route=route)} {n}" for route, (n, _) in sorted(_queries.items())]
+        lines += ["# HELP foodmapper_db_query_seconds_total Time spent in SQL, by the route that ran it.",
+                  "# TYPE foodmapper_db_query_seconds_total counter"]
+        lines += [f"foodmapper_db_query_seconds_total{_labels(route=route)} {s:.6f}" for route, (_, s) in sorted(_queries.items())]
+
+        lines += ["# HELP foodmapper_db_query_duration_seconds Latency of single SQL statements.",
+                  "# TYPE foodmapper_db_query_duration_seconds histogram"]
+        lines += _histogram_lines("foodmapper_db_query_duration_seconds", _query_latency)
+
+        lines += [f"# HELP foodmapper_db_slow_queries_total Statements slower than {SLOW_QUERY_MS:g}ms.",
+                  "# TYPE foodmapper_db_slow_queries_total counter",
+                  f"foodmapper_db_slow_queries_total {_slow_total}"]
+
+    for component, values in (components or {}).items():
+        for key, value in values.items():
+            if isinstance(value, (int, float)):
+                name = f"foodmapper_{component}_{key}"
+                lines += [f"# TYPE {name} gauge", f"{name} {float(value):g}"]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,168 @@
+"""Versioned schema migrations.
+
+Each migration runs once, in its own transaction, and is recorded in
+`schema_version` in that same transaction. Startup reads one row when the
+schema is current. When it is not, one process at a time migrates: an
+advisory lock (a lock file next to the SQLite database, pg_advisory_lock
+on PostgreSQL) serialises workers, and the version is re-read under the
+lock so late arrivals find nothing left to do.
+
+To change the schema, append a migration to MIGRATIONS; never edit or
+reorder ones that have shipped. Data migrations should be single
+set-based statements, not per-row loops. Keep every migration safe to
+re-run: pysqlite executes DDL outside the surrounding transaction, so a
+crash can leave a migration's DDL applied but unrecorded.
+"""
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from sqlalchemy import inspect, text
+
+import clusters
+import fulltext
+import models
+import spatial
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, fine for a single dev server
+    fcntl = None
+
+# Arbitrary 64-bit key for pg_advisory_lock
+PG_LOCK_KEY = 0x666F6F646D6170
+
+SCHEMA_VERSION_DDL = """
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        name VARCHAR NOT NULL,
+        applied_at VARCHAR NOT NULL
+    )
+"""
+
+
+def create_tables(conn):
+    # Also creates tables added since a database was last started, for
+    # databases from before this module existed
+    models.Base.metadata.create_all(bind=conn)
+
+
+def add_group_is_published(conn):
+    columns = {c["name"] for c in inspect(conn).get_columns("groups")}
+    if "is_published" not in columns:
+        conn.execute(text("ALTER TABLE groups ADD COLUMN is_published INTEGER DEFAULT 0"))
+
+
+def copy_legacy_cuisines(conn):
+    # Single-cuisine restaurants.cuisine_id -> restaurant_cuisines, for
+    # databases that never had the association table filled in
+    conn.execute(text("""
+        INSERT INTO restaurant_cuisines (restaurant_id, cuisine_id)
+        SELECT r.id, r.cuisine_id FROM restaurants r
+        JOIN cuisines c ON c.id = r.cuisine_id
+        WHERE NOT EXISTS (SELECT 1 FROM restaurant_cuisines)
+    """))
+
+
+def create_indexes(conn):
+    # create_all() skips indexes on tables that already exist. Indexes on
+    # columns a later migration adds wait for that migration to call this again
+    inspector = inspect(conn)
+    for table in models.Base.metadata.sorted_tables:
+        columns = {c["name"] for c in inspector.get_columns(table.name)}
+        for index in table.indexes:
+            if {c.name for c in index.columns} <= columns:
+                index.create(bind=conn, checkfirst=True)
+
+
+def backfill_clusters(conn):
+    clusters.install_clusters(conn)
+
+
+def add_sync_columns(conn):
+    # Existing rows keep change_seq 0: replicas get them on their first, full sync
+    for model in (models.Restaurant, models.Cuisine, models.Group):
+        table = model.__table__
+        columns = {c["name"] for c in inspect(conn).get_columns(table.name)}
+        if "change_seq" not in columns:
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN change_seq INTEGER NOT NULL DEFAULT 0"))
+        if "updated_at" not in columns:
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN updated_at {table.c.updated_at.type.compile(dialect=conn.dialect)}"))
+    models.Tombstone.__table__.create(bind=conn, checkfirst=True)
+    create_indexes(conn)
+
+
+MIGRATIONS = [
+    (1, "create tables", create_tables),
+    (2, "groups.is_published", add_group_is_published),
+    (3, "restaurant_cuisines from legacy cuisine_id", copy_legacy_cuisines),
+    (4, "listing and link indexes", create_indexes),
+    (5, "restaurant R*Tree", spatial.install_spatial_index),
+    (6, "restaurant FTS5 index", fulltext.install_search_index),
+    (7, "marker cluster backfill", backfill_clusters),
+    (8, "sync change_seq, updated_at and tombstones", add_sync_columns),
+    (9, "restaurant PostGIS geography index", spatial.install_geography_index),
+]
+LATEST = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    if not inspect(conn).has_table("schema_version"):
+        return 0
+    return conn.execute(text("SELECT max(version) FROM schema_version")).scalar() or 0
+
+
+@contextmanager
+def migration_lock(engine):
+    """Hold an exclusive, cross-process lock for the duration of a migration run."""
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as conn:
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": PG_LOCK_KEY})
+            conn.commit()
+            try:
+                yield
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": PG_LOCK_KEY})
+                conn.commit()
+        return
+
+    path = engine.url.database if engine.dialect.name == "sqlite" else None
+    if fcntl is None or not path or path == ":memory:":
+        yield
+        return
+    with open(f"{path}.migrate.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def run(engine):
+    """Apply pending migrations; returns the number applied."""
+    with engine.connect() as conn:
+        if current_version(conn) >= LATEST:
+            return 0
+
+    with migration_lock(engine):
+        with engine.begin() as conn:
+            conn.execute(text(SCHEMA_VERSION_DDL))
+            version = current_version(conn)
+        pending = [m for m in MIGRATIONS if m[0] > version]
+        for number, name, migrate in pending:
+            started = time.perf_counter()
+            with engine.begin() as conn:
+                migrate(conn)
+                conn.execute(
+                    text("INSERT INTO schema_version (version, name, applied_at) VALUES (:version, :name, :at)"),
+                    {"version": number, "name": name, "at": datetime.now(timezone.utc).isoformat()},
+                )
+            print(f"Schema: applied migration {number} ({name}) in {time.perf_counter() - started:.2f}s")
+        return len(pending)
+
+
+if __name__ == "__main__":
+    # python migrations.py   -- migrate ahead of a deploy instead of at first startup
+    from database import engine
+    applied = run(engine)
+    print(f"Schema at version {LATEST} ({applied} migration(s) applied)")
@@ -1,17 +1,22 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, Table, Text
+from sqlalchemy import Column, DateTime, Integer, String, Float, ForeignKey, Table, Text, Index
 from sqlalchemy.orm import relationship
 from database import Base
 
 # Association Table
 restaurant_cuisines = Table('restaurant_cuisines', Base.metadata,
     Column('restaurant_id', Integer, ForeignKey('restaurants.id')),
-    Column('cuisine_id', Integer, ForeignKey('cuisines.id'))
+    Column('cuisine_id', Integer, ForeignKey('cuisines.id')),
+    # Both directions: listing loads cuisines per restaurant, filters go the other way
+    Index('ix_restaurant_cuisines_restaurant', 'restaurant_id', 'cuisine_id'),
+    Index('ix_restaurant_cuisines_cuisine', 'cuisine_id', 'restaurant_id'),
 )
 
 # Association Table for Groups
 restaurant_groups = Table('restaurant_groups', Base.metadata,
     Column('restaurant_id', Integer, ForeignKey('restaurants.id')),
-    Column('group_id', Integer, ForeignKey('groups.id'))
+    Column('group_id', Integer, ForeignKey('groups.id')),
+    Index('ix_restaurant_groups_restaurant', 'restaurant_id', 'group_id'),
+    Index('ix_restaurant_groups_group', 'group_id', 'restaurant_id'),
 )
 
 class Cuisine(Base):
@@ -19,9 +24,14 @@ class Cuisine(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, index=True)
+    # Stamped by sync.py on every change; /api/sync sends rows newer than the client's cursor
+    change_seq = Column(Integer, nullable=False, default=0, server_default="0", index=True)
+    updated_at = Column(DateTime, nullable=True)
 
     restaurants = relationship("Restaurant", secondary=restaurant_cuisines, back_populates="cuisines")
 
+STATUSES = ("Want to go", "Visited", "Favorite")  # Restaurant.status values
+
 class Restaurant(Base):
     __tablename__ = "restaurants"
 
@@ -45,6 +55,18 @@ class Restaurant(Base):
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     owner = relationship("User", back_populates="restaurants")
 
+    change_seq = Column(Integer, nullable=False, default=0, server_default="0")
+    updated_at = Column(DateTime, nullable=True)
+
+    # Every list query is scoped by owner; these cover the sort orders and facet filters
+    __table_args__ = (
+        Index('ix_restaurants_owner_name', 'owner_id', 'name'),
+        Index('ix_restaurants_owner_rating', 'owner_id', 'rating'),
+        Index('ix_restaurants_owner_status', 'owner_id', 'status'),
+        Index('ix_restaurants_owner_price', 'owner_id', 'price_range'),
+        Index('ix_restaurants_owner_change', 'owner_id', 'change_seq'),
+    )
+
 
 class User(Base):
     __tablename__ = "users"
@@ -66,6 +88,49 @@ class Group(Base):
     share_token = Column(String, unique=True, index=True, nullable=True)
     is_published = Column("is_published", Integer, default=0) # 0=False, 1=True (SQLite boolean)
     owner_id = Column("owner_id", Integer, ForeignKey("users.id"), nullable=True) # Nullable for migration
+    change_seq = Column(Integer, nullable=False, default=0, server_default="0")
+    updated_at = Column(DateTime, nullable=True)
 
     owner = relationship("User", back_populates="groups")
     restaurants = relationship("Restaurant", secondary=restaurant_groups, back_populates="groups")
+
+    __table_args__ = (
+        Index('ix_groups_owner_change', 'owner_id', 'change_seq'),
+    )
+
+class MarkerCluster(Base):
+    # Precomputed map clusters: one row per scope/zoom/grid cell/status.
+    # Maintained incrementally by clusters.apply_change() on every write.
+    __tablename__ = "marker_clusters"
+
+    scope = Column(String, primary_key=True) # "owner" or "group"
+    scope_id = Column(Integer, primary_key=True)
+    zoom = Column(Integer, primary_key=True)
+    cell_x = Column(Integer, primary_key=True)
+    cell_y = Column(Integer, primary_key=True)
+    status = Column(String, primary_key=True)
+    count = Column(Integer, default=0)
+    lat_sum = Column(Float, default=0)
+    lon_sum = Column(Float, default=0)
+    id_sum = Column(Integer, default=0) # Equals the restaurant id when count == 1
+
+class DataVersion(Base):
+    # Monotonic change counter per scope ("owner", "group" or "cuisines"),
+    # bumped by every write in the same transaction. Drives ETags.
+    __tablename__ = "data_versions"
+
+    scope = Column(String, primary_key=True)
+    scope_id = Column(Integer, primary_key=True)
+    version = Column(Integer, default=0)
+
+class Tombstone(Base):
+    # A deleted restaurant, cuisine or group, kept so /api/sync can tell
+    # replicas to drop it. Pruned after sync.TOMBSTONE_DAYS.
+    __tablename__ = "tombstones"
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False) # "restaurants", "cuisines" or "groups"
+    object_id = Column(Integer, nullable=False)
+    owner_id = Column(Integer, nullable=True) # None for cuisines, which everyone shares
+    change_seq = Column(Integer, nullable=False, index=True)
+    deleted_at = Column(DateTime, nullable=False)
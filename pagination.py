@@ -0,0 +1,64 @@
+import base64
+import json
+
+from sqlalchemy import and_, or_
+
+import models
+
+R = models.Restaurant
+
+# Sort orders that support keyset pagination. Every order ends in id so
+# the position of a row is unique and a cursor can resume right after it.
+KEYSET_SORTS = ("name", "rating")
+
+
+def sort_order(sort_by: str):
+    """ORDER BY clauses for a list sort ("relevance" is ranked by fulltext.apply_search)."""
+    if sort_by == "rating":
+        # Sort by rating desc (nulls last)
+        return [R.rating.desc().nullslast(), R.id.asc()]
+    if sort_by == "relevance":
+        return [R.id.asc()]
+    return [R.name.asc(), R.id.asc()]
+
+
+def encode_cursor(sort_by: str, row: dict):
+    """Opaque cursor pointing just after `row` (a serialized restaurant)."""
+    key = row["rating"] if sort_by == "rating" else row["name"]
+    raw = json.dumps([sort_by, key, row["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(value: str):
+    """Return (sort_by, key, id); raises ValueError for anything malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+        sort_by, key, last_id = json.loads(raw)
+    except Exception:
+        raise ValueError("malformed cursor")
+    if sort_by not in KEYSET_SORTS or not _is_int(last_id):
+        raise ValueError("malformed cursor")
+    # The key goes straight into a comparison, so it must have the column's type
+    if sort_by == "name" and not isinstance(key, str):
+        raise ValueError("malformed cursor")
+    if sort_by == "rating" and not (key is None or _is_int(key)):
+        raise ValueError("malformed cursor")
+    return sort_by, key, last_id
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def after_cursor(sort_by: str, key, last_id: int):
+    """WHERE clause selecting the rows that sort strictly after the cursor."""
+    if sort_by == "rating":
+        if key is None:
+            # Already inside the trailing block of unrated rows
+            return and_(R.rating.is_(None), R.id > last_id)
+        return or_(
+            R.rating < key,
+            and_(R.rating == key, R.id > last_id),
+            R.rating.is_(None),
+        )
+    return or_(R.name > key, and_(R.name == key, R.id > last_id))
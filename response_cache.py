@@ -0,0 +1,110 @@
+import threading
+from collections import OrderedDict, namedtuple
+
+from fastapi import Response
+
+import compression
+import versions
+from serializers import dumps
+
+MAX_ENTRIES = 256
+MAX_BYTES = 32 * 1024 * 1024  # Across all stored encodings
+# Lets a reverse proxy (or the browser) reuse a public list briefly and
+# then revalidate it cheaply with the ETag
+CACHE_CONTROL = "public, max-age=60, stale-while-revalidate=300"
+
+# stamp: the data versions the bodies were built from
+# bodies: content-coding ("identity", "gzip", "br") -> bytes
+Entry = namedtuple("Entry", "stamp etag bodies size")
+
+# Representations of the same data, cached side by side (see serializers.to_columns)
+VARIANTS = ("json", "columnar")
+
+_entries = OrderedDict()  # (primary scope, variant) -> Entry
+_bytes = 0
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+
+def _get(key, stamp):
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None or entry.stamp != stamp:
+            _stats["misses"] += 1
+            return None
+        _entries.move_to_end(key)
+        _stats["hits"] += 1
+        return entry
+
+
+def _put(key, entry):
+    global _bytes
+    with _lock:
+        old = _entries.pop(key, None)
+        if old is not None:
+            _bytes -= old.size
+        _entries[key] = entry
+        _bytes += entry.size
+        while _entries and (len(_entries) > MAX_ENTRIES or _bytes > MAX_BYTES):
+            _, evicted = _entries.popitem(last=False)
+            _bytes -= evicted.size
+            _stats["evictions"] += 1
+
+
+def invalidate(keys):
+    global _bytes
+    with _lock:
+        for key in keys:
+            for variant in VARIANTS:
+                entry = _entries.pop((key, variant), None)
+                if entry is not None:
+                    _bytes -= entry.size
+                    _stats["invalidations"] += 1
+
+
+def clear():
+    global _bytes
+    with _lock:
+        _entries.clear()
+        _bytes = 0
+
+
+# Writes drop the affected entries right away; the version stamp check in
+# respond() still guards against anything another worker changed
+versions.bump_listeners.append(invalidate)
+
+
+def stats():
+    with _lock:
+        return {**_stats, "entries": len(_entries), "bytes": _bytes, "brotli": compression.brotli is not None}
+
+
+def respond(request, db, scopes, build, variant="json"):
+    """Serve a public JSON list from the cache, building it on a miss.
+
+    `scopes` are the data versions the payload depends on; the first one
+    is the cache key, along with `variant` (one of VARIANTS). `build`
+    returns the JSON-ready payload. The body is serialized and compressed
+    once per version, so hits only pick the encoding the client accepts.
+    """
+    stamp = tuple(versions.current(db, *scopes))
+    key = (scopes[0], variant)
+    entry = _get(key, stamp)
+    if entry is None:
+        body = dumps(build())
+        bodies = {"identity": body, **compression.compress(body)}
+        etag = versions.make_etag(scopes, stamp, variant)
+        entry = Entry(stamp, etag, bodies, sum(len(b) for b in bodies.values()))
+        _put(key, entry)
+
+    encoding = compression.negotiate(request.headers.get("accept-encoding", ""), entry.bodies) or "identity"
+    # Each encoding is a different representation, so it gets its own tag
+    etag = entry.etag if encoding == "identity" else f'{entry.etag[:-1]}-{encoding}"'
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"}
+    cached = versions.not_modified(request, etag, CACHE_CONTROL)
+    if cached:
+        cached.headers["Vary"] = "Accept-Encoding"
+        return cached
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(entry.bodies[encoding], media_type="application/json", headers=headers)
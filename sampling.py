@@ -0,0 +1,114 @@
+import heapq
+import math
+import random
+
+from sqlalchemy import func, select
+
+import models
+import spatial
+from database import engine
+
+WEIGHTINGS = ("none", "rating", "distance")
+MAX_RATING = 5
+UNRATED_WEIGHT = 2.5  # Unrated places are drawn like a middling 2.5-star one
+DISTANCE_SCALE_MILES = 1.0  # Weight halves once a place is this much further away
+
+# Up to spatial.SCAN_THRESHOLD matches the candidates are read and sampled
+# in Python. Above it, ids are probed at random instead, which costs the
+# same no matter how many restaurants match.
+MAX_PROBE_BATCH = 10000
+MAX_PROBE_ROUNDS = 8
+
+_random = random.SystemRandom()
+
+
+def _weight(weighting, row, lat, lon):
+    if weighting == "rating":
+        return row.rating if row.rating else UNRATED_WEIGHT
+    if weighting == "distance":
+        miles = spatial.haversine_miles(lat, lon, row.latitude, row.longitude)
+        return 1.0 / (1.0 + miles / DISTANCE_SCALE_MILES)
+    return 1.0
+
+
+def _scan(db, columns, filters, n, weighting, lat, lon):
+    """Sample from every candidate; weighted draws use Efraimidis-Spirakis keys."""
+    rows = db.execute(select(*columns).where(*filters)).all()
+    if weighting == "none":
+        return _random.sample([row.id for row in rows], min(n, len(rows)))
+    # The n largest u ** (1 / w) (compared as log(u) / w) are a weighted
+    # sample without replacement
+    keyed = (
+        (math.log(_random.random() or 1e-300) / _weight(weighting, row, lat, lon), row.id)
+        for row in rows
+    )
+    return [row_id for _, row_id in heapq.nlargest(n, keyed)]
+
+
+def _probe(db, columns, filters, n, weighting, lat, lon, max_weight):
+    """Rejection sampling over the primary key range.
+
+    Each round draws random ids between min(id) and max(id) and looks them
+    up in one `IN` query; a proposal is kept if it exists, matches the
+    filters, was not picked already and passes a weight/max_weight coin
+    flip. Processed in draw order this is exactly sequential weighted
+    sampling without replacement. Returns None if the rounds run out (a
+    very skewed weighting), so the caller can fall back to a scan.
+    """
+    R = models.Restaurant
+    # Separate queries: SQLite only answers a lone min()/max() from the index
+    lo = db.execute(select(func.min(R.id))).scalar()
+    hi = db.execute(select(func.max(R.id))).scalar()
+    span = hi - lo + 1
+    # More than SCAN_THRESHOLD of the span matches, so this many proposals
+    # are expected to find 2n matches even in the sparsest case
+    batch = min(MAX_PROBE_BATCH, math.ceil(2 * n * span / spatial.SCAN_THRESHOLD))
+
+    picks = []
+    for _ in range(MAX_PROBE_ROUNDS):
+        proposals = [_random.randrange(lo, hi + 1) for _ in range(batch)]
+        rows = {row.id: row for row in db.execute(select(*columns).where(*filters, R.id.in_(set(proposals))))}
+        for row_id in proposals:
+            row = rows.get(row_id)
+            if row is None or row_id in picks:
+                continue
+            if _random.random() * max_weight >= _weight(weighting, row, lat, lon):
+                continue
+            picks.append(row_id)
+            if len(picks) == n:
+                return picks
+    return None
+
+
+def choose(db, filters, n, weighting="none", lat=None, lon=None):
+    """Return up to n distinct restaurant ids drawn at random from `filters`.
+
+    Draws are uniform, or proportional to rating or to closeness to
+    (lat, lon). Only the columns the weighting needs are read, and full
+    rows are loaded by the caller for the picks alone.
+    """
+    R = models.Restaurant
+    if weighting == "distance":
+        columns = (R.id, R.latitude, R.longitude)
+        filters = [*filters, R.latitude.isnot(None), R.longitude.isnot(None)]
+    elif weighting == "rating":
+        columns = (R.id, R.rating)
+    else:
+        columns = (R.id,)
+
+    if spatial.matching_at_most(db, filters):
+        return _scan(db, columns, filters, n, weighting, lat, lon)
+
+    picks = None
+    if weighting == "distance":
+        # The closest match bounds every weight, keeping rejections low
+        closest = spatial.nearest(db, engine, filters, lat, lon, 1)
+        if closest:
+            max_weight = 1.0 / (1.0 + closest[0][1] / DISTANCE_SCALE_MILES)
+            picks = _probe(db, columns, filters, n, weighting, lat, lon, max_weight)
+    else:
+        max_weight = MAX_RATING if weighting == "rating" else 1.0
+        picks = _probe(db, columns, filters, n, weighting, lat, lon, max_weight)
+    if picks is None:
+        picks = _scan(db, columns, filters, n, weighting, lat, lon)
+    return picks
@@ -0,0 +1,194 @@
+import json
+
+from fastapi.responses import JSONResponse
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import models
+from database import ReadSessionLocal
+
+try:
+    import orjson
+except ImportError:  # Optional: the stdlib encoder gives the same bytes, more slowly
+    orjson = None
+
+# Columns read for every restaurant in a listing. Selecting plain columns
+# (instead of ORM entities) skips identity-map hydration entirely.
+RESTAURANT_COLUMNS = (
+    models.Restaurant.id,
+    models.Restaurant.name,
+    models.Restaurant.address,
+    models.Restaurant.latitude,
+    models.Restaurant.longitude,
+    models.Restaurant.rating,
+    models.Restaurant.price_range,
+    models.Restaurant.personal_notes,
+    models.Restaurant.status,
+)
+RESTAURANT_KEYS = (*(c.key for c in RESTAURANT_COLUMNS), "cuisine_ids", "group_ids")
+
+
+def dumps(content):
+    """Compact UTF-8 JSON bytes, via orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered by dumps()."""
+
+    def render(self, content):
+        return dumps(content)
+
+
+def restaurant_select():
+    """Base SELECT for listings; callers add their own filters and ordering."""
+    return select(*RESTAURANT_COLUMNS)
+
+
+def load_restaurant_links(db: Session, id_query):
+    """Bulk-load cuisines and groups for every restaurant matched by `id_query`.
+
+    `id_query` is a SELECT of restaurant ids (it may keep its ORDER BY/LIMIT)
+    or a list of ids, used as an `IN (...)` so the cost is always two
+    queries no matter how many restaurants are listed.
+    """
+    rc = models.restaurant_cuisines
+    rg = models.restaurant_groups
+
+    cuisines = {}
+    cuisine_rows = db.execute(
+        select(rc.c.restaurant_id, models.Cuisine.id, models.Cuisine.name)
+        .join(models.Cuisine, models.Cuisine.id == rc.c.cuisine_id)
+        .where(rc.c.restaurant_id.in_(id_query))
+        .order_by(rc.c.restaurant_id, models.Cuisine.id)
+    )
+    for restaurant_id, cuisine_id, name in cuisine_rows:
+        cuisines.setdefault(restaurant_id, []).append({"id": cuisine_id, "name": name})
+
+    groups = {}
+    group_rows = db.execute(
+        select(rg.c.restaurant_id, models.Group.id, models.Group.name, models.Group.is_published)
+        .join(models.Group, models.Group.id == rg.c.group_id)
+        .where(rg.c.restaurant_id.in_(id_query))
+        .order_by(rg.c.restaurant_id, models.Group.id)
+    )
+    for restaurant_id, group_id, name, is_published in group_rows:
+        groups.setdefault(restaurant_id, []).append(
+            {"id": group_id, "name": name, "is_published": bool(is_published)}
+        )
+
+    return cuisines, groups
+
+
+def load_restaurant_link_ids(db: Session, id_query):
+    """Like load_restaurant_links(), but only the linked ids: no joins."""
+    links = []
+    for table, column in ((models.restaurant_cuisines, "cuisine_id"), (models.restaurant_groups, "group_id")):
+        ids = {}
+        for restaurant_id, linked_id in db.execute(
+            select(table.c.restaurant_id, table.c[column])
+            .where(table.c.restaurant_id.in_(id_query))
+            .order_by(table.c.restaurant_id, table.c[column])
+        ):
+            ids.setdefault(restaurant_id, []).append(linked_id)
+        links.append(ids)
+    return links
+
+
+def restaurant_row_to_dict(row, cuisines, groups, link_keys=("cuisines", "groups")):
+    """Build the public Restaurant JSON shape straight from a result row.
+
+    Labelled columns added after RESTAURANT_COLUMNS (e.g. a search snippet)
+    are passed through under their label.
+    """
+    data = {
+        "id": row.id,
+        "name": row.name,
+        "address": row.address,
+        "latitude": row.latitude,
+        "longitude": row.longitude,
+        "rating": row.rating,
+        "price_range": row.price_range,
+        "personal_notes": row.personal_notes,
+        "status": row.status,
+        link_keys[0]: cuisines.get(row.id, []),
+        link_keys[1]: groups.get(row.id, []),
+    }
+    for key in row._fields[len(RESTAURANT_COLUMNS):]:
+        data[key] = getattr(row, key)
+    return data
+
+
+def serialize_restaurants(db: Session, query, link_ids: bool = False):
+    """Run a `restaurant_select()` query and return JSON-ready dicts.
+
+    Always three queries: the rows themselves plus one per association table.
+    With `link_ids`, rows carry cuisine_ids/group_ids instead of the
+    cuisine and group objects (see to_columns()).
+    """
+    rows = db.execute(query).all()
+    if not rows:
+        return []
+    id_query = query.with_only_columns(models.Restaurant.id)
+    if link_ids:
+        cuisines, groups = load_restaurant_link_ids(db, id_query)
+        return [restaurant_row_to_dict(row, cuisines, groups, ("cuisine_ids", "group_ids")) for row in rows]
+    cuisines, groups = load_restaurant_links(db, id_query)
+    return [restaurant_row_to_dict(row, cuisines, groups) for row in rows]
+
+
+def to_columns(rows):
+    """The ?format=columnar shape: one array per field instead of one object per row.
+
+    Rows come from serialize_restaurants(link_ids=True). Statuses are
+    indexes into "statuses"; cuisines and groups are ids, resolved by the
+    client against /api/cuisines and /api/groups.
+    """
+    # Known statuses get stable codes; any other value found in the data is
+    # appended to the payload's own list
+    statuses = list(models.STATUSES)
+    codes = {status: code for code, status in enumerate(statuses)}
+    status_column = []
+    for row in rows:
+        code = codes.get(row["status"])
+        if code is None:
+            code = codes[row["status"]] = len(statuses)
+            statuses.append(row["status"])
+        status_column.append(code)
+
+    fields = [key for key in (rows[0] if rows else RESTAURANT_KEYS) if key != "status"]
+    columns = {"format": "columnar", "count": len(rows), "statuses": statuses, "status": status_column}
+    for key in fields:
+        columns[key] = [row[key] for row in rows]
+    return columns
+
+
+def serialize_restaurant(db: Session, restaurant_id: int):
+    """Serialize a single restaurant by id (used by the write endpoints)."""
+    rows = serialize_restaurants(db, restaurant_select().where(models.Restaurant.id == restaurant_id))
+    return rows[0] if rows else None
+
+
+def iter_restaurant_batches(query, batch_size: int = 500):
+    """Yield lists of serialized restaurants, reading rows from a server-side cursor.
+
+    Links are bulk-loaded per batch, so memory stays bounded by `batch_size`.
+    The generator owns its session: the request's session is already closed
+    by the time a StreamingResponse starts iterating.
+    """
+    db = ReadSessionLocal()
+    try:
+        result = db.execute(query.execution_options(stream_results=True, yield_per=batch_size))
+        for batch in result.partitions():
+            cuisines, groups = load_restaurant_links(db, [row.id for row in batch])
+            yield [restaurant_row_to_dict(row, cuisines, groups) for row in batch]
+    finally:
+        db.close()
+
+
+def stream_restaurants_ndjson(query, batch_size: int = 500):
+    """Yield one JSON line per restaurant (see iter_restaurant_batches)."""
+    for batch in iter_restaurant_batches(query, batch_size):
+        yield b"".join(dumps(row) + b"\n" for row in batch)
@@ -0,0 +1,283 @@
+import math
+import os
+
+from sqlalchemy import Column, Float, Integer, MetaData, Table, and_, func, literal_column, or_, select, text
+from sqlalchemy.exc import DBAPIError
+
+import models
+
+# The R*Tree lives in its own MetaData so create_all() never tries to
+# create it as an ordinary table; install_spatial_index() owns its DDL.
+rtree_metadata = MetaData()
+
+restaurant_rtree = Table(
+    "restaurant_rtree", rtree_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("min_lon", Float),
+    Column("max_lon", Float),
+    Column("min_lat", Float),
+    Column("max_lat", Float),
+)
+
+RTREE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS restaurant_rtree
+       USING rtree(id, min_lon, max_lon, min_lat, max_lat)""",
+    """CREATE TRIGGER IF NOT EXISTS restaurants_rtree_insert AFTER INSERT ON restaurants
+       WHEN new.latitude IS NOT NULL AND new.longitude IS NOT NULL
+       BEGIN
+           INSERT OR REPLACE INTO restaurant_rtree
+           VALUES (new.id, new.longitude, new.longitude, new.latitude, new.latitude);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS restaurants_rtree_update AFTER UPDATE OF latitude, longitude ON restaurants
+       BEGIN
+           DELETE FROM restaurant_rtree WHERE id = old.id;
+           INSERT INTO restaurant_rtree
+           SELECT new.id, new.longitude, new.longitude, new.latitude, new.latitude
+           WHERE new.latitude IS NOT NULL AND new.longitude IS NOT NULL;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS restaurants_rtree_delete AFTER DELETE ON restaurants
+       BEGIN
+           DELETE FROM restaurant_rtree WHERE id = old.id;
+       END""",
+]
+
+
+def has_spatial_index(engine):
+    return engine.dialect.name == "sqlite"
+
+
+def install_spatial_index(conn):
+    """Create the R*Tree shadow table and its sync triggers (SQLite only).
+
+    Triggers keep the index in step with every insert/update/delete on
+    `restaurants`, whatever code path performs it. Existing rows are
+    backfilled the first time the table is created. Runs inside the
+    caller's transaction (see migrations.py).
+    """
+    if not has_spatial_index(conn):
+        return
+    exists = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'restaurant_rtree'")
+    ).first()
+    for ddl in RTREE_DDL:
+        conn.execute(text(ddl))
+    if not exists:
+        conn.execute(text(
+            "INSERT INTO restaurant_rtree "
+            "SELECT id, longitude, longitude, latitude, latitude FROM restaurants "
+            "WHERE latitude IS NOT NULL AND longitude IS NOT NULL"
+        ))
+        print("Spatial index: backfilled restaurant_rtree.")
+
+
+# --- PostGIS (experimental) ---
+# On Postgres the index is a generated geography column, so every write
+# path keeps it current without triggers. GiST indexes cover KNN ordering
+# on the geography and bounding-box tests on its geometry cast (a lat/lon
+# box is a planar rectangle, not a geodesic one). Off unless PG_POSTGIS=1:
+# the Postgres backend is tested without PostGIS, this path is not yet.
+POSTGIS_ENABLED = os.getenv("PG_POSTGIS", "0") == "1"
+
+GEOGRAPHY_DDL = [
+    """ALTER TABLE restaurants ADD COLUMN IF NOT EXISTS geog geography(Point, 4326)
+       GENERATED ALWAYS AS (ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)::geography) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_restaurants_geog ON restaurants USING gist (geog)",
+    "CREATE INDEX IF NOT EXISTS ix_restaurants_geog_box ON restaurants USING gist ((geog::geometry))",
+]
+
+geog = literal_column("restaurants.geog")
+geog_box = literal_column("restaurants.geog::geometry")
+
+_geography = {}  # database URL -> whether restaurants.geog exists
+
+
+def has_geography(bind):
+    """True when PostGIS is enabled and `bind` has the column in place; checked once per database."""
+    if not POSTGIS_ENABLED or bind.dialect.name != "postgresql":
+        return False
+    key = str(bind.engine.url)
+    if key not in _geography:
+        with bind.engine.connect() as conn:
+            _geography[key] = conn.execute(text(
+                "SELECT 1 FROM information_schema.columns "
+                "WHERE table_schema = current_schema() AND table_name = 'restaurants' AND column_name = 'geog'"
+            )).first() is not None
+    return _geography[key]
+
+
+def install_geography_index(conn):
+    """Add the PostGIS geography column and its indexes (Postgres with PG_POSTGIS=1).
+
+    Needs the postgis extension, or the right to create it. Without it
+    (or with PG_POSTGIS off) the location queries keep using the plain
+    coordinate filters; the migration is still recorded, so to turn it on
+    later run `PG_POSTGIS=1 python spatial.py` (it is safe to repeat).
+    """
+    if not POSTGIS_ENABLED or conn.dialect.name != "postgresql":
+        return
+    try:
+        # A savepoint, so a refusal leaves the migration's transaction usable
+        with conn.begin_nested():
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS postgis"))
+            for ddl in GEOGRAPHY_DDL:
+                conn.execute(text(ddl))
+    except DBAPIError as e:
+        print(f"Spatial index: PostGIS unavailable, using coordinate filters ({str(e.orig).splitlines()[0]})")
+        return
+    _geography.clear()
+    print("Spatial index: restaurants.geog and its GiST indexes are in place.")
+
+
+def parse_bbox(value: str):
+    """Parse `minLon,minLat,maxLon,maxLat`; returns a 4-tuple or raises ValueError.
+
+    minLon may be greater than maxLon when the box crosses the antimeridian.
+    """
+    parts = [float(p) for p in value.split(",")]
+    if len(parts) != 4:
+        raise ValueError("bbox must have four comma-separated numbers")
+    min_lon, min_lat, max_lon, max_lat = parts
+    if not (-180 <= min_lon <= 180 and -180 <= max_lon <= 180):
+        raise ValueError("bbox longitudes must be within [-180, 180]")
+    if not (-90 <= min_lat <= max_lat <= 90):
+        raise ValueError("bbox latitudes must be within [-90, 90] and ordered")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def _lon_ranges(min_lon, max_lon):
+    if min_lon <= max_lon:
+        return [(min_lon, max_lon)]
+    # Crosses the antimeridian: split into two boxes
+    return [(min_lon, 180.0), (-180.0, max_lon)]
+
+
+def bbox_filter(engine, bbox):
+    """WHERE clause restricting restaurants to a bounding box.
+
+    On SQLite the candidates come from the R*Tree and on Postgres from the
+    PostGIS index; elsewhere it falls back to a plain range filter on the
+    coordinate columns.
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+    ranges = _lon_ranges(min_lon, max_lon)
+
+    R = models.Restaurant
+    exact = and_(
+        R.latitude.between(min_lat, max_lat),
+        or_(*[R.longitude.between(lo, hi) for lo, hi in ranges]),
+    )
+    if has_geography(engine):
+        boxes = or_(*[geog_box.op("&&")(func.ST_MakeEnvelope(lo, min_lat, hi, max_lat, 4326)) for lo, hi in ranges])
+        return and_(boxes, exact)
+    if not has_spatial_index(engine):
+        return exact
+
+    # R*Tree boxes are 32-bit floats rounded outwards, so the tree yields a
+    # slightly generous candidate set that the exact test then trims.
+    rt = restaurant_rtree
+    box = or_(*[
+        and_(rt.c.max_lon >= lo, rt.c.min_lon <= hi) for lo, hi in ranges
+    ])
+    candidates = select(rt.c.id).where(box, rt.c.max_lat >= min_lat, rt.c.min_lat <= max_lat)
+    return and_(R.id.in_(candidates), exact)
+
+
+# --- Nearest-neighbour search ---
+
+EARTH_RADIUS_MILES = 3959  # Same constant as getDistanceMiles in app.js
+METERS_PER_MILE = 1609.344
+MAX_SEARCH_MILES = math.pi * EARTH_RADIUS_MILES  # Half the circumference covers the globe
+# Below this many matching rows a straight scan of the owner's coordinates
+# beats walking the shared R*Tree, whose boxes are full of other owners' rows
+# (sampling.py draws on the same cut-off).
+SCAN_THRESHOLD = 5000
+
+
+def haversine_miles(lat1, lon1, lat2, lon2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dlat = p2 - p1
+    dlon = math.radians(lon2 - lon1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * math.asin(min(1.0, math.sqrt(a)))
+
+
+def radius_bbox(lat, lon, miles):
+    """Smallest lat/lon box containing every point within `miles` of (lat, lon)."""
+    angular = miles / EARTH_RADIUS_MILES
+    min_lat = lat - math.degrees(angular)
+    max_lat = lat + math.degrees(angular)
+    if min_lat <= -90 or max_lat >= 90:
+        # The circle reaches a pole, so every longitude is in range
+        return (-180.0, max(min_lat, -90.0), 180.0, min(max_lat, 90.0))
+    dlon = math.degrees(math.asin(min(1.0, math.sin(angular) / math.cos(math.radians(lat)))))
+    if dlon >= 180:
+        return (-180.0, min_lat, 180.0, max_lat)
+    wrap = lambda x: ((x + 540) % 360) - 180
+    return (wrap(lon - dlon), min_lat, wrap(lon + dlon), max_lat)
+
+
+def matching_at_most(db, filters, limit=None):
+    """True if no more than `limit` (SCAN_THRESHOLD) restaurants match `filters`; counts at most limit + 1 rows."""
+    R = models.Restaurant
+    limit = SCAN_THRESHOLD if limit is None else limit
+    matching = db.execute(
+        select(func.count()).select_from(select(R.id).where(*filters).limit(limit + 1).subquery())
+    ).scalar()
+    return matching <= limit
+
+
+def _closest(lat, lon, rows, k, limit):
+    hits = []
+    for rid, rlat, rlon in rows:
+        d = haversine_miles(lat, lon, rlat, rlon)
+        if d <= limit:
+            hits.append((d, rid))
+    hits.sort()
+    return [(rid, d) for d, rid in hits[:k]]
+
+
+def nearest(db, engine, filters, lat, lon, k, max_miles=None, start_miles=1.0):
+    """Return up to k `(restaurant_id, miles)` pairs closest to (lat, lon).
+
+    Small filtered sets are scanned directly. Otherwise the search radius
+    grows geometrically, each round being a bbox query on the spatial
+    index. A round is final once it finds k points inside the circle it
+    fully covers (or the radius cap is reached), so results are exact
+    without ever scanning the whole table. With PostGIS one KNN query
+    walks the geography index in distance order instead.
+    """
+    R = models.Restaurant
+    limit = min(max_miles, MAX_SEARCH_MILES) if max_miles else MAX_SEARCH_MILES
+
+    if matching_at_most(db, filters):
+        rows = db.execute(select(R.id, R.latitude, R.longitude).where(*filters, R.latitude.isnot(None))).all()
+        return _closest(lat, lon, rows, k, limit)
+
+    if has_geography(engine):
+        point = func.geography(func.ST_SetSRID(func.ST_MakePoint(lon, lat), 4326))
+        query = select(R.id, R.latitude, R.longitude).where(*filters, geog.isnot(None))
+        if limit < MAX_SEARCH_MILES:
+            # Sphere distance, like haversine; _closest() applies the exact cut
+            query = query.where(func.ST_DWithin(geog, point, limit * METERS_PER_MILE * 1.001, False))
+        rows = db.execute(query.order_by(geog.op("<->")(point)).limit(k)).all()
+        return _closest(lat, lon, rows, k, limit)
+
+    radius = min(start_miles, limit)
+    while True:
+        box = radius_bbox(lat, lon, radius)
+        rows = db.execute(
+            select(R.id, R.latitude, R.longitude).where(*filters, bbox_filter(engine, box))
+        ).all()
+        hits = _closest(lat, lon, rows, k, radius)
+        if len(hits) >= k or radius >= limit:
+            return hits
+        radius = min(radius * 4, limit)
+
+
+if __name__ == "__main__":
+    # PG_POSTGIS=1 python spatial.py   -- add the PostGIS index to a database migrated without it
+    if not POSTGIS_ENABLED:
+        raise SystemExit("PostGIS is off; set PG_POSTGIS=1")
+    from database import engine
+    with engine.begin() as conn:
+        install_geography_index(conn)
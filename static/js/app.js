@@ -12,6 +12,11 @@ document.addEventListener('DOMContentLoaded', () => {
             .replace(/'/g, "&#039;");
     }
 
+    // Search snippets arrive with \x02/\x03 around matches; escape first, then mark
+    function highlightSnippet(snippet) {
+        return escapeHtml(snippet).replace(/\x02/g, '<mark class="bg-yellow-200 dark:bg-yellow-700 rounded px-0.5">').replace(/\x03/g, '</mark>');
+    }
+
     // --- DOM Elements ---
     const listContainer = document.getElementById('restaurant-list');
     const cuisineFilter = document.getElementById('filter-cuisine');
@@ -78,6 +83,8 @@ document.addEventListener('DOMContentLoaded', () => {
     sortSelect.innerHTML = `
         <option value="name">Sort: A-Z</option>
         <option value="rating">Sort: Best Rated</option>
+        <option value="nearby">Sort: Nearest</option>
+        <option value="relevance">Sort: Best Match</option>
     `;
     const filterBar = document.querySelector('.overflow-x-auto');
     if (filterBar) {
@@ -120,12 +127,16 @@ document.addEventListener('DOMContentLoaded', () => {
                 handleGuestMode();
             }
         } catch (e) {
-            handleGuestMode();
+            // Offline: carry on as whoever the local replica belongs to
+            const meta = await readReplicaMeta().catch(() => null);
+            if (meta) handleLoginSuccess(meta.user);
+            else handleGuestMode();
         }
     }
 
     function handleLoginSuccess(user) {
         currentUser = user;
+        viewportMode = true; // Owner's markers follow the visible map area
         // UI Updates
         if (logoutBtn) { logoutBtn.classList.remove('hidden'); logoutBtn.style.display = ''; }
         if (loginBtn) loginBtn.classList.add('hidden');
@@ -134,10 +145,12 @@ document.addEventListener('DOMContentLoaded', () => {
             userDisplay.classList.remove('hidden');
         }
 
-        // Load Data
-        loadGroups();
-        loadCuisines();
-        loadRestaurants();
+        // Load Data: the local replica first, then whatever changed since
+        showReplica(user).then(() => {
+            loadGroups();
+            loadCuisines();
+            loadRestaurants();
+        });
         loadGooglePlaces();
     }
 
@@ -165,13 +178,71 @@ document.addEventListener('DOMContentLoaded', () => {
         if (btnManageGroups) btnManageGroups.style.display = 'none';
         if (logoutBtn) logoutBtn.style.display = 'none';
 
+        viewportMode = true; // Clusters at low zoom, markers when zoomed in
         loadRestaurants(); // Load shared data
+        watchList(`/api/share/${sharedToken}/events`, loadRestaurants, applyClientSideFacets);
+    }
+
+    // --- Live Updates (shared and published lists) ---
+    // The server pushes restaurant changes to a list's viewers as Server-Sent
+    // Events. "ready" (sent on every (re)connect) and "reset" reload the list
+    // whole; "change" patches `restaurants` in place.
+    let liveSource = null;
+    const LIVE_RELOAD_DELAY_MS = 300; // Collapses bursts of resets (bulk imports) into one reload
+
+    function watchList(url, reload, render) {
+        stopWatchingList();
+        if (!window.EventSource) return;
+        const source = new EventSource(url);
+        liveSource = source;
+        let buffered = null; // Changes that arrive during a reload, replayed on top of it
+        let reloadTimer = null;
+
+        const applyChange = (change) => {
+            const replaced = new Set([...change.removed, ...change.upserted.map(r => r.id)]);
+            restaurants = restaurants.filter(r => !replaced.has(r.id)).concat(change.upserted);
+            // Same order as the server's list
+            restaurants.sort((a, b) => (a.name < b.name ? -1 : a.name > b.name ? 1 : a.id - b.id));
+        };
+        const scheduleReload = () => {
+            clearTimeout(reloadTimer);
+            reloadTimer = setTimeout(async () => {
+                if (liveSource !== source) return;
+                buffered = [];
+                try {
+                    await reload();
+                } finally {
+                    const changes = buffered;
+                    buffered = null;
+                    changes.forEach(applyChange);
+                    if (changes.length) render();
+                }
+            }, LIVE_RELOAD_DELAY_MS);
+        };
+
+        source.addEventListener('ready', scheduleReload);
+        source.addEventListener('reset', scheduleReload);
+        source.addEventListener('change', (e) => {
+            const change = JSON.parse(e.data);
+            if (buffered) {
+                buffered.push(change);
+                return;
+            }
+            applyChange(change);
+            render();
+        });
+    }
+
+    function stopWatchingList() {
+        if (liveSource) liveSource.close();
+        liveSource = null;
     }
 
     // Init
     checkLogin();
 
     async function loadPublicGroups() {
+        stopWatchingList();
         const res = await fetch('/api/groups/public'); // Public endpoint, no auth needed
         if (res.ok) {
             const publicGroups = await res.json();
@@ -248,10 +319,25 @@ document.addEventListener('DOMContentLoaded', () => {
                 </h2>
             `;
 
-            renderRestaurants(restaurants);
-            listContainer.insertBefore(headerDiv, listContainer.firstChild);
-
-            document.getElementById('back-to-lists-btn').addEventListener('click', () => loadPublicGroups());
+            headerDiv.querySelector('#back-to-lists-btn').addEventListener('click', () => loadPublicGroups());
+            const render = () => {
+                renderRestaurants(restaurants);
+                listContainer.insertBefore(headerDiv, listContainer.firstChild);
+            };
+            render();
+
+            watchList(`/api/groups/${groupId}/public/events`, async () => {
+                const res = await fetch(`/api/groups/${groupId}/public`);
+                if (res.status === 404) {
+                    // Unpublished or deleted while we were looking
+                    stopWatchingList();
+                    listContainer.innerHTML = '<div class="text-center text-gray-500 mt-10">This list is no longer published.</div>';
+                    return;
+                }
+                if (!res.ok) return;
+                restaurants = await res.json();
+                render();
+            }, render);
 
         } catch (e) {
             listContainer.innerHTML = '<div class="text-center text-red-500">Error loading list.</div>';
@@ -263,6 +349,11 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // Shared view logic moved to handleSharedViewMode
 
+    // url -> { etag, body, headers } of recent GETs, oldest first
+    const etagCache = new Map();
+    const API_CACHE_NAME = 'foodmapper-api-v1'; // Mirrors sw.js
+    const ETAG_CACHE_SIZE = 50;
+
     async function authFetch(url, options = {}) {
         if (isSharedView && options.method && options.method !== 'GET') {
             alert("View Only Mode");
@@ -272,6 +363,12 @@ document.addEventListener('DOMContentLoaded', () => {
         const headers = options.headers || {};
         // No more Authorization header injection!
 
+        // GETs revalidate against the copy we already hold; a 304 is turned
+        // back into that copy so callers always see a normal 200
+        const isGet = !options.method || options.method === 'GET';
+        const cached = isGet ? etagCache.get(url) : null;
+        if (cached) headers['If-None-Match'] = cached.etag;
+
         const res = await fetch(url, { ...options, headers });
 
         if (res.status === 401) {
@@ -281,6 +378,18 @@ document.addEventListener('DOMContentLoaded', () => {
             }
             return res;
         }
+        if (res.status === 304 && cached) {
+            etagCache.delete(url);
+            etagCache.set(url, cached); // Most recently used goes last
+            return new Response(cached.body, { status: 200, headers: cached.headers });
+        }
+        const etag = res.headers.get('ETag');
+        if (isGet && res.ok && etag) {
+            const body = await res.clone().text();
+            etagCache.delete(url);
+            etagCache.set(url, { etag, body, headers: [...res.headers] });
+            if (etagCache.size > ETAG_CACHE_SIZE) etagCache.delete(etagCache.keys().next().value);
+        }
         return res;
     }
 
@@ -295,6 +404,222 @@ document.addEventListener('DOMContentLoaded', () => {
     let userLocation = null;
     let editingId = null; // Track if we are editing
     let selectedId = null; // Track selected restaurant
+    let facetCounts = null; // Last facet counts from /api/restaurants?with_facets=true
+    const PAGE_SIZE = 100; // Owner list is fetched in keyset pages of this size
+    let listQuery = null; // Query string of the current paged list, reused for later pages
+    let nextCursor = null; // X-Next-Cursor from the last page; null once the list is complete
+    let loadingMore = false;
+    // Invisible marker at the end of the list; scrolling it into view loads the next page
+    const listSentinel = document.createElement('div');
+    listSentinel.className = 'h-1';
+    const listObserver = new IntersectionObserver(entries => {
+        if (entries.some(e => e.isIntersecting)) loadMoreRestaurants();
+    }, { rootMargin: '400px' });
+    let viewportMode = false; // true: markers/clusters follow the visible map area
+    let viewportTimeout;
+    let viewportRequest = 0;
+    let clusterLayers = [];
+    let mapOnly = new Map(); // id -> restaurant with a marker but no card on the loaded pages
+    const MAX_CLUSTER_ZOOM = 15; // Mirrors clusters.MAX_CLUSTER_ZOOM on the server
+
+    // --- Offline Replica ---
+    // The owner's restaurants, cuisines and groups are mirrored in IndexedDB
+    // and brought up to date with /api/sync deltas, so an unchanged account
+    // costs one tiny request. Online, the list still comes from the server,
+    // filtered in SQL and fetched a page at a time; the replica fills the
+    // cuisine and group menus. Offline, the list, its facet counts and the
+    // map are answered from the replica.
+    const REPLICA_DB = 'foodmapper-replica';
+    const REPLICA_STORES = ['restaurants', 'cuisines', 'groups'];
+    const LOCAL_PAGES = 'local'; // nextCursor while later pages come from the replica
+    const replica = { user: null, cursor: null, synced: false, restaurants: new Map(), cuisines: new Map(), groups: new Map() };
+    let replicaDbPromise = null;
+    let replicaSync = null; // In-flight sync, shared by concurrent callers
+    let localRest = []; // Replica rows not yet paged into the list
+    let offline = false;
+
+    function idbDone(request) {
+        return new Promise((resolve, reject) => {
+            request.onsuccess = request.oncomplete = () => resolve(request.result);
+            request.onerror = request.onabort = () => reject(request.error);
+        });
+    }
+
+    function replicaDb() {
+        if (!replicaDbPromise) {
+            const request = indexedDB.open(REPLICA_DB, 1);
+            request.onupgradeneeded = () => {
+                REPLICA_STORES.forEach(name => request.result.createObjectStore(name, { keyPath: 'id' }));
+                request.result.createObjectStore('meta');
+            };
+            replicaDbPromise = idbDone(request).then(db => {
+                // Let another tab's logout delete the database
+                db.onversionchange = () => { db.close(); replicaDbPromise = null; };
+                return db;
+            });
+        }
+        return replicaDbPromise;
+    }
+
+    async function readReplicaMeta() {
+        const db = await replicaDb();
+        return idbDone(db.transaction('meta').objectStore('meta').get('state'));
+    }
+
+    // Another user's copy is never shown: the replica is tied to one username
+    async function loadReplica(username) {
+        try {
+            const db = await replicaDb();
+            const tx = db.transaction([...REPLICA_STORES, 'meta']);
+            const meta = await idbDone(tx.objectStore('meta').get('state'));
+            if (!meta || meta.user.username !== username) return false;
+            const rows = await Promise.all(REPLICA_STORES.map(name => idbDone(tx.objectStore(name).getAll())));
+            REPLICA_STORES.forEach((name, i) => { replica[name] = new Map(rows[i].map(row => [row.id, row])); });
+            replica.user = username;
+            replica.cursor = meta.cursor;
+            return true;
+        } catch (e) {
+            console.warn("Replica unavailable", e);
+            return false;
+        }
+    }
+
+    async function applySync(delta, user) {
+        try {
+            const db = await replicaDb();
+            const tx = db.transaction([...REPLICA_STORES, 'meta'], 'readwrite');
+            REPLICA_STORES.forEach(name => {
+                const store = tx.objectStore(name);
+                if (delta.reset) store.clear();
+                // Deletions first: a deleted id can come back as a new row in the same delta
+                delta.deleted[name].forEach(id => store.delete(id));
+                delta[name].forEach(row => store.put(row));
+            });
+            tx.objectStore('meta').put({ user, cursor: delta.cursor }, 'state');
+            await idbDone(tx);
+        } catch (e) {
+            // No IndexedDB (private browsing): keep the replica in memory only
+            console.warn("Replica not saved", e);
+        }
+        REPLICA_STORES.forEach(name => {
+            const local = replica[name];
+            if (delta.reset) local.clear();
+            delta.deleted[name].forEach(id => local.delete(id));
+            delta[name].forEach(row => local.set(row.id, row));
+        });
+        replica.user = user.username;
+        replica.cursor = delta.cursor;
+        replica.synced = true;
+    }
+
+    // Resolves to true once the replica is current, false when the server can't be reached
+    function syncReplica() {
+        if (!replicaSync) {
+            replicaSync = (async () => {
+                const since = replica.user === currentUser.username && replica.cursor !== null ? `?since=${replica.cursor}` : '';
+                const res = await authFetch(`/api/sync${since}`);
+                if (!res.ok) throw new Error(`Sync failed (${res.status})`);
+                await applySync(await res.json(), currentUser);
+                offline = false;
+                return true;
+            })().catch(e => {
+                console.warn("Sync failed, using the local replica", e);
+                offline = true;
+                return false;
+            }).finally(() => { replicaSync = null; });
+        }
+        return replicaSync;
+    }
+
+    async function clearReplica() {
+        if (replicaDbPromise) (await replicaDbPromise.catch(() => null))?.close();
+        replicaDbPromise = null;
+        if ('indexedDB' in window) await idbDone(indexedDB.deleteDatabase(REPLICA_DB)).catch(() => {});
+    }
+
+    // Replica rows in the shape the restaurant endpoints return
+    function replicaRestaurant(r) {
+        return {
+            ...r,
+            cuisines: r.cuisine_ids.map(id => replica.cuisines.get(id)).filter(Boolean),
+            groups: r.group_ids.map(id => replica.groups.get(id)).filter(Boolean),
+        };
+    }
+
+    function replicaCuisines() {
+        return [...replica.cuisines.values()].sort((a, b) => a.id - b.id);
+    }
+
+    function replicaGroups() {
+        return [...replica.groups.values()].sort((a, b) => a.id - b.id);
+    }
+
+    // Same order as the server: binary name order, or rating with unrated last, then id
+    function compareRestaurants(sortVal) {
+        const byId = (a, b) => a.id - b.id;
+        if (sortVal === 'rating') return (a, b) => ((b.rating ?? -1) - (a.rating ?? -1)) || byId(a, b);
+        if (sortVal === 'nearby' && userLocation) {
+            const miles = r => getDistanceMiles(userLocation.lat, userLocation.lng, r.latitude, r.longitude);
+            return (a, b) => (miles(a) - miles(b)) || byId(a, b);
+        }
+        return (a, b) => (a.name < b.name ? -1 : a.name > b.name ? 1 : byId(a, b));
+    }
+
+    function replicaList() {
+        const query = searchInput.value.trim().toLowerCase();
+        let list = [...replica.restaurants.values()].map(replicaRestaurant).filter(matchesFacets);
+        // Offline stand-in for full-text search
+        if (query) list = list.filter(r => [r.name, r.address, r.personal_notes].some(v => v && v.toLowerCase().includes(query)));
+        return list.sort(compareRestaurants(sortSelect.value));
+    }
+
+    // Facet counts like the server's: each facet counted under the other active filters
+    function replicaFacets() {
+        const rows = [...replica.restaurants.values()].map(replicaRestaurant);
+        const filters = {
+            status: r => !statusFilter || !statusFilter.value || r.status == statusFilter.value,
+            price_range: r => !priceFilter.value || r.price_range == priceFilter.value,
+            rating: r => !ratingFilter.value || r.rating >= ratingFilter.value,
+            cuisine_id: r => !cuisineFilter.value || r.cuisine_ids.some(id => id == cuisineFilter.value),
+            group_id: r => !groupFilter || !groupFilter.value || r.group_ids.some(id => id == groupFilter.value),
+        };
+        const values = {
+            status: r => [r.status], price_range: r => [r.price_range], rating: r => [r.rating],
+            cuisine_id: r => r.cuisine_ids, group_id: r => r.group_ids,
+        };
+        const facets = {};
+        for (const facet in filters) {
+            const counts = new Map();
+            rows.filter(r => Object.entries(filters).every(([name, test]) => name === facet || test(r)))
+                .forEach(r => values[facet](r).forEach(v => counts.set(v, (counts.get(v) || 0) + 1)));
+            facets[facet] = [...counts].map(([value, count]) => ({ value, count }));
+        }
+        return facets;
+    }
+
+    function renderReplicaList() {
+        const list = replicaList();
+        restaurants = list.slice(0, PAGE_SIZE);
+        localRest = list.slice(PAGE_SIZE);
+        nextCursor = localRest.length ? LOCAL_PAGES : null;
+        renderFacetCounts(replicaFacets());
+        renderRestaurants(restaurants);
+    }
+
+    // Fill the menus from the stored copy before the network answers
+    async function showReplica(user) {
+        if (!await loadReplica(user.username)) return;
+        cuisines = replicaCuisines();
+        groups = replicaGroups();
+        renderCuisineOptions();
+        renderGroupOptions();
+        renderManageGroups();
+    }
+
+    function renderOfflineList() {
+        if (replica.user === currentUser.username) renderReplicaList();
+        else listContainer.innerHTML = '<div class="text-center text-red-500 mt-10">Offline, and nothing saved on this device yet.</div>';
+    }
 
     // Logout Logic
     // logoutBtn defined at top (line 27)
@@ -304,6 +629,9 @@ document.addEventListener('DOMContentLoaded', () => {
         logoutBtn.addEventListener('click', async () => {
             try {
                 await fetch('/api/logout', { method: 'POST' });
+                // Cached API responses belong to this user; don't leave them for the next one
+                if ('caches' in window) await caches.delete(API_CACHE_NAME);
+                await clearReplica();
             } catch (e) {
                 console.error("Logout failed", e);
             }
@@ -337,6 +665,146 @@ document.addEventListener('DOMContentLoaded', () => {
                 L.circleMarker([lat, lng], { radius: 8, fillColor: "#3388ff", color: "#fff", weight: 2, opacity: 1, fillOpacity: 0.8 }).addTo(map).bindPopup("You are here");
             }, () => console.log("Geolocation permission denied."));
         }
+
+        map.on('moveend', scheduleViewportLoad);
+    }
+
+    // --- Viewport Markers ---
+    // Only the restaurants inside the visible bounds are fetched and drawn.
+    function viewportBbox() {
+        const b = map.getBounds();
+        let west = b.getWest(), east = b.getEast();
+        if (east - west >= 360) {
+            west = -180; east = 180;
+        } else {
+            // Wrap into [-180, 180]; west > east means the view crosses the antimeridian
+            west = ((west + 540) % 360) - 180;
+            east = ((east + 540) % 360) - 180;
+        }
+        const south = Math.max(-90, b.getSouth());
+        const north = Math.min(90, b.getNorth());
+        return [west, south, east, north].map(v => v.toFixed(6)).join(',');
+    }
+
+    function scheduleViewportLoad() {
+        if (!viewportMode) return;
+        clearTimeout(viewportTimeout);
+        viewportTimeout = setTimeout(loadViewportMarkers, 150);
+    }
+
+    function clustersApply() {
+        // Server clusters are precomputed per status only; other filters need real rows
+        const query = searchInput ? searchInput.value.trim() : '';
+        return map.getZoom() <= MAX_CLUSTER_ZOOM && !query && !cuisineFilter.value && !ratingFilter.value
+            && !priceFilter.value && !(groupFilter && groupFilter.value);
+    }
+
+    async function loadViewportMarkers() {
+        if (!viewportMode || !map) return;
+        const requestId = ++viewportRequest;
+        const params = new URLSearchParams();
+        params.append('bbox', viewportBbox());
+        try {
+            if (clustersApply()) {
+                params.append('zoom', map.getZoom());
+                if (statusFilter && statusFilter.value) params.append('status', statusFilter.value);
+                const base = isSharedView ? `/api/share/${sharedToken}/clusters` : '/api/restaurants/clusters';
+                const res = await authFetch(`${base}?${params.toString()}`);
+                if (!res.ok || requestId !== viewportRequest) return;
+                const clusters = await res.json();
+                if (requestId !== viewportRequest) return;
+                renderClusters(clusters);
+                return;
+            }
+
+            let inView;
+            if (isSharedView) {
+                // Shared lists are already in memory; just cut them to the view
+                const b = map.getBounds();
+                inView = restaurants.filter(r => b.contains([r.latitude, r.longitude]));
+            } else {
+                const query = searchInput ? searchInput.value.trim() : '';
+                if (query) params.append('search', query);
+                facetParams(params);
+                params.append('format', 'columnar');
+                const res = await authFetch(`/api/restaurants?${params.toString()}`);
+                if (!res.ok || requestId !== viewportRequest) return;
+                inView = fromColumns(await res.json());
+                if (requestId !== viewportRequest) return; // A newer pan superseded this one
+            }
+            clearClusters();
+            mapOnly = new Map(inView.map(r => [r.id, r]));
+            // Owner rows were already filtered by the server
+            syncMarkers(isSharedView ? inView.filter(matchesFacets) : inView);
+        } catch (e) {
+            if (!offline || isSharedView) {
+                console.error("Viewport load failed", e);
+                return;
+            }
+            // Offline: plain markers for the replica rows in view
+            const b = map.getBounds();
+            clearClusters();
+            syncMarkers(replicaList().filter(r => b.contains([r.latitude, r.longitude])));
+        }
+    }
+
+    // Rows from a ?format=columnar reply; cuisine and group ids are resolved
+    // against the lists already loaded for the filters
+    function fromColumns(data) {
+        const cuisineById = new Map(cuisines.map(c => [c.id, c]));
+        const groupById = new Map(groups.map(g => [g.id, { id: g.id, name: g.name, is_published: !!g.is_published }]));
+        const rows = new Array(data.count);
+        for (let i = 0; i < data.count; i++) {
+            rows[i] = {
+                id: data.id[i], name: data.name[i], address: data.address[i],
+                latitude: data.latitude[i], longitude: data.longitude[i], rating: data.rating[i],
+                price_range: data.price_range[i], personal_notes: data.personal_notes[i],
+                status: data.statuses[data.status[i]],
+                cuisines: data.cuisine_ids[i].map(id => cuisineById.get(id)).filter(Boolean),
+                groups: data.group_ids[i].map(id => groupById.get(id)).filter(Boolean),
+            };
+        }
+        return rows;
+    }
+
+    function clearClusters() {
+        clusterLayers.forEach(layer => map.removeLayer(layer));
+        clusterLayers = [];
+    }
+
+    function renderClusters(clusters) {
+        clearClusters();
+        const byId = new Map(restaurants.map(r => [r.id, r]));
+        const singles = [];
+        mapOnly = new Map();
+        clusters.forEach(c => {
+            // A cluster of one is drawn as the restaurant's own marker; the
+            // server sends its popup fields in case it isn't on a loaded page
+            const r = c.count === 1 ? byId.get(c.restaurant_id) || c.restaurant : null;
+            if (r) {
+                singles.push(r);
+                if (!byId.has(r.id)) mapOnly.set(r.id, r);
+                return;
+            }
+            const layer = L.marker([c.latitude, c.longitude], { icon: getClusterIcon(c) }).addTo(map);
+            layer.on('click', () => map.setView([c.latitude, c.longitude], Math.min(map.getZoom() + 2, MAX_CLUSTER_ZOOM + 1)));
+            clusterLayers.push(layer);
+        });
+        syncMarkers(singles);
+    }
+
+    function syncMarkers(list) {
+        // Keep markers that are still in view, add new ones, drop the rest
+        const keep = new Set(list.map(r => String(r.id)));
+        for (const id in markers) {
+            if (!keep.has(id) && id != selectedId) {
+                map.removeLayer(markers[id]);
+                delete markers[id];
+            }
+        }
+        list.forEach(r => {
+            if (!markers[r.id]) markers[r.id] = createMarker(r);
+        });
     }
 
     function updateMapStyle() {
@@ -352,20 +820,13 @@ document.addEventListener('DOMContentLoaded', () => {
 
     async function loadCuisines() {
         if (isSharedView) return;
-        const res = await authFetch('/api/cuisines');
-        if (res.ok) {
-            cuisines = await res.json();
-            renderCuisineOptions();
-        }
+        await syncReplica();
+        cuisines = replicaCuisines();
+        renderCuisineOptions();
     }
 
     function renderCuisineOptions() {
-        // Filter dropdown (single select)
-        let filterHtml = '<option value="">All Cuisines</option>';
-        cuisines.forEach(c => {
-            filterHtml += `<option value="${c.id}">${c.name}</option>`;
-        });
-        cuisineFilter.innerHTML = filterHtml;
+        renderCuisineFilter();
 
         // Form Checkboxes (Multi-select)
         const container = document.getElementById('form-cuisines-container');
@@ -383,24 +844,33 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    function renderCuisineFilter() {
+        // Filter dropdown (single select), with counts once the server has sent them
+        const counts = facetCounts ? new Map(facetCounts.cuisine_id.map(f => [f.value, f.count])) : null;
+        const selected = cuisineFilter.value;
+        let filterHtml = '<option value="">All Cuisines</option>';
+        cuisines.forEach(c => {
+            const countLabel = counts ? ` (${counts.get(c.id) || 0})` : '';
+            filterHtml += `<option value="${c.id}">${escapeHtml(c.name)}${countLabel}</option>`;
+        });
+        cuisineFilter.innerHTML = filterHtml;
+        cuisineFilter.value = selected;
+    }
+
 
     async function loadGroups() {
         if (isSharedView) return;
-        const res = await authFetch('/api/groups');
-        if (res.ok) {
-            groups = await res.json();
-            try {
-                renderGroupOptions();
-            } catch (e) {
-                console.error("renderGroupOptions failed:", e);
-            }
-            try {
-                renderManageGroups(); // Also render the manage list
-            } catch (e) {
-                console.error("renderManageGroups failed:", e);
-            }
-        } else {
-            console.error("Failed to load groups");
+        await syncReplica();
+        groups = replicaGroups();
+        try {
+            renderGroupOptions();
+        } catch (e) {
+            console.error("renderGroupOptions failed:", e);
+        }
+        try {
+            renderManageGroups(); // Also render the manage list
+        } catch (e) {
+            console.error("renderManageGroups failed:", e);
         }
     }
 
@@ -495,6 +965,9 @@ document.addEventListener('DOMContentLoaded', () => {
 
 
     async function loadRestaurants() {
+        // The owner's list is always fetched with the current search/sort/facets
+        if (!isSharedView) return filterRestaurants();
+
         listContainer.innerHTML = '<div class="text-center text-gray-500 mt-10">Loading...</div>';
         try {
             let url = '/api/restaurants';
@@ -616,10 +1089,14 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     }
 
+    function findRestaurant(id) {
+        return restaurants.find(x => x.id == id) || mapOnly.get(Number(id));
+    }
+
     function selectRestaurant(id, shouldFly = true) {
         if (selectedId && markers[selectedId]) {
             // Restore original color
-            const r = restaurants.find(x => x.id == selectedId);
+            const r = findRestaurant(selectedId);
             if (r) markers[selectedId].setIcon(getStatusIcon(r.status, false));
 
             const prevCard = document.querySelector(`[data-card-id="${selectedId}"]`);
@@ -629,8 +1106,13 @@ document.addEventListener('DOMContentLoaded', () => {
         if (!id) { selectedId = null; return; }
 
         selectedId = id;
+        if (!markers[id]) {
+            // Viewport mode may not have drawn this one yet
+            const r = findRestaurant(id);
+            if (r) markers[id] = createMarker(r);
+        }
         if (markers[id]) {
-            const r = restaurants.find(x => x.id == id);
+            const r = findRestaurant(id);
             if (r) markers[id].setIcon(getStatusIcon(r.status, true)); // green/active
 
             markers[id].openPopup();
@@ -646,49 +1128,117 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // --- Search & Filter Logic ---
     // Refactored to Server-Side
+    // Facet dropdowns as server query params (the owner's list is filtered in SQL)
+    function facetParams(params = new URLSearchParams()) {
+        if (cuisineFilter.value) params.append('cuisine_id', cuisineFilter.value);
+        if (ratingFilter.value) params.append('min_rating', ratingFilter.value);
+        if (priceFilter.value) params.append('price_range', priceFilter.value);
+        if (statusFilter && statusFilter.value) params.append('status', statusFilter.value);
+        if (groupFilter && groupFilter.value) params.append('group_id', groupFilter.value);
+        return params;
+    }
+
     async function filterRestaurants() {
         const query = searchInput.value.trim();
         const sortVal = sortSelect.value;
-        // Collect other filters if we were doing full server-side filtering
-        // For now, let's mix: Backend Sort/Search + Client Side Facets (Cuisine/Rating/Price/Status)
-        // Why? Because Search/Sort are the requested backend features. Facets are already working well client-side.
-        // BUT if we search "Pizza", we only get "Pizza" restaurants returned. Client-side filtering then applies to that subset.
+
+        // Keeps the offline copy current; the list itself comes from the server
+        if (!isSharedView) syncReplica();
 
         let url = '/api/restaurants';
         if (isSharedView) {
-            // Shared view doesn't support params yet in this impl, keep client side?
-            // Let's skip backend params for shared view for now or update backend share endpoint too.
+            // Shared lists are small and fetched whole; facets stay client-side there
             url = `/api/share/${sharedToken}`;
+        } else if (sortVal === 'nearby' && userLocation) {
+            // Server-side k-nearest search; facets narrow the candidates before ranking
+            const params = facetParams(new URLSearchParams({ lat: userLocation.lat, lon: userLocation.lng, k: 100 }));
+            url += `/nearby?${params.toString()}`;
         } else {
-            const params = new URLSearchParams();
+            const params = facetParams();
             if (query) params.append('search', query);
-            if (sortVal) params.append('sort_by', sortVal);
+            if (sortVal && sortVal !== 'nearby') params.append('sort_by', sortVal);
+            // Relevance ranking can't be paged by keyset, so it comes back whole
+            if (sortVal !== 'relevance') params.append('limit', PAGE_SIZE);
+            listQuery = params.toString();
+            params.append('with_facets', 'true');
             url += `?${params.toString()}`;
         }
 
+        nextCursor = null;
+        localRest = [];
+        listObserver.disconnect();
         listContainer.innerHTML = '<div class="text-center text-gray-500 mt-10">Loading...</div>';
-        const res = await authFetch(url);
+        let res;
+        try {
+            res = await authFetch(url);
+        } catch (e) {
+            if (isSharedView) throw e;
+            // Offline: the replica answers, filtered and paged on this device
+            console.warn("List unavailable, using the local replica", e);
+            offline = true;
+            renderOfflineList();
+            return;
+        }
         if (res.ok) {
-            restaurants = await res.json();
-            // Now apply client-side facets
-            applyClientSideFacets();
+            const data = await res.json();
+            if (isSharedView) {
+                restaurants = data;
+                applyClientSideFacets();
+                return;
+            }
+            if (Array.isArray(data)) {
+                restaurants = data;
+            } else {
+                nextCursor = res.headers.get('X-Next-Cursor');
+                restaurants = data.restaurants;
+                renderFacetCounts(data.facets);
+            }
+            renderRestaurants(restaurants);
         }
     }
 
+    function onFacetChange() {
+        // Only the owner's own list has server-side facets
+        if (currentUser && !isSharedView) filterRestaurants();
+        else applyClientSideFacets();
+    }
+
+    // Append "(n)" to each dropdown option from the server's facet counts
+    function renderFacetCounts(facets) {
+        facetCounts = facets;
+        const countsBy = (list) => new Map((list || []).map(f => [String(f.value), f.count]));
+        const label = (opt, n) => {
+            if (!opt.dataset.label) opt.dataset.label = opt.textContent;
+            opt.textContent = opt.value === '' ? opt.dataset.label : `${opt.dataset.label} (${n || 0})`;
+        };
+
+        const statusCounts = countsBy(facets.status);
+        if (statusFilter) Array.from(statusFilter.options).forEach(opt => label(opt, statusCounts.get(opt.value)));
+        const priceCounts = countsBy(facets.price_range);
+        Array.from(priceFilter.options).forEach(opt => label(opt, priceCounts.get(opt.value)));
+        // Rating options mean "N or more stars", so sum the exact-rating counts
+        Array.from(ratingFilter.options).forEach(opt => {
+            const n = (facets.rating || []).filter(f => f.value !== null && f.value >= parseInt(opt.value)).reduce((sum, f) => sum + f.count, 0);
+            label(opt, n);
+        });
+        const groupCounts = countsBy(facets.group_id);
+        if (groupFilter) Array.from(groupFilter.options).forEach(opt => label(opt, groupCounts.get(opt.value)));
+        renderCuisineFilter();
+    }
+
+    function matchesFacets(r) {
+        const matchesCuisine = !cuisineFilter.value || (r.cuisines && r.cuisines.some(c => c.id == cuisineFilter.value));
+        const matchesRating = !ratingFilter.value || (r.rating >= ratingFilter.value);
+        const matchesPrice = !priceFilter.value || (r.price_range == priceFilter.value);
+        const matchesStatus = !statusFilter || !statusFilter.value || (r.status == statusFilter.value);
+        const matchesGroup = !groupFilter || !groupFilter.value || (r.groups && r.groups.some(g => g.id == groupFilter.value));
+
+        return matchesCuisine && matchesRating && matchesPrice && matchesStatus && matchesGroup;
+    }
+
     function applyClientSideFacets() {
         // This is the old filterRestaurants logic, applied to the (potentially) filtered dataset
-        const filtered = restaurants.filter(r => {
-            // Note: Name/Address search is now backend, but we keep it here just in case? 
-            // actually if we duplicate it, it's fine.
-            const matchesCuisine = !cuisineFilter.value || (r.cuisines && r.cuisines.some(c => c.id == cuisineFilter.value));
-            const matchesRating = !ratingFilter.value || (r.rating >= ratingFilter.value);
-            const matchesPrice = !priceFilter.value || (r.price_range == priceFilter.value);
-            const matchesStatus = !statusFilter || !statusFilter.value || (r.status == statusFilter.value);
-            const matchesGroup = !groupFilter || !groupFilter.value || (r.groups && r.groups.some(g => g.id == groupFilter.value));
-
-            return matchesCuisine && matchesRating && matchesPrice && matchesStatus && matchesGroup;
-        });
-        renderRestaurants(filtered);
+        renderRestaurants(restaurants.filter(matchesFacets));
     }
 
 
@@ -728,6 +1278,22 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     }
 
+    function getClusterIcon(c) {
+        // Colour by the dominant status, same palette as the pins
+        const top = Object.entries(c.statuses).sort((a, b) => b[1] - a[1])[0];
+        let color = 'bg-blue-500';
+        if (top && top[0] === 'Favorite') color = 'bg-yellow-500';
+        else if (top && top[0] === 'Visited') color = 'bg-violet-500';
+        const size = c.count < 10 ? 32 : c.count < 100 ? 40 : 48;
+        const breakdown = Object.entries(c.statuses).map(([s, n]) => `${s}: ${n}`).join(', ');
+        return L.divIcon({
+            className: 'bg-transparent border-0',
+            html: `<div class="${color} text-white text-sm font-bold rounded-full flex items-center justify-center shadow-md border-2 border-white" style="width: ${size}px; height: ${size}px;" title="${escapeHtml(breakdown)}">${c.count}</div>`,
+            iconSize: [size, size],
+            iconAnchor: [size / 2, size / 2]
+        });
+    }
+
     function renderRestaurants(listToRender = null) {
         listContainer.innerHTML = '';
         for (const id in markers) map.removeLayer(markers[id]);
@@ -746,84 +1312,140 @@ document.addEventListener('DOMContentLoaded', () => {
 
         const bounds = [];
         data.forEach(r => {
-            // Join cuisine names
-            const cuisineNames = r.cuisines ? r.cuisines.map(c => c.name).join(', ') : '';
+            listContainer.appendChild(renderCard(r));
 
-            const card = document.createElement('div');
-            card.dataset.cardId = r.id;
-            card.className = "bg-gray-50 dark:bg-gray-800 p-4 pb-12 relative rounded-lg shadow-sm border border-gray-100 dark:border-gray-700 hover:shadow-md transition cursor-pointer group";
-            card.innerHTML = `
-                <div class="flex justify-between items-start">
-                    <h3 class="font-bold text-lg text-gray-800 dark:text-gray-100 group-hover:text-blue-600 dark:group-hover:text-blue-400 transition">${escapeHtml(r.name)}</h3>
-                    <span class="text-xs font-semibold px-2 py-1 rounded ${getStatusColor(r.status)}">${escapeHtml(r.status)}</span>
-                </div>
-                <div class="text-sm text-gray-500 dark:text-gray-400 mt-1">${escapeHtml(r.address)}</div>
-                <div class="flex items-center gap-3 mt-3 text-sm">
-                    ${r.rating ? `<span class="text-yellow-500"><i class="fa-solid fa-star"></i> ${r.rating}</span>` : `<span class="text-gray-400 text-xs italic">Unrated</span>`}
-                    <span class="text-green-600 dark:text-green-400 font-medium">${escapeHtml(r.price_range)}</span>
-                    <span class="text-gray-400 dark:text-gray-500" title="${escapeHtml(cuisineNames)}">• ${escapeHtml(cuisineNames)}</span>
-                    ${r.groups && r.groups.length > 0 ? `<span class="bg-blue-100 dark:bg-blue-900 text-blue-800 dark:text-blue-100 text-xs px-1.5 py-0.5 rounded ml-1" title="${r.groups.map(g => escapeHtml(g.name)).join(', ')}"><i class="fa-solid fa-list-ul"></i> ${r.groups.length}</span>` : ''}
-                    ${(() => {
-                    if (userLocation) {
-                        const d = getDistanceMiles(userLocation.lat, userLocation.lng, r.latitude, r.longitude);
-                        const dStr = d < 0.1 ? `${(d * 5280).toFixed(0)}ft` : `${d.toFixed(1)}mi`;
-                        return `<span class="text-xs text-blue-500 font-medium ml-2">• ${dStr}</span>`;
-                    }
-                    return '';
-                })()}
-                </div>
-                ${r.personal_notes ? `<div class="mt-2 text-xs text-gray-400 italic border-l-2 border-gray-300 pl-2">"${escapeHtml(r.personal_notes)}"</div>` : ''}
-                
-                <div class="absolute bottom-3 right-3 flex gap-2 opacity-100 md:opacity-0 group-hover:opacity-100 transition-opacity">
-                    ${isSharedView ? '' : `
-                        <button class="edit-btn text-xs text-blue-500 hover:text-blue-700 bg-white dark:bg-gray-900 border border-blue-200 dark:border-blue-900 px-2 py-1 rounded shadow-sm" data-id="${r.id}">
-                            <i class="fa-solid fa-edit"></i>
-                        </button>
-                        <button class="delete-btn text-xs text-red-500 hover:text-red-700 bg-white dark:bg-gray-900 border border-red-200 dark:border-red-900 px-2 py-1 rounded shadow-sm" data-id="${r.id}">
-                            <i class="fa-solid fa-trash"></i>
-                        </button>
-                    `}
-                </div>
-            `;
+            // In viewport mode markers are drawn by loadViewportMarkers instead
+            if (!viewportMode) markers[r.id] = createMarker(r);
+            bounds.push([r.latitude, r.longitude]);
+        });
+        if (bounds.length > 0) map.fitBounds(bounds, { padding: [50, 50] });
+        observeListEnd();
+        // fitBounds only fires moveend if the view actually changes
+        scheduleViewportLoad();
+    }
 
-            card.addEventListener('mouseenter', () => {
-                if (markers[r.id] && selectedId !== r.id) {
-                    const pin = markers[r.id].getElement().querySelector('.marker-pin');
-                    if (pin) pin.classList.add('marker-bounce');
+    // Later pages are appended below the cards already shown
+    function appendRestaurants(page) {
+        page.forEach(r => {
+            listContainer.insertBefore(renderCard(r), listSentinel);
+            if (!viewportMode) markers[r.id] = createMarker(r);
+        });
+        observeListEnd();
+    }
+
+    function observeListEnd() {
+        listSentinel.remove();
+        if (!nextCursor) return;
+        listContainer.appendChild(listSentinel);
+        listObserver.observe(listSentinel);
+    }
+
+    async function loadMoreRestaurants() {
+        if (!nextCursor || loadingMore) return;
+        if (nextCursor === LOCAL_PAGES) {
+            const page = localRest.splice(0, PAGE_SIZE);
+            nextCursor = localRest.length ? LOCAL_PAGES : null;
+            restaurants = restaurants.concat(page);
+            appendRestaurants(page);
+            return;
+        }
+        loadingMore = true;
+        try {
+            const query = listQuery;
+            const params = new URLSearchParams(query);
+            params.append('cursor', nextCursor);
+            const res = await authFetch(`/api/restaurants?${params.toString()}`);
+            if (!res.ok) return;
+            const page = await res.json();
+            // The filters changed while this page was in flight
+            if (query !== listQuery || !nextCursor) return;
+            nextCursor = res.headers.get('X-Next-Cursor');
+            restaurants = restaurants.concat(page);
+            appendRestaurants(page);
+        } finally {
+            loadingMore = false;
+        }
+    }
+
+    function renderCard(r) {
+        // Join cuisine names
+        const cuisineNames = r.cuisines ? r.cuisines.map(c => c.name).join(', ') : '';
+
+        const card = document.createElement('div');
+        card.dataset.cardId = r.id;
+        card.className = "bg-gray-50 dark:bg-gray-800 p-4 pb-12 relative rounded-lg shadow-sm border border-gray-100 dark:border-gray-700 hover:shadow-md transition cursor-pointer group";
+        card.innerHTML = `
+            <div class="flex justify-between items-start">
+                <h3 class="font-bold text-lg text-gray-800 dark:text-gray-100 group-hover:text-blue-600 dark:group-hover:text-blue-400 transition">${escapeHtml(r.name)}</h3>
+                <span class="text-xs font-semibold px-2 py-1 rounded ${getStatusColor(r.status)}">${escapeHtml(r.status)}</span>
+            </div>
+            <div class="text-sm text-gray-500 dark:text-gray-400 mt-1">${escapeHtml(r.address)}</div>
+            ${r.snippet ? `<div class="text-xs text-gray-600 dark:text-gray-300 mt-1">${highlightSnippet(r.snippet)}</div>` : ''}
+            <div class="flex items-center gap-3 mt-3 text-sm">
+                ${r.rating ? `<span class="text-yellow-500"><i class="fa-solid fa-star"></i> ${r.rating}</span>` : `<span class="text-gray-400 text-xs italic">Unrated</span>`}
+                <span class="text-green-600 dark:text-green-400 font-medium">${escapeHtml(r.price_range)}</span>
+                <span class="text-gray-400 dark:text-gray-500" title="${escapeHtml(cuisineNames)}">• ${escapeHtml(cuisineNames)}</span>
+                ${r.groups && r.groups.length > 0 ? `<span class="bg-blue-100 dark:bg-blue-900 text-blue-800 dark:text-blue-100 text-xs px-1.5 py-0.5 rounded ml-1" title="${r.groups.map(g => escapeHtml(g.name)).join(', ')}"><i class="fa-solid fa-list-ul"></i> ${r.groups.length}</span>` : ''}
+                ${(() => {
+                if (userLocation) {
+                    const d = getDistanceMiles(userLocation.lat, userLocation.lng, r.latitude, r.longitude);
+                    const dStr = d < 0.1 ? `${(d * 5280).toFixed(0)}ft` : `${d.toFixed(1)}mi`;
+                    return `<span class="text-xs text-blue-500 font-medium ml-2">• ${dStr}</span>`;
                 }
-            });
-            card.addEventListener('mouseleave', () => {
-                if (markers[r.id]) {
-                    const pin = markers[r.id].getElement().querySelector('.marker-pin');
-                    if (pin) pin.classList.remove('marker-bounce');
+                return '';
+            })()}
+            </div>
+            ${r.personal_notes ? `<div class="mt-2 text-xs text-gray-400 italic border-l-2 border-gray-300 pl-2">"${escapeHtml(r.personal_notes)}"</div>` : ''}
+            
+            <div class="absolute bottom-3 right-3 flex gap-2 opacity-100 md:opacity-0 group-hover:opacity-100 transition-opacity">
+                ${isSharedView ? '' : `
+                    <button class="edit-btn text-xs text-blue-500 hover:text-blue-700 bg-white dark:bg-gray-900 border border-blue-200 dark:border-blue-900 px-2 py-1 rounded shadow-sm" data-id="${r.id}">
+                        <i class="fa-solid fa-edit"></i>
+                    </button>
+                    <button class="delete-btn text-xs text-red-500 hover:text-red-700 bg-white dark:bg-gray-900 border border-red-200 dark:border-red-900 px-2 py-1 rounded shadow-sm" data-id="${r.id}">
+                        <i class="fa-solid fa-trash"></i>
+                    </button>
+                `}
+            </div>
+        `;
+
+        card.addEventListener('mouseenter', () => {
+            if (markers[r.id] && selectedId !== r.id) {
+                const pin = markers[r.id].getElement().querySelector('.marker-pin');
+                if (pin) pin.classList.add('marker-bounce');
+            }
+        });
+        card.addEventListener('mouseleave', () => {
+            if (markers[r.id]) {
+                const pin = markers[r.id].getElement().querySelector('.marker-pin');
+                if (pin) pin.classList.remove('marker-bounce');
+            }
+        });
+        card.addEventListener('click', () => {
+            if (window.innerWidth < 768) activateTab('map');
+            selectRestaurant(r.id, true);
+        });
+        if (!isSharedView) {
+            card.querySelector('.edit-btn').addEventListener('click', (e) => { e.stopPropagation(); openModal(r); });
+            card.querySelector('.delete-btn').addEventListener('click', async (e) => {
+                e.stopPropagation();
+                if (confirm('Are you sure you want to delete this restaurant?')) {
+                    const res = await authFetch(`/api/restaurants/${r.id}`, { method: 'DELETE' });
+                    if (res.ok) loadRestaurants();
                 }
             });
-            card.addEventListener('click', () => {
-                if (window.innerWidth < 768) activateTab('map');
-                selectRestaurant(r.id, true);
-            });
-            if (!isSharedView) {
-                card.querySelector('.edit-btn').addEventListener('click', (e) => { e.stopPropagation(); openModal(r); });
-                card.querySelector('.delete-btn').addEventListener('click', async (e) => {
-                    e.stopPropagation();
-                    if (confirm('Are you sure you want to delete this restaurant?')) {
-                        const res = await authFetch(`/api/restaurants/${r.id}`, { method: 'DELETE' });
-                        if (res.ok) loadRestaurants();
-                    }
-                });
-            }
+        }
 
-            listContainer.appendChild(card);
+        return card;
+    }
 
-            // Use correct icon based on status
-            const icon = getStatusIcon(r.status, false);
-            const marker = L.marker([r.latitude, r.longitude], { icon: icon }).addTo(map).bindPopup(`<b>${escapeHtml(r.name)}</b><br><a href="https://www.google.com/maps/search/?api=1&query=${encodeURIComponent(r.name + ", " + r.address)}" target="_blank" class="text-blue-500 hover:underline">${escapeHtml(r.address)}</a>`);
-            marker.on('click', () => selectRestaurant(r.id, false));
-            marker.on('popupclose', () => { if (selectedId === r.id) selectRestaurant(null); });
-            markers[r.id] = marker;
-            bounds.push([r.latitude, r.longitude]);
-        });
-        if (bounds.length > 0) map.fitBounds(bounds, { padding: [50, 50] });
+    function createMarker(r) {
+        // Use correct icon based on status
+        const icon = getStatusIcon(r.status, selectedId == r.id);
+        const marker = L.marker([r.latitude, r.longitude], { icon: icon }).addTo(map).bindPopup(`<b>${escapeHtml(r.name)}</b><br><a href="https://www.google.com/maps/search/?api=1&query=${encodeURIComponent(r.name + ", " + r.address)}" target="_blank" class="text-blue-500 hover:underline">${escapeHtml(r.address)}</a>`);
+        marker.on('click', () => selectRestaurant(r.id, false));
+        marker.on('popupclose', () => { if (selectedId === r.id) selectRestaurant(null); });
+        return marker;
     }
 
     function getStatusColor(status) {
@@ -1013,11 +1635,11 @@ document.addEventListener('DOMContentLoaded', () => {
     // However, if we want to support "Search for Pizza" AND "Filter by $$$", we need to know if we should refetch.
     // Since 'filterRestaurants' fetches based on search/sort, and 'restaurants' holds that result,
     // we just need to re-run applyClientSideFacets when facets change.
-    cuisineFilter.addEventListener('change', applyClientSideFacets);
-    ratingFilter.addEventListener('change', applyClientSideFacets);
-    priceFilter.addEventListener('change', applyClientSideFacets);
-    if (statusFilter) statusFilter.addEventListener('change', applyClientSideFacets);
-    if (groupFilter) groupFilter.addEventListener('change', applyClientSideFacets);
+    cuisineFilter.addEventListener('change', onFacetChange);
+    ratingFilter.addEventListener('change', onFacetChange);
+    priceFilter.addEventListener('change', onFacetChange);
+    if (statusFilter) statusFilter.addEventListener('change', onFacetChange);
+    if (groupFilter) groupFilter.addEventListener('change', onFacetChange);
 
     themeToggle.addEventListener('click', () => {
         body.classList.toggle('dark');
@@ -1144,22 +1766,22 @@ document.addEventListener('DOMContentLoaded', () => {
         const minPrice = document.getElementById('choose-price').value;
         const minRating = document.getElementById('choose-rating').value;
         const selectedStatuses = Array.from(document.querySelectorAll('.choose-status:checked')).map(cb => cb.value);
+        const weight = document.getElementById('choose-weight').value;
         if (selectedCuisines.length === 0) { alert("Select a cuisine!"); return; }
+        if (selectedStatuses.length === 0) { alert("Select a status!"); return; }
+        if (weight === 'distance' && !userLocation) { alert("Location not available yet!"); return; }
         btnChooseGo.innerHTML = '<i class="fa-solid fa-spinner fa-spin"></i> Picking...';
         try {
-            const res = await authFetch('/api/restaurants');
-            let all = await res.json();
-            let filtered = all.filter(r => {
-                if (!r.cuisines.some(c => selectedCuisines.includes(c.id))) return false; // Multi-cuisine check
-                if (!selectedStatuses.includes(r.status)) return false;
-                if (minPrice && r.price_range !== minPrice) return false;
-                if (minRating && r.rating < parseInt(minRating)) return false;
-                return true;
-            });
-            for (let i = filtered.length - 1; i > 0; i--) {
-                const j = Math.floor(Math.random() * (i + 1));[filtered[i], filtered[j]] = [filtered[j], filtered[i]];
-            }
-            const picks = filtered.slice(0, 5);
+            // The server filters and draws the picks; only those 5 rows come back
+            const params = new URLSearchParams({ n: 5, weight });
+            selectedCuisines.forEach(id => params.append('cuisine_id', id));
+            selectedStatuses.forEach(st => params.append('status', st));
+            if (minPrice) params.append('price_range', minPrice);
+            if (minRating) params.append('min_rating', minRating);
+            if (weight === 'distance') { params.append('lat', userLocation.lat); params.append('lon', userLocation.lng); }
+            const res = await authFetch(`/api/restaurants/choose?${params.toString()}`);
+            if (!res.ok) throw new Error(res.status);
+            const picks = await res.json();
             renderChooseResults(picks);
             chooseStep1.classList.add('hidden'); chooseStep2.classList.remove('hidden');
         } catch (e) { alert("Error fetching"); } finally { btnChooseGo.innerHTML = '<i class="fa-solid fa-dice"></i> Find Me Food!'; }
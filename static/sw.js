@@ -1,4 +1,5 @@
-const CACHE_NAME = 'foodmapper-v1';
+const CACHE_NAME = 'foodmapper-v7'; // Bump when the app shell changes; `python assets.py` names it after the build
+const API_CACHE_NAME = 'foodmapper-api-v1'; // Last ETagged copy of each API GET
 const ASSETS_TO_CACHE = [
     '/',
     '/static/index.html',
@@ -12,9 +13,21 @@ const ASSETS_TO_CACHE = [
 ];
 
 self.addEventListener('install', (event) => {
+    // A new build's worker takes over at once; the old build's cache is
+    // dropped on activate, so there is nothing for it to keep serving
     event.waitUntil(
         caches.open(CACHE_NAME)
             .then((cache) => cache.addAll(ASSETS_TO_CACHE))
+            .then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener('activate', (event) => {
+    // Drop caches left behind by older versions of this worker
+    event.waitUntil(
+        caches.keys().then((names) => Promise.all(
+            names.filter((name) => name !== CACHE_NAME && name !== API_CACHE_NAME).map((name) => caches.delete(name))
+        )).then(() => self.clients.claim())
     );
 });
 
@@ -24,7 +37,10 @@ self.addEventListener('fetch', (event) => {
     const url = new URL(event.request.url);
 
     if (url.pathname.startsWith('/api/')) {
-        // API: Network only (or Network First) - avoiding cache for now to prevent stale data issues
+        // Live update streams never end; leave them to the browser
+        if (url.pathname.endsWith('/events')) return;
+        // API GETs revalidate against the stored copy; everything else is network only
+        if (event.request.method === 'GET') event.respondWith(revalidate(event.request));
         return;
     }
 
@@ -35,3 +51,30 @@ self.addEventListener('fetch', (event) => {
             })
     );
 });
+
+// Conditional GET: send the stored ETag, serve the stored copy on 304
+// (or when offline), store fresh 200s. Requests the page already made
+// conditional are passed through so its own 304 handling sees them.
+async function revalidate(request) {
+    if (request.headers.has('If-None-Match')) return fetch(request);
+
+    const cache = await caches.open(API_CACHE_NAME);
+    const cached = await cache.match(request);
+    let response;
+    try {
+        const headers = new Headers(request.headers);
+        if (cached && cached.headers.get('ETag')) headers.set('If-None-Match', cached.headers.get('ETag'));
+        response = await fetch(request, { headers });
+    } catch (err) {
+        if (cached) return cached;
+        throw err;
+    }
+
+    if (response.status === 304 && cached) return cached;
+    if (response.ok && response.headers.get('ETag')) {
+        await cache.put(request, response.clone());
+    } else if (response.status === 401) {
+        await cache.delete(request);
+    }
+    return response;
+}
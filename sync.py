@@ -0,0 +1,189 @@
+"""Change tracking for /api/sync, the offline replica's delta feed.
+
+Every transaction that inserts, changes or deletes restaurants, cuisines
+or groups takes the next number from one global counter (the ("sync", 0)
+data version) and stamps it on those rows as change_seq; deleted rows
+leave a Tombstone with the same number. Until commit the rows carry
+PENDING; the number is taken in a before_commit hook, just before the
+commit, and written over PENDING by id. The counter row stays locked from
+there until commit, so numbers become visible in order and a client
+holding cursor N has seen every commit up to N, while writers only queue
+for the length of a commit rather than a whole transaction. ORM writes
+are stamped by a before_flush hook; Core writes (bulk import) call stamp()
+and track() themselves.
+
+Deleting a cuisine or group does not restamp the restaurants linked to
+it: replicas drop the id from their restaurants when the tombstone
+arrives.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, event, func, select, text, update
+from sqlalchemy.orm import Session
+
+import models
+import versions
+
+SYNC = ("sync", 0)
+# Highest change_seq of any pruned tombstone; older cursors must start over
+HORIZON = ("sync_horizon", 0)
+TOMBSTONE_DAYS = 90
+
+TRACKED = {models.Restaurant: "restaurants", models.Cuisine: "cuisines", models.Group: "groups"}
+PENDING = -1  # change_seq of rows written by a transaction that has not committed yet
+
+NEXT_SEQ_SQL = text("""
+    INSERT INTO data_versions (scope, scope_id, version) VALUES (:scope, :scope_id, 1)
+    ON CONFLICT (scope, scope_id) DO UPDATE SET version = data_versions.version + 1
+    RETURNING version
+""")
+
+RAISE_HORIZON_SQL = text("""
+    INSERT INTO data_versions (scope, scope_id, version) VALUES (:scope, :scope_id, :version)
+    ON CONFLICT (scope, scope_id) DO UPDATE
+    SET version = CASE WHEN excluded.version > data_versions.version THEN excluded.version ELSE data_versions.version END
+""")
+
+
+def stamp(db):
+    """(PENDING, updated_at) for this transaction's changes; pass the ids written to track()."""
+    current = db.info.get("sync_stamp")
+    if current is None:
+        current = db.info["sync_stamp"] = (PENDING, datetime.utcnow())
+    return current
+
+
+def track(db, model, ids):
+    """Give rows of `model` written with stamp() this transaction's change_seq at commit."""
+    db.info.setdefault("sync_pending", {}).setdefault(model, set()).update(ids)
+
+
+@event.listens_for(Session, "before_flush")
+def _stamp_changes(session, flush_context, instances):
+    changed = [
+        obj for obj in (*session.new, *session.dirty)
+        if type(obj) in TRACKED and (obj in session.new or session.is_modified(obj))
+    ]
+    deleted = [obj for obj in session.deleted if type(obj) in TRACKED]
+    if not changed and not deleted:
+        return
+
+    seq, now = stamp(session)
+    for obj in changed:
+        obj.change_seq = seq
+        obj.updated_at = now
+    tombstones = [
+        models.Tombstone(
+            kind=TRACKED[type(obj)], object_id=obj.id, owner_id=getattr(obj, "owner_id", None),
+            change_seq=seq, deleted_at=now,
+        )
+        for obj in deleted
+    ]
+    session.add_all(tombstones)
+    # New rows have no id until the flush; after_flush tracks them
+    session.info.setdefault("sync_flushing", []).extend(changed + tombstones)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flushed(session, flush_context):
+    for obj in session.info.pop("sync_flushing", ()):
+        track(session, type(obj), [obj.id])
+
+
+@event.listens_for(Session, "before_commit")
+def _allocate_seq(session):
+    session.flush()  # The commit's own flush runs after this hook
+    pending = session.info.pop("sync_pending", None)
+    if not pending:
+        return
+    seq = session.execute(NEXT_SEQ_SQL, {"scope": SYNC[0], "scope_id": SYNC[1]}).scalar()
+    for model, ids in pending.items():
+        session.execute(
+            update(model).where(model.id.in_(ids)).values(change_seq=seq).execution_options(synchronize_session=False)
+        )
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _clear_stamp(session, transaction):
+    if transaction.parent is None:
+        for key in ("sync_stamp", "sync_pending", "sync_flushing"):
+            session.info.pop(key, None)
+
+
+def prune_tombstones(engine):
+    """Drop tombstones older than TOMBSTONE_DAYS; returns how many."""
+    T = models.Tombstone
+    cutoff = datetime.utcnow() - timedelta(days=TOMBSTONE_DAYS)
+    with engine.begin() as conn:
+        newest = conn.execute(select(func.max(T.change_seq)).where(T.deleted_at < cutoff)).scalar()
+        if newest is None:
+            return 0
+        pruned = conn.execute(delete(T).where(T.change_seq <= newest)).rowcount
+        conn.execute(RAISE_HORIZON_SQL, {"scope": HORIZON[0], "scope_id": HORIZON[1], "version": newest})
+    print(f"Sync: pruned {pruned} tombstones up to change {newest}.")
+    return pruned
+
+
+def _restaurant_rows(db, owner_id, after):
+    R = models.Restaurant
+    where = (R.owner_id == owner_id, R.change_seq > after)
+    rows = {
+        r.id: {
+            "id": r.id, "name": r.name, "address": r.address, "latitude": r.latitude, "longitude": r.longitude,
+            "rating": r.rating, "price_range": r.price_range, "personal_notes": r.personal_notes, "status": r.status,
+            "cuisine_ids": [], "group_ids": [], "updated_at": r.updated_at.isoformat() if r.updated_at else None,
+        }
+        for r in db.execute(
+            select(R.id, R.name, R.address, R.latitude, R.longitude, R.rating, R.price_range, R.personal_notes,
+                   R.status, R.updated_at)
+            .where(*where)
+            .order_by(R.id)
+        )
+    }
+    if not rows:
+        return []
+    # Links as ids only; the replica joins them to its cuisines and groups
+    for link, key, column in ((models.restaurant_cuisines, "cuisine_ids", "cuisine_id"),
+                              (models.restaurant_groups, "group_ids", "group_id")):
+        for restaurant_id, linked_id in db.execute(
+            select(link.c.restaurant_id, link.c[column]).where(link.c.restaurant_id.in_(select(R.id).where(*where)))
+        ):
+            rows[restaurant_id][key].append(linked_id)
+    return list(rows.values())
+
+
+def changes(db, owner_id, since=None):
+    """Everything `owner_id`'s replica needs to move from cursor `since` to now.
+
+    With no cursor, one older than the tombstone horizon, or one from a
+    different database (ahead of ours), the reply is a full copy with
+    reset=True and the replica starts over.
+    """
+    # Read the counter before the rows: a commit landing in between is
+    # sent again next time (applying a row twice is harmless), never lost
+    cursor, horizon = versions.current(db, SYNC, HORIZON)
+    reset = since is None or since < horizon or since > cursor
+    deleted = {kind: [] for kind in TRACKED.values()}
+    payload = {"cursor": cursor, "reset": reset, "restaurants": [], "cuisines": [], "groups": [], "deleted": deleted}
+    if not reset and since == cursor:
+        return payload
+
+    after = -1 if reset else since
+    C, G, T = models.Cuisine, models.Group, models.Tombstone
+    payload["restaurants"] = _restaurant_rows(db, owner_id, after)
+    payload["cuisines"] = [
+        {"id": c.id, "name": c.name}
+        for c in db.execute(select(C.id, C.name).where(C.change_seq > after).order_by(C.id))
+    ]
+    payload["groups"] = [
+        {"id": g.id, "name": g.name, "is_published": bool(g.is_published)}
+        for g in db.execute(select(G.id, G.name, G.is_published).where(G.owner_id == owner_id, G.change_seq > after).order_by(G.id))
+    ]
+    if not reset:
+        for kind, object_id in db.execute(
+            select(T.kind, T.object_id)
+            .where(T.change_seq > after, (T.owner_id == owner_id) | T.owner_id.is_(None))
+            .order_by(T.change_seq)
+        ):
+            deleted[kind].append(object_id)
+    return payload
@@ -0,0 +1,51 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# database.py reads these at import, so set them before anything imports main.
+# TEST_DATABASE_URL runs the tests on another backend (e.g. Postgres); that
+# database is emptied first, so never point it at one you want to keep.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+os.environ["DATABASE_URL"] = TEST_DATABASE_URL or f"sqlite:///{tempfile.mkdtemp(prefix='foodmapper-tests-')}/test.db"
+os.environ.setdefault("SECRET_KEY", "test")
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # main.py serves static/ relative to the working directory
+
+if TEST_DATABASE_URL:
+    from sqlalchemy import create_engine, text
+
+    _engine = create_engine(TEST_DATABASE_URL)
+    with _engine.begin() as conn:
+        conn.execute(text("DROP SCHEMA public CASCADE"))
+        conn.execute(text("CREATE SCHEMA public"))
+    _engine.dispose()
+
+import main  # noqa: E402
+import models  # noqa: E402
+from database import SessionLocal  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def app_client():
+    # Entering the client runs the lifespan: migrations and the admin user
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture(scope="session")
+def login(app_client):
+    """Create a user and return a client logged in as them."""
+    def login_as(username, password="test-password"):
+        with SessionLocal() as db:
+            if not db.query(models.User).filter(models.User.username == username).first():
+                db.add(models.User(username=username, hashed_password=main.get_password_hash(password)))
+                db.commit()
+        client = TestClient(main.app)
+        response = client.post("/api/token", data={"username": username, "password": password})
+        assert response.status_code == 200, response.text
+        return client
+    return login_as
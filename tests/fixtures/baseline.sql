@@ -0,0 +1,49 @@
+-- The schema (and a little data) of a database from before migrations.py:
+-- groups without is_published, cuisines only in restaurants.cuisine_id.
+CREATE TABLE users (
+    id INTEGER NOT NULL PRIMARY KEY,
+    username VARCHAR UNIQUE,
+    email VARCHAR UNIQUE,
+    hashed_password VARCHAR,
+    oauth_provider VARCHAR
+);
+CREATE TABLE cuisines (
+    id INTEGER NOT NULL PRIMARY KEY,
+    name VARCHAR UNIQUE
+);
+CREATE TABLE groups (
+    id INTEGER NOT NULL PRIMARY KEY,
+    name VARCHAR,
+    share_token VARCHAR UNIQUE,
+    owner_id INTEGER REFERENCES users (id)
+);
+CREATE TABLE restaurants (
+    id INTEGER NOT NULL PRIMARY KEY,
+    name VARCHAR,
+    address VARCHAR,
+    latitude FLOAT,
+    longitude FLOAT,
+    rating INTEGER,
+    price_range VARCHAR,
+    cuisine_id INTEGER REFERENCES cuisines (id),
+    personal_notes TEXT,
+    status VARCHAR,
+    owner_id INTEGER REFERENCES users (id)
+);
+CREATE TABLE restaurant_cuisines (
+    restaurant_id INTEGER REFERENCES restaurants (id),
+    cuisine_id INTEGER REFERENCES cuisines (id)
+);
+CREATE TABLE restaurant_groups (
+    restaurant_id INTEGER REFERENCES restaurants (id),
+    group_id INTEGER REFERENCES groups (id)
+);
+
+INSERT INTO users (id, username, hashed_password) VALUES (1, 'baseline-user', NULL);
+INSERT INTO cuisines (id, name) VALUES (1, 'Thai'), (2, 'Pizza');
+INSERT INTO groups (id, name, owner_id) VALUES (1, 'Date night', 1);
+INSERT INTO restaurants (id, name, address, latitude, longitude, rating, price_range, cuisine_id, personal_notes, status, owner_id) VALUES
+    (1, 'Thai Palace', '1 Main St', 40.75, -73.99, 4, '$$', 1, 'Green curry', 'Visited', 1),
+    (2, 'Slice', '2 Main St', 40.76, -73.98, NULL, '$', 2, NULL, 'Want to go', 1),
+    (3, 'Nowhere', '', NULL, NULL, NULL, '', NULL, NULL, 'Want to go', 1);
+INSERT INTO restaurant_groups (restaurant_id, group_id) VALUES (1, 1);
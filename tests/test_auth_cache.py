@@ -0,0 +1,61 @@
+"""The principal cache in front of token verification."""
+import auth_cache
+import main
+import models
+from database import SessionLocal
+
+
+def signed_in(login, username):
+    client = login(username)
+    assert client.get("/api/users/me").status_code == 200
+    token = client.cookies["access_token"]
+    assert auth_cache.get(token) is not None
+    return client, token
+
+
+def change_user(current_name, **values):
+    with SessionLocal() as db:
+        user = db.query(models.User).filter(models.User.username == current_name).one()
+        for key, value in values.items():
+            setattr(user, key, value)
+        db.commit()
+
+
+def test_cached_after_first_request(login):
+    client, token = signed_in(login, "auth-cache-user")
+    hits = auth_cache.stats()["hits"]
+    assert client.get("/api/users/me").json()["username"] == "auth-cache-user"
+    assert auth_cache.stats()["hits"] == hits + 1
+
+
+def test_logout_drops_the_token(login):
+    client, token = signed_in(login, "auth-cache-logout-user")
+    _, other_token = signed_in(login, "auth-cache-bystander")
+    assert client.post("/api/logout").status_code == 200
+    assert auth_cache.get(token) is None
+    assert auth_cache.get(other_token) is not None
+
+
+def test_password_change_drops_the_users_tokens(login):
+    client, token = signed_in(login, "auth-cache-password-user")
+    _, other_token = signed_in(login, "auth-cache-bystander")
+    change_user("auth-cache-password-user", hashed_password=main.get_password_hash("new-password"))
+    assert auth_cache.get(token) is None
+    assert auth_cache.get(other_token) is not None
+
+
+def test_rename_drops_the_old_name(login):
+    client, token = signed_in(login, "auth-cache-old-name")
+    change_user("auth-cache-old-name", username="auth-cache-new-name")
+    assert auth_cache.get(token) is None
+    # The token names the old user, who no longer exists
+    assert client.get("/api/users/me").status_code == 401
+
+
+def test_deleting_the_user_drops_their_tokens(login):
+    client, token = signed_in(login, "auth-cache-deleted-user")
+    with SessionLocal() as db:
+        db.delete(db.query(models.User).filter(models.User.username == "auth-cache-deleted-user").one())
+        db.commit()
+    assert auth_cache.get(token) is None
+    assert client.get("/api/users/me").status_code == 401
@@ -0,0 +1,68 @@
+"""/api/admin/backup: full and incremental snapshots of the SQLite file."""
+import gzip
+import os
+import sqlite3
+
+import pytest
+
+import backup
+from database import engine
+
+pytestmark = pytest.mark.skipif(engine.dialect.name != "sqlite", reason="backups are SQLite only")
+
+
+@pytest.fixture
+def admin(login, tmp_path, monkeypatch):
+    monkeypatch.setattr(backup, "BACKUP_DIR", str(tmp_path / "manifests"))
+    return login("Adam", os.getenv("ADMIN_PASSWORD", "admin"))
+
+
+def download(client, since=None):
+    response = client.get("/api/admin/backup", params={"since": since} if since else {})
+    assert response.status_code == 200, response.text
+    return response.headers["X-Backup-Id"], response.headers["X-Backup-Kind"], gzip.decompress(response.content)
+
+
+def dump(path):
+    conn = sqlite3.connect(path)
+    try:
+        assert conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+        return list(conn.iterdump())
+    finally:
+        conn.close()
+
+
+def test_full_backup_plus_delta_restores_the_source(admin, login, tmp_path):
+    backup_id, kind, full = download(admin)
+    assert kind == "full"
+    base = tmp_path / "base.db"
+    base.write_bytes(full)
+    assert dump(base) == dump(engine.url.database)
+
+    client = login("backup-user")
+    for i in range(50):
+        response = client.post("/api/restaurants", json={
+            "name": f"Backup {i}", "address": "x" * 200, "latitude": 40, "longitude": -74, "price_range": "$",
+            "status": "Visited", "rating": 3, "cuisine_ids": [], "group_ids": [],
+        })
+        assert response.status_code == 200, response.text
+
+    delta_id, kind, delta = download(admin, since=backup_id)
+    assert kind == "incremental"
+    # Only the changed pages travel
+    assert len(delta) < len(full)
+    (tmp_path / "delta.bin").write_bytes(delta)
+    restored = tmp_path / "restored.db"
+    assert backup.apply_delta(base, tmp_path / "delta.bin", restored) == delta_id
+    assert dump(restored) == dump(engine.url.database)
+
+
+def test_unknown_base_is_404(admin):
+    assert admin.get("/api/admin/backup", params={"since": "no-such-backup"}).status_code == 404
+
+
+def test_interrupted_download_is_not_a_base(admin):
+    backup_id, kind, chunks = backup.create_backup(engine.url.database)
+    next(chunks)
+    chunks.close()
+    assert backup.load_manifest(backup_id) is None
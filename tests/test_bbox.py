@@ -0,0 +1,81 @@
+"""Viewport queries: /api/restaurants?bbox= and the R*Tree behind them."""
+import pytest
+from sqlalchemy import text
+
+import spatial
+from database import SessionLocal, engine
+
+PLACES = [("Manhattan", 40.75, -73.99), ("Brooklyn", 40.65, -73.95), ("Boston", 42.36, -71.06),
+          ("Fiji", -17.7, 178.0), ("Samoa", -13.8, -172.1)]
+
+
+@pytest.fixture(scope="module")
+def client(login):
+    client = login("bbox-user")
+    for name, lat, lon in PLACES:
+        response = client.post("/api/restaurants", json={
+            "name": name, "address": "", "latitude": lat, "longitude": lon, "price_range": "$",
+            "status": "Visited", "rating": 3, "cuisine_ids": [], "group_ids": [],
+        })
+        assert response.status_code == 200, response.text
+    return client
+
+
+def in_box(client, bbox):
+    response = client.get("/api/restaurants", params={"bbox": bbox})
+    assert response.status_code == 200, response.text
+    return {r["name"] for r in response.json()}
+
+
+def rtree_row(restaurant_id):
+    with SessionLocal() as db:
+        return db.execute(
+            text("SELECT min_lon, min_lat FROM restaurant_rtree WHERE id = :id"), {"id": restaurant_id}
+        ).first()
+
+
+def test_ordinary_box(client):
+    assert in_box(client, "-74.1,40.6,-73.9,40.8") == {"Manhattan", "Brooklyn"}
+    assert in_box(client, "-74.1,40.7,-73.9,40.8") == {"Manhattan"}
+    assert in_box(client, "-180,-90,180,90") == {name for name, *_ in PLACES}
+    assert in_box(client, "0,0,1,1") == set()
+
+
+def test_box_crossing_the_antimeridian(client):
+    # minLon > maxLon: from 170E eastwards to 170W
+    assert in_box(client, "170,-20,-170,-10") == {"Fiji", "Samoa"}
+    assert in_box(client, "179,-20,-170,-10") == {"Samoa"}
+
+
+@pytest.mark.parametrize("bbox", ["1,2,3", "a,b,c,d", "-74,40,-73", "0,0,181,1", "0,50,1,40", "0,0,1,nan", "0,-91,1,0"])
+def test_invalid_box_is_400(client, bbox):
+    response = client.get("/api/restaurants", params={"bbox": bbox})
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("Invalid bbox")
+
+
+def test_parse_bbox():
+    assert spatial.parse_bbox("-74.1, 40.6, -73.9, 40.8") == (-74.1, 40.6, -73.9, 40.8)
+    with pytest.raises(ValueError):
+        spatial.parse_bbox("")
+
+
+@pytest.mark.skipif(not spatial.has_spatial_index(engine), reason="the R*Tree is SQLite only")
+def test_rtree_follows_updates_and_deletes(client):
+    restaurant = client.post("/api/restaurants", json={
+        "name": "Moving", "address": "", "latitude": 40.75, "longitude": -73.99, "price_range": "$",
+        "status": "Visited", "rating": 3, "cuisine_ids": [], "group_ids": [],
+    }).json()
+    assert tuple(rtree_row(restaurant["id"])) == pytest.approx((-73.99, 40.75), abs=1e-4)
+    assert "Moving" in in_box(client, "-74.1,40.7,-73.9,40.8")
+
+    response = client.put(f"/api/restaurants/{restaurant['id']}", json={
+        **restaurant, "latitude": 42.36, "longitude": -71.06, "cuisine_ids": [], "group_ids": [],
+    })
+    assert response.status_code == 200, response.text
+    assert tuple(rtree_row(restaurant["id"])) == pytest.approx((-71.06, 42.36), abs=1e-4)
+    assert "Moving" not in in_box(client, "-74.1,40.7,-73.9,40.8")
+    assert "Moving" in in_box(client, "-71.1,42.3,-71.0,42.4")
+
+    assert client.delete(f"/api/restaurants/{restaurant['id']}").status_code == 200
+    assert rtree_row(restaurant["id"]) is None
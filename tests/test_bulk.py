@@ -0,0 +1,154 @@
+"""Bulk import and export of restaurants."""
+import json
+
+import pytest
+
+
+@pytest.fixture
+def client(login, request):
+    # A fresh user per test, so each one imports into an empty list
+    return login(f"bulk-{request.node.name}"[:50])
+
+
+def upload(client, filename, body, format=None):
+    if not isinstance(body, (str, bytes)):
+        body = json.dumps(body)
+    params = {"format": format} if format else {}
+    response = client.post("/api/restaurants/bulk", params=params, files={"file": (filename, body)})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def restaurants(client):
+    response = client.get("/api/restaurants", params={"sort_by": "name", "limit": 100})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def summary(r):
+    return (
+        r["name"], r["address"], r["latitude"], r["longitude"], r["rating"], r["price_range"], r["status"],
+        r["personal_notes"], sorted(c["name"] for c in r["cuisines"]), sorted(g["name"] for g in r["groups"]),
+    )
+
+
+def point(lon, lat):
+    return {"type": "Point", "coordinates": [lon, lat]}
+
+
+def test_csv_import(client):
+    result = upload(client, "places.csv", (
+        "name,address,latitude,longitude,rating,price_range,status,personal_notes,cuisines,groups\n"
+        "Alpha,1 Main St,40.5,-74.25,4,$$,Visited,Good,Thai;Noodles,bulk-csv-group\n"
+        "Beta,,41,-73,,,,,,\n"
+        ",no name,41,-73,,,,,,\n"
+        "Gamma,,91,-73,,,,,,\n"
+    ))
+    assert result["imported"] == 2
+    assert result["skipped"] == 2
+    assert [e["row"] for e in result["errors"]] == [3, 4]
+
+    alpha, beta = restaurants(client)
+    assert summary(alpha) == ("Alpha", "1 Main St", 40.5, -74.25, 4, "$$", "Visited", "Good",
+                              ["Noodles", "Thai"], ["bulk-csv-group"])
+    assert summary(beta) == ("Beta", "", 41, -73, None, "", "Want to go", None, [], [])
+
+
+def test_geojson_import(client):
+    result = upload(client, "places.geojson", {"type": "FeatureCollection", "features": [
+        {"type": "Feature", "geometry": point(-74.25, 40.5), "properties": {
+            "name": "Alpha", "address": "1 Main St", "rating": 5, "price_range": "$", "status": "Favorite",
+            "cuisines": ["Thai"], "groups": [],
+        }},
+        {"type": "Feature", "geometry": point(-73, 41), "properties": {"name": "Beta", "status": "Nope"}},
+    ]})
+    assert result["imported"] == 1
+    assert result["errors"] == [{"row": 2, "error": "status must be one of Want to go, Visited, Favorite"}]
+    [alpha] = restaurants(client)
+    assert summary(alpha) == ("Alpha", "1 Main St", 40.5, -74.25, 5, "$", "Favorite", None, ["Thai"], [])
+
+
+def test_takeout_import(client):
+    # Current "Saved Places.json" shape
+    result = upload(client, "Saved Places.json", {"type": "FeatureCollection", "features": [
+        {"type": "Feature", "geometry": point(-74.25, 40.5), "properties": {
+            "location": {"name": "Alpha", "address": "1 Main St"}, "Comment": "Try the curry",
+        }},
+        # Places Takeout could not locate
+        {"type": "Feature", "geometry": point(0, 0), "properties": {"location": {"name": "Nowhere"}}},
+    ]}, format="takeout")
+    assert result["imported"] == 1
+    assert result["errors"] == [{"row": 2, "error": "missing coordinates"}]
+    [alpha] = restaurants(client)
+    assert summary(alpha) == ("Alpha", "1 Main St", 40.5, -74.25, None, "", "Want to go", "Try the curry", [], [])
+
+
+def test_legacy_takeout_import(client):
+    # Older shape: Title and Location.{Address, Geo Coordinates}, no geometry
+    result = upload(client, "Saved Places.json", {"type": "FeatureCollection", "features": [
+        {"type": "Feature", "properties": {
+            "Title": "Alpha",
+            "Location": {"Address": "1 Main St", "Geo Coordinates": {"Latitude": "40.5", "Longitude": "-74.25"}},
+        }},
+    ]})
+    assert result["imported"] == 1
+    [alpha] = restaurants(client)
+    assert summary(alpha)[:4] == ("Alpha", "1 Main St", 40.5, -74.25)
+
+
+def test_wrongly_typed_values_are_row_errors(client):
+    features = [
+        {"type": "Feature", "geometry": point(-73, 41), "properties": props}
+        for props in (
+            {"name": {"en": "Alpha"}},
+            {"name": "Beta", "address": ["1 Main St"]},
+            {"name": "Gamma", "cuisines": 5},
+            {"name": "Delta", "cuisines": [{"name": 7}], "rating": 1e400},
+            {"name": "Epsilon", "status": True},
+            {"name": "Zeta", "personal_notes": {}},
+            {"name": "Eta", "Location": "somewhere", "location": 3},
+        )
+    ]
+    features += [
+        {"type": "Feature", "geometry": point(-73, 41), "properties": "Theta"},
+        {"type": "Feature", "geometry": "nowhere", "properties": {"name": "Iota"}},
+        "Kappa",
+        {"type": "Feature", "geometry": point(-73, 41), "properties": {"name": 12345, "price_range": None}},
+    ]
+    result = upload(client, "places.geojson", {"type": "FeatureCollection", "features": features})
+    assert result["imported"] == 2  # Eta, and 12345 read as text
+    assert [e["row"] for e in result["errors"]] == [1, 2, 3, 4, 5, 6, 8, 9, 10]
+    assert {r["name"] for r in restaurants(client)} == {"Eta", "12345"}
+
+
+def test_malformed_files_are_rejected(client):
+    for body in ("{", '{"features": 5}', b"\xff\xfe{}"):
+        response = client.post("/api/restaurants/bulk", files={"file": ("places.json", body)})
+        assert response.status_code == 400, response.text
+
+
+@pytest.mark.parametrize("format", ["csv", "geojson", "takeout"])
+def test_export_then_reimport(login, format):
+    source = login(f"bulk-export-{format}")
+    result = upload(source, "places.csv", (
+        "name,address,latitude,longitude,rating,price_range,status,personal_notes,cuisines,groups\n"
+        f'Alpha,"1 Main St, NY",40.5,-74.25,4,$$,Visited,"Notes, with ""quotes""",Thai;Noodles,export-{format}\n'
+        "Beta,,41,-73,,,Favorite,,,\n"
+        "Gamma é,2 Rue,48.85,2.35,1,$,,Café,Thai,\n"
+    ))
+    assert result["imported"] == 3
+
+    exported = source.get("/api/restaurants/export", params={"format": format})
+    assert exported.status_code == 200, exported.text
+    target = login(f"bulk-reimport-{format}")
+    result = upload(target, f"export.{format}", exported.content, format=format)
+    assert result == {**result, "imported": 3, "skipped": 0, "errors": []}
+
+    before, after = restaurants(source), restaurants(target)
+    if format == "takeout":
+        # Takeout carries only the name, address, location and comment
+        before = [summary(r)[:4] + summary(r)[7:8] for r in before]
+        after = [summary(r)[:4] + summary(r)[7:8] for r in after]
+    else:
+        before, after = [summary(r) for r in before], [summary(r) for r in after]
+    assert after == before
@@ -0,0 +1,66 @@
+"""/api/restaurants/choose: random picks, plain or weighted."""
+from collections import Counter
+
+import pytest
+
+import spatial
+
+# (name, rating, status, latitude): "Far" sits about 70 miles north of the rest
+PLACES = [(f"Five {i}", 5, "Visited", 40.0) for i in range(3)] + [
+    ("One", 1, "Visited", 40.0),
+    ("Unrated", None, "Want to go", 40.0),
+    ("Far", 5, "Want to go", 41.0),
+]
+
+
+@pytest.fixture(scope="module")
+def client(login):
+    client = login("choose-user")
+    for name, rating, status, lat in PLACES:
+        response = client.post("/api/restaurants", json={
+            "name": name, "address": "1 Main St", "latitude": lat, "longitude": -74, "price_range": "$",
+            "status": status, "rating": rating, "cuisine_ids": [], "group_ids": [],
+        })
+        assert response.status_code == 200, response.text
+    # Someone else's restaurant must never be picked
+    login("choose-other-user").post("/api/restaurants", json={
+        "name": "Not mine", "address": "", "latitude": 40, "longitude": -74, "price_range": "$",
+        "status": "Visited", "rating": 5, "cuisine_ids": [], "group_ids": [],
+    })
+    return client
+
+
+def choose(client, **params):
+    response = client.get("/api/restaurants/choose", params=params)
+    assert response.status_code == 200, response.text
+    return [r["name"] for r in response.json()]
+
+
+def test_picks_are_distinct_and_filtered(client):
+    assert len(choose(client, n=3)) == 3
+    assert sorted(choose(client, n=50)) == sorted(name for name, *_ in PLACES)
+    assert set(choose(client, n=50, status="Want to go")) == {"Unrated", "Far"}
+    assert choose(client, n=5, min_rating=5, status="Want to go") == ["Far"]
+    assert choose(client, status="Favorite") == []
+
+
+def test_weighted_draws(client):
+    by_rating = Counter(choose(client, n=1, weight="rating", status="Visited")[0] for _ in range(150))
+    # Fives are drawn 5:1 against "One"
+    assert by_rating["One"] < min(by_rating[f"Five {i}"] for i in range(3))
+    by_distance = Counter(choose(client, n=1, weight="distance", lat=40, lon=-74, status="Want to go")[0] for _ in range(150))
+    assert by_distance["Unrated"] > by_distance["Far"] * 5
+
+
+def test_bad_weighting_is_400(client):
+    for params in ({"weight": "price"}, {"weight": "distance"}, {"weight": "distance", "lat": 40}):
+        assert client.get("/api/restaurants/choose", params=params).status_code == 400
+
+
+def test_probing_large_match_sets(client, monkeypatch):
+    # Past the threshold ids are probed at random rather than scanned
+    monkeypatch.setattr(spatial, "SCAN_THRESHOLD", 2)
+    for params in ({}, {"weight": "rating"}, {"weight": "distance", "lat": 40, "lon": -74}):
+        picks = choose(client, n=4, **params)
+        assert len(picks) == len(set(picks)) == 4
+        assert set(picks) <= {name for name, *_ in PLACES}
@@ -0,0 +1,20 @@
+"""Marker clusters from /api/restaurants/clusters."""
+
+
+def test_single_marker_carries_popup_fields(login):
+    client = login("cluster-user")
+    for name, lat in (("Lonely Diner", 10.0), ("Pair A", 50.0), ("Pair B", 50.00001)):
+        response = client.post("/api/restaurants", json={
+            "name": name, "address": f"{name} St", "latitude": lat, "longitude": 20.0, "price_range": "$",
+            "status": "Visited", "cuisine_ids": [], "group_ids": [],
+        })
+        assert response.status_code == 200, response.text
+
+    response = client.get("/api/restaurants/clusters", params={"zoom": 5})
+    assert response.status_code == 200, response.text
+    by_count = {c["count"]: c for c in response.json()}
+    assert by_count[2]["restaurant"] is None
+    single = by_count[1]["restaurant"]
+    assert single["id"] == by_count[1]["restaurant_id"]
+    assert (single["name"], single["address"], single["status"]) == ("Lonely Diner", "Lonely Diner St", "Visited")
+    assert (single["latitude"], single["longitude"]) == (10.0, 20.0)
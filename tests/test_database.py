@@ -0,0 +1,43 @@
+"""The SQLite and Postgres connection profiles in database.py."""
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+import database
+from database import engine, read_engine
+
+sqlite_only = pytest.mark.skipif(engine.dialect.name != "sqlite", reason="SQLite profile")
+
+
+@sqlite_only
+def test_sqlite_pragmas_applied():
+    for eng in (engine, read_engine):
+        settings = database.sqlite_settings(eng)
+        assert settings["journal_mode"] == "wal"
+        assert settings["busy_timeout"] == database.SQLITE_PRAGMAS["busy_timeout"]
+        assert settings["synchronous"] == 1  # NORMAL
+        assert settings["cache_size"] == database.SQLITE_PRAGMAS["cache_size"]
+        assert settings["temp_store"] == 2  # MEMORY
+    assert database.sqlite_settings(engine)["query_only"] == 0
+    assert database.sqlite_settings(read_engine)["query_only"] == 1
+
+
+@sqlite_only
+def test_sqlite_one_writer_and_a_reader_pool(app_client):
+    assert engine is not read_engine
+    assert engine.pool.size() == 1
+    assert read_engine.pool.size() == database.SQLITE_READ_POOL_SIZE
+    with read_engine.connect() as conn:
+        with pytest.raises(OperationalError, match="readonly"):
+            conn.execute(text("UPDATE users SET email = email"))
+
+
+@pytest.mark.skipif(engine.dialect.name != "postgresql", reason="Postgres profile; set TEST_DATABASE_URL")
+def test_postgres_settings_applied():
+    settings = database.postgres_settings(engine)
+    assert settings["statement_timeout"] == "15s"
+    assert settings["lock_timeout"] == "5s"
+    assert settings["idle_in_transaction_session_timeout"] == "1min"
+    with engine.connect() as conn:
+        assert conn.execute(text("SHOW application_name")).scalar() == database.PG_APPLICATION_NAME
+    assert engine.pool.size() == database.PG_POOL["pool_size"]
@@ -0,0 +1,71 @@
+"""Conditional GETs: ETags from data versions, and 304s."""
+import pytest
+
+
+@pytest.fixture(scope="module")
+def client(login):
+    return login("etag-user")
+
+
+def etag(client, path, **params):
+    response = client.get(path, params=params)
+    assert response.status_code == 200, response.text
+    assert response.headers["Cache-Control"] == "private, no-cache"
+    return response.headers["ETag"]
+
+
+def add_restaurant(client, name, group_ids=()):
+    response = client.post("/api/restaurants", json={
+        "name": name, "address": "1 Main St", "latitude": 40, "longitude": -74, "price_range": "$",
+        "status": "Visited", "rating": 3, "cuisine_ids": [], "group_ids": list(group_ids),
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_if_none_match_is_304(client):
+    add_restaurant(client, "Tagged")
+    for path in ("/api/restaurants", "/api/groups", "/api/cuisines", "/api/restaurants/nearby"):
+        params = {"lat": 40, "lon": -74} if path.endswith("nearby") else {}
+        tag = etag(client, path, **params)
+        response = client.get(path, params=params, headers={"If-None-Match": f'"other", {tag}'})
+        assert response.status_code == 304, path
+        assert response.content == b""
+        assert response.headers["ETag"] == tag
+        assert client.get(path, params=params, headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_tag_covers_the_query(client):
+    assert etag(client, "/api/restaurants", sort_by="rating") != etag(client, "/api/restaurants", sort_by="name")
+
+
+def test_tag_changes_after_a_write(client, login):
+    before = etag(client, "/api/restaurants")
+    # Another owner's writes leave it alone
+    add_restaurant(login("etag-other-user"), "Elsewhere")
+    assert etag(client, "/api/restaurants") == before
+    add_restaurant(client, "New")
+    assert etag(client, "/api/restaurants") != before
+
+
+def test_tag_changes_after_a_group_change(client):
+    group = client.post("/api/groups", json={"name": "etag-group"}).json()
+    assert client.put(f"/api/groups/{group['id']}", json={"name": "etag-group", "is_published": True}).status_code == 200
+    add_restaurant(client, "Grouped", [group["id"]])
+    clusters_path = f"/api/groups/{group['id']}/public/clusters"
+    groups, restaurants, clusters = etag(client, "/api/groups"), etag(client, "/api/restaurants"), etag(client, clusters_path, zoom=3)
+
+    response = client.put(f"/api/groups/{group['id']}", json={"name": "etag-group renamed", "is_published": True})
+    assert response.status_code == 200, response.text
+    assert etag(client, "/api/groups") != groups
+    # Restaurant JSON carries its groups' names
+    assert etag(client, "/api/restaurants") != restaurants
+    assert etag(client, clusters_path, zoom=3) != clusters
+
+
+def test_tag_changes_after_a_cuisine_change(client):
+    cuisines, restaurants = etag(client, "/api/cuisines"), etag(client, "/api/restaurants")
+    response = client.post("/api/cuisines", json={"name": "Etag cuisine"})
+    assert response.status_code == 200, response.text
+    assert etag(client, "/api/cuisines") != cuisines
+    assert etag(client, "/api/restaurants") != restaurants
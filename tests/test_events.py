@@ -0,0 +1,108 @@
+"""Live group updates: what a write sends to which viewers."""
+import asyncio
+import json
+
+import pytest
+
+import events
+from database import SessionLocal
+
+
+@pytest.fixture(scope="module")
+def owners(login):
+    alice, bob = login("events-alice"), login("events-bob")
+    groups = {
+        name: client.post("/api/groups", json={"name": name}).json()["id"]
+        for client, name in ((alice, "events-alice-a"), (alice, "events-alice-b"), (bob, "events-bob"))
+    }
+    return alice, bob, groups
+
+
+def restaurant(name, group_ids):
+    return {
+        "name": name, "address": "", "latitude": 40, "longitude": -74, "price_range": "$",
+        "status": "Visited", "rating": 3, "cuisine_ids": [], "group_ids": group_ids,
+    }
+
+
+def parse(chunk):
+    messages = []
+    for block in chunk.decode().strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        messages.append((fields["event"], json.loads(fields["data"])))
+    return messages
+
+
+def watch(group_ids, write):
+    """Open a stream per group, run `write` off the loop, and return what each stream received."""
+    async def scenario():
+        streams = {gid: events._stream(gid) for gid in group_ids}
+        for stream in streams.values():
+            assert await stream.__anext__() == events.READY
+        await asyncio.get_running_loop().run_in_executor(None, write)
+        # Delivery is scheduled on the loop after the commit; let it run
+        await asyncio.sleep(0.05)
+        received = {}
+        for gid, stream in streams.items():
+            subscriber = next(iter(events._channels.get(gid, ())), None)
+            if subscriber is None or subscriber.pending or subscriber.closed:
+                received[gid] = parse(await asyncio.wait_for(stream.__anext__(), 5))
+            else:
+                received[gid] = []
+            await stream.aclose()
+        return received
+    return asyncio.run(scenario())
+
+
+def test_write_reaches_its_groups_viewers_only(owners):
+    alice, bob, groups = owners
+    a, b, other = groups["events-alice-a"], groups["events-alice-b"], groups["events-bob"]
+
+    created = {}
+
+    def write():
+        response = alice.post("/api/restaurants", json=restaurant("Live", [a]))
+        assert response.status_code == 200, response.text
+        created.update(response.json())
+
+    received = watch([a, b, other], write)
+    [(name, data)] = received[a]
+    assert name == "change"
+    assert [r["name"] for r in data["upserted"]] == ["Live"] and data["removed"] == []
+    # Same owner, another group; and another owner's group
+    assert received[b] == []
+    assert received[other] == []
+    assert events._channels.get(a) is None
+
+    # Moving it between groups: removed from one, upserted in the other
+    def move():
+        response = alice.put(f"/api/restaurants/{created['id']}", json=restaurant("Live moved", [b]))
+        assert response.status_code == 200, response.text
+
+    received = watch([a, b, other], move)
+    assert received[a] == [("change", {"upserted": [], "removed": [created["id"]]})]
+    assert [(name, [r["name"] for r in data["upserted"]]) for name, data in received[b]] == [("change", ["Live moved"])]
+    assert received[other] == []
+
+    received = watch([b], lambda: alice.delete(f"/api/restaurants/{created['id']}"))
+    assert received[b] == [("change", {"upserted": [], "removed": [created["id"]]})]
+
+
+def test_rollback_sends_nothing(owners):
+    alice, _, groups = owners
+    a = groups["events-alice-a"]
+
+    def write():
+        with SessionLocal() as db:
+            events.publish(db, [a], upserted=[1])
+            db.rollback()
+
+    assert watch([a], write)[a] == []
+
+
+def test_deleting_the_group_closes_its_streams(owners, login):
+    carol = login("events-carol")
+    gid = carol.post("/api/groups", json={"name": "events-carol"}).json()["id"]
+    received = watch([gid], lambda: carol.delete(f"/api/groups/{gid}"))
+    assert received[gid] == [("reset", {})]
+    assert gid not in events._channels
@@ -0,0 +1,97 @@
+"""Facet counts on /api/restaurants?with_facets=true."""
+from collections import Counter
+
+import pytest
+
+# name, status, price_range, rating, cuisines, groups
+PLACES = [
+    ("A", "Visited", "$", 5, ["Facet Thai"], ["facet-g1"]),
+    ("B", "Visited", "$$", 4, ["Facet Thai", "Facet Pizza"], ["facet-g1", "facet-g2"]),
+    ("C", "Favorite", "$$", 5, ["Facet Pizza"], []),
+    ("D", "Want to go", "$", None, [], ["facet-g2"]),
+    ("E", "Want to go", "$$$", 2, ["Facet Sushi"], ["facet-g1"]),
+    ("F", "Favorite", "$", 3, ["Facet Thai", "Facet Sushi"], []),
+    ("G", "Visited", "", 1, [], []),
+]
+
+
+@pytest.fixture(scope="module")
+def client(login):
+    client = login("facets-user")
+    cuisines = {name: client.post("/api/cuisines", json={"name": name}).json()["id"]
+                for name in {c for *_, cs, _ in PLACES for c in cs}}
+    groups = {name: client.post("/api/groups", json={"name": name}).json()["id"]
+              for name in {g for *_, gs in PLACES for g in gs}}
+    for name, status, price, rating, cs, gs in PLACES:
+        response = client.post("/api/restaurants", json={
+            "name": name, "address": "", "latitude": 40, "longitude": -74, "price_range": price, "status": status,
+            "rating": rating, "cuisine_ids": [cuisines[c] for c in cs], "group_ids": [groups[g] for g in gs],
+        })
+        assert response.status_code == 200, response.text
+    client.ids = {"cuisine_id": cuisines, "group_id": groups}
+    return client
+
+
+def listing(client, params):
+    response = client.get("/api/restaurants", params=params)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def check_counts(client, params):
+    """Every facet's counts equal the size of the listing with that facet's filter set to the value."""
+    result = listing(client, {**params, "with_facets": "true"})
+    assert result["restaurants"] == listing(client, params)
+
+    for facet, counts in result["facets"].items():
+        others = {k: v for k, v in params.items() if k != ("min_rating" if facet == "rating" else facet)}
+        if facet == "rating":
+            # The rating filter is a minimum, so count the listing by exact rating
+            expected = Counter(r["rating"] for r in listing(client, others))
+            assert {c["value"]: c["count"] for c in counts} == dict(expected)
+            continue
+        assert counts, facet
+        for entry in counts:
+            assert entry["count"] == len(listing(client, {**others, facet: [entry["value"]]})), (facet, entry)
+        if facet in ("status", "price_range"):
+            # Every row has exactly one value
+            assert sum(c["count"] for c in counts) == len(listing(client, others))
+    return result
+
+
+def test_counts_without_filters(client):
+    facets = check_counts(client, {})["facets"]
+    assert {c["value"]: c["count"] for c in facets["status"]} == {"Visited": 3, "Favorite": 2, "Want to go": 2}
+    thai = client.ids["cuisine_id"]["Facet Thai"]
+    assert {c["value"]: c["count"] for c in facets["cuisine_id"]}[thai] == 3
+
+
+def test_counts_with_one_filter(client):
+    result = check_counts(client, {"status": ["Visited"]})
+    assert {r["name"] for r in result["restaurants"]} == {"A", "B", "G"}
+    # A facet's own filter does not narrow its counts
+    assert len(result["facets"]["status"]) == 3
+
+
+@pytest.mark.parametrize("keys", [
+    ("status", "price_range"),
+    ("cuisine_id", "group_id"),
+    ("status", "min_rating"),
+    ("price_range", "cuisine_id", "group_id"),
+    ("status", "price_range", "cuisine_id", "group_id", "min_rating"),
+])
+def test_counts_with_combined_filters(client, keys):
+    filters = {
+        "status": ["Visited", "Favorite"],
+        "price_range": ["$", "$$"],
+        "cuisine_id": [client.ids["cuisine_id"]["Facet Thai"], client.ids["cuisine_id"]["Facet Pizza"]],
+        "group_id": [client.ids["group_id"]["facet-g1"]],
+        "min_rating": 4,
+    }
+    check_counts(client, {key: filters[key] for key in keys})
+
+
+def test_all_filters_together(client):
+    thai = client.ids["cuisine_id"]["Facet Thai"]
+    result = check_counts(client, {"status": ["Visited", "Favorite"], "price_range": ["$", "$$"], "cuisine_id": [thai], "min_rating": 4})
+    assert {r["name"] for r in result["restaurants"]} == {"A", "B"}
@@ -0,0 +1,68 @@
+"""The bounded password hashing pool and login rehashing."""
+import asyncio
+import threading
+
+from passlib.hash import pbkdf2_sha256
+
+import hashing
+import models
+from database import SessionLocal
+
+
+def test_login_refused_with_503_when_queue_is_full(app_client, login, monkeypatch):
+    login("hashing-busy-user")
+    monkeypatch.setattr(hashing, "HASH_QUEUE_LIMIT", 0)
+    rejected = hashing.stats()["rejected"]
+    response = app_client.post("/api/token", data={"username": "hashing-busy-user", "password": "test-password"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(hashing.RETRY_AFTER_SECONDS)
+    assert hashing.stats()["rejected"] == rejected + 1
+
+
+def test_cancelled_wait_keeps_slot_until_hash_ends(monkeypatch):
+    monkeypatch.setattr(hashing, "HASH_QUEUE_LIMIT", 1)
+    started, release = threading.Event(), threading.Event()
+
+    def slow_hash():
+        started.set()
+        release.wait(5)
+        return "done"
+
+    async def scenario():
+        waiter = asyncio.ensure_future(hashing._run(slow_hash))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        # The client is gone but the hash is still running: no slot to spare
+        assert hashing.stats()["in_flight"] == 1
+        try:
+            await hashing._run(str)
+            raise AssertionError("expected Overloaded")
+        except hashing.Overloaded:
+            pass
+        release.set()
+        for _ in range(100):
+            if hashing.stats()["in_flight"] == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert hashing.stats()["in_flight"] == 0
+        assert await hashing._run(str, 1) == "1"
+
+    asyncio.run(scenario())
+
+
+def test_login_rehashes_outdated_hash(app_client):
+    old_hash = pbkdf2_sha256.using(rounds=1000).hash("test-password")
+    with SessionLocal() as db:
+        db.add(models.User(username="hashing-rehash-user", hashed_password=old_hash))
+        db.commit()
+    rehashed = hashing.stats()["rehashed"]
+
+    response = app_client.post("/api/token", data={"username": "hashing-rehash-user", "password": "test-password"})
+    assert response.status_code == 200, response.text
+    with SessionLocal() as db:
+        stored = db.query(models.User).filter(models.User.username == "hashing-rehash-user").one().hashed_password
+    assert stored != old_hash
+    assert pbkdf2_sha256.from_string(stored).rounds == hashing.HASH_ROUNDS
+    assert pbkdf2_sha256.verify("test-password", stored)
+    assert hashing.stats()["rehashed"] == rehashed + 1
@@ -0,0 +1,62 @@
+"""Listing endpoints run a fixed number of queries however many rows they return."""
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import response_cache
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+@pytest.fixture
+def count_queries():
+    counter = QueryCounter()
+    # On the Engine class, so the writer and the reader pool are both counted
+    event.listen(Engine, "before_cursor_execute", counter)
+    yield counter
+    event.remove(Engine, "before_cursor_execute", counter)
+
+
+def seed(client, label, n):
+    """n restaurants, each with two cuisines, all in one published and shared group."""
+    cuisines = [client.post("/api/cuisines", json={"name": f"{label} cuisine {i}"}).json()["id"] for i in range(2)]
+    group = client.post("/api/groups", json={"name": f"{label} group", "is_published": True}).json()
+    client.put(f"/api/groups/{group['id']}", json={"name": f"{label} group", "is_published": True})
+    for i in range(n):
+        response = client.post("/api/restaurants", json={
+            "name": f"{label} {i}", "address": f"{i} Main St", "latitude": 40 + i / 1000, "longitude": -74,
+            "price_range": "$$", "status": "Visited", "rating": 4,
+            "cuisine_ids": cuisines, "group_ids": [group["id"]],
+        })
+        assert response.status_code == 200, response.text
+    token = client.post(f"/api/groups/{group['id']}/share").json()["share_token"]
+    return {
+        "/api/restaurants": client,
+        f"/api/share/{token}": client,
+        f"/api/groups/{group['id']}/public": client,
+    }
+
+
+def queries_per_listing(count_queries, urls, expected_rows):
+    counts = {}
+    for url, client in urls.items():
+        # Shared and public lists of one group share a cache entry; measure the build
+        response_cache.clear()
+        count_queries.count = 0
+        response = client.get(url)
+        assert response.status_code == 200, response.text
+        assert len(response.json()) == expected_rows
+        counts[url.split("/")[2]] = count_queries.count
+    return counts
+
+
+def test_query_count_does_not_grow_with_rows(login, count_queries):
+    small = seed(login("listing-small"), "small", 1)
+    large = seed(login("listing-large"), "large", 50)
+    assert queries_per_listing(count_queries, small, 1) == queries_per_listing(count_queries, large, 50)
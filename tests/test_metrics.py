@@ -0,0 +1,61 @@
+"""/metrics access and what the request metrics count."""
+import asyncio
+import re
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+import main
+import metrics
+
+
+def gauge(name):
+    return float(re.search(rf"^{name} (\S+)$", metrics.render(), re.M).group(1))
+
+
+def test_metrics_are_loopback_only_by_default(app_client):
+    assert app_client.get("/metrics").status_code == 403
+    local = TestClient(main.app, client=("127.0.0.1", 50000))
+    response = local.get("/metrics")
+    assert response.status_code == 200
+    assert "foodmapper_http_requests_total" in response.text
+
+
+def test_metrics_token(app_client, monkeypatch):
+    monkeypatch.setattr(main, "METRICS_TOKEN", "scrape-me")
+    assert app_client.get("/metrics").status_code == 401
+    # The token is required even from loopback once it is set
+    assert TestClient(main.app, client=("127.0.0.1", 50000)).get("/metrics").status_code == 401
+    response = app_client.get("/metrics", headers={"Authorization": "Bearer scrape-me"})
+    assert response.status_code == 200
+
+
+def test_event_streams_are_not_in_flight_requests():
+    opened, finish = asyncio.Event(), asyncio.Event()
+
+    async def stream(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"text/event-stream")]})
+        opened.set()
+        await finish.wait()
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def ignore(message):
+        pass
+
+    async def scenario():
+        in_flight, streams = gauge("foodmapper_http_requests_in_flight"), gauge("foodmapper_http_streams_open")
+        scope = {"type": "http", "method": "GET", "path": "/stream-test", "route": SimpleNamespace(path="/stream-test")}
+        task = asyncio.ensure_future(metrics.MetricsMiddleware(stream)(scope, None, ignore))
+        await opened.wait()
+        assert gauge("foodmapper_http_requests_in_flight") == in_flight
+        assert gauge("foodmapper_http_streams_open") == streams + 1
+        finish.set()
+        await task
+        assert gauge("foodmapper_http_streams_open") == streams
+
+    asyncio.run(scenario())
+    text = metrics.render()
+    # Counted as a request, but not timed
+    assert 'foodmapper_http_requests_total{method="GET",route="/stream-test",status="200"} 1' in text
+    assert 'foodmapper_http_request_duration_seconds_count{method="GET",route="/stream-test"}' not in text
@@ -0,0 +1,59 @@
+"""migrations.run() on a database from before versioned migrations."""
+import os
+import sqlite3
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+import migrations
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "baseline.sql")
+
+
+@pytest.fixture
+def baseline(tmp_path):
+    path = tmp_path / "baseline.db"
+    with sqlite3.connect(path) as conn:
+        with open(FIXTURE) as f:
+            conn.executescript(f.read())
+    engine = create_engine(f"sqlite:///{path}")
+    yield engine
+    engine.dispose()
+
+
+def test_baseline_migrates_to_latest(baseline):
+    assert migrations.run(baseline) == migrations.LATEST
+    with baseline.connect() as conn:
+        assert migrations.current_version(conn) == migrations.LATEST
+        versions = conn.execute(text("SELECT version FROM schema_version ORDER BY version")).scalars().all()
+        assert versions == [number for number, _, _ in migrations.MIGRATIONS]
+
+        assert "is_published" in {c["name"] for c in inspect(conn).get_columns("groups")}
+        # Legacy single cuisines became links
+        links = conn.execute(text("SELECT restaurant_id, cuisine_id FROM restaurant_cuisines ORDER BY restaurant_id")).all()
+        assert [tuple(link) for link in links] == [(1, 1), (2, 2)]
+        # The location indexes cover the existing rows
+        assert conn.execute(text("SELECT id FROM restaurant_rtree ORDER BY id")).scalars().all() == [1, 2]
+        fts = conn.execute(text("SELECT rowid FROM restaurant_fts WHERE restaurant_fts MATCH 'curry'")).scalars().all()
+        assert fts == [1]
+        # Markers for the owner's two located restaurants
+        markers = conn.execute(text("SELECT sum(count) FROM marker_clusters WHERE scope = 'owner' AND zoom = 0")).scalar()
+        assert markers == 2
+        # Existing rows reach replicas through their first full sync
+        assert conn.execute(text("SELECT DISTINCT change_seq FROM restaurants")).scalars().all() == [0]
+
+    # Nothing left to do the second time
+    assert migrations.run(baseline) == 0
+
+
+def test_partly_migrated_database_resumes(baseline):
+    with baseline.begin() as conn:
+        conn.execute(text(migrations.SCHEMA_VERSION_DDL))
+    # Apply the first four by hand, as an older release would have
+    with migrations.migration_lock(baseline):
+        for number, name, migrate in migrations.MIGRATIONS[:4]:
+            with baseline.begin() as conn:
+                migrate(conn)
+                conn.execute(text("INSERT INTO schema_version VALUES (:v, :n, 'then')"), {"v": number, "n": name})
+    assert migrations.run(baseline) == migrations.LATEST - 4
+    assert migrations.run(baseline) == 0
@@ -0,0 +1,85 @@
+"""spatial.nearest and /api/restaurants/nearby."""
+import pytest
+
+import models
+import spatial
+from database import SessionLocal, engine
+
+MILES_PER_DEGREE = spatial.EARTH_RADIUS_MILES * 3.141592653589793 / 180
+# Due north of (40, -74), this many miles away
+NORTH = [0.5, 3, 12, 50, 400]
+# On the equator either side of the antimeridian
+DATELINE = [("East of line", 179.95), ("West of line", -179.95), ("Further west", -179.5), ("Further east", 179.0)]
+
+
+@pytest.fixture(scope="module")
+def client(login):
+    client = login("nearest-user")
+    places = [(f"{m} north", 40 + m / MILES_PER_DEGREE, -74) for m in NORTH] + [(name, 0, lon) for name, lon in DATELINE]
+    for name, lat, lon in places:
+        response = client.post("/api/restaurants", json={
+            "name": name, "address": "", "latitude": lat, "longitude": lon, "price_range": "$",
+            "status": "Visited", "rating": 3, "cuisine_ids": [], "group_ids": [],
+        })
+        assert response.status_code == 200, response.text
+    return client
+
+
+@pytest.fixture(params=["scan", "index"])
+def search(request, client, monkeypatch):
+    """nearest() for the test user, by straight scan or through the spatial index."""
+    if request.param == "index":
+        monkeypatch.setattr(spatial, "SCAN_THRESHOLD", 0)
+    with SessionLocal() as db:
+        owner_id = db.query(models.User.id).filter(models.User.username == "nearest-user").scalar()
+
+    def nearest(lat, lon, k, **kwargs):
+        with SessionLocal() as db:
+            hits = spatial.nearest(db, engine, [models.Restaurant.owner_id == owner_id], lat, lon, k, **kwargs)
+            names = dict(db.query(models.Restaurant.id, models.Restaurant.name).filter(models.Restaurant.owner_id == owner_id))
+        return [(names[rid], round(miles, 1)) for rid, miles in hits]
+    nearest.indexed = request.param == "index"
+    return nearest
+
+
+def test_radius_grows_until_k_found(search, monkeypatch):
+    radii = []
+    radius_bbox = spatial.radius_bbox
+    monkeypatch.setattr(spatial, "radius_bbox", lambda lat, lon, miles: radii.append(miles) or radius_bbox(lat, lon, miles))
+
+    assert search(40, -74, 3) == [("0.5 north", 0.5), ("3 north", 3.0), ("12 north", 12.0)]
+    # 1 mile finds one, 4 two, 16 the third
+    assert radii == ([1.0, 4.0, 16.0] if search.indexed else [])
+    assert [name for name, _ in search(40, -74, 5)] == [f"{m} north" for m in NORTH]
+
+
+def test_max_miles_caps_the_search(search):
+    assert search(40, -74, 5, max_miles=20) == [("0.5 north", 0.5), ("3 north", 3.0), ("12 north", 12.0)]
+    assert search(40, -74, 5, max_miles=0.1) == []
+
+
+def test_search_crosses_the_antimeridian(search):
+    hits = search(0, 179.99, 3)
+    assert [name for name, _ in hits] == ["East of line", "West of line", "Further west"]
+    assert hits[1][1] == pytest.approx(0.06 * MILES_PER_DEGREE, abs=0.1)
+
+
+def test_radius_bbox():
+    # Splits across the antimeridian: min_lon > max_lon
+    min_lon, min_lat, max_lon, max_lat = spatial.radius_bbox(0, 179.9, 20)
+    assert min_lon > max_lon
+    assert min_lon == pytest.approx(179.9 - 20 / MILES_PER_DEGREE, abs=1e-3)
+    assert max_lon == pytest.approx(-180 + (20 / MILES_PER_DEGREE - 0.1), abs=1e-3)
+    assert spatial._lon_ranges(min_lon, max_lon) == [(min_lon, 180.0), (-180.0, max_lon)]
+    # Near a pole every longitude is in range
+    assert spatial.radius_bbox(89.9, 10, 20)[::2] == (-180.0, 180.0)
+    # Ordinary boxes are symmetric around the point
+    min_lon, min_lat, max_lon, max_lat = spatial.radius_bbox(40, -74, 10)
+    assert min_lon < -74 < max_lon and (min_lon + max_lon) / 2 == pytest.approx(-74)
+    assert (max_lat - min_lat) / 2 == pytest.approx(10 / MILES_PER_DEGREE)
+
+
+def test_nearby_endpoint(client):
+    response = client.get("/api/restaurants/nearby", params={"lat": 40, "lon": -74, "k": 2, "max_miles": 100})
+    assert response.status_code == 200, response.text
+    assert [(r["name"], r["distance_miles"]) for r in response.json()] == [("0.5 north", 0.5), ("3 north", 3.0)]
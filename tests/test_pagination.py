@@ -0,0 +1,86 @@
+"""Keyset pagination of /api/restaurants."""
+import base64
+import json
+
+import pytest
+
+RATINGS = [5, None, 3, 5, 1, None, 4, 3, None, 2, 5, None]
+
+
+@pytest.fixture(scope="module")
+def client(login):
+    client = login("paging-user")
+    # Repeated names and ratings, so pages break inside runs of equal keys
+    for i, rating in enumerate(RATINGS):
+        response = client.post("/api/restaurants", json={
+            "name": "ABC"[i % 3], "address": f"{i} St", "latitude": 40, "longitude": -74, "price_range": "$",
+            "status": "Visited", "rating": rating, "cuisine_ids": [], "group_ids": [],
+        })
+        assert response.status_code == 200, response.text
+    return client
+
+
+def cursor(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def all_pages(client, sort_by, limit):
+    ids, pages, next_cursor = [], 0, None
+    while True:
+        params = {"sort_by": sort_by, "limit": limit}
+        if next_cursor:
+            params["cursor"] = next_cursor
+        response = client.get("/api/restaurants", params=params)
+        assert response.status_code == 200, response.text
+        ids += [r["id"] for r in response.json()]
+        pages += 1
+        next_cursor = response.headers.get("X-Next-Cursor")
+        if not next_cursor:
+            return ids, pages
+
+
+@pytest.mark.parametrize("sort_by", ["name", "rating"])
+@pytest.mark.parametrize("limit", [1, 3, 5, len(RATINGS)])
+def test_pages_add_up_to_the_full_list(client, sort_by, limit):
+    full = [r["id"] for r in client.get("/api/restaurants", params={"sort_by": sort_by}).json()]
+    ids, pages = all_pages(client, sort_by, limit)
+    assert ids == full
+    assert pages == -(-len(RATINGS) // limit)
+
+
+def test_rating_sort_ends_with_the_unrated_block(client):
+    rows = client.get("/api/restaurants", params={"sort_by": "rating"}).json()
+    ratings = [r["rating"] for r in rows]
+    rated = sorted((r for r in RATINGS if r is not None), reverse=True)
+    assert ratings == rated + [None] * RATINGS.count(None)
+    # A cursor inside the unrated block only pages through what is left of it
+    unrated = [r["id"] for r in rows if r["rating"] is None]
+    response = client.get("/api/restaurants", params={
+        "sort_by": "rating", "limit": 10, "cursor": cursor(["rating", None, unrated[0]]),
+    })
+    assert [r["id"] for r in response.json()] == unrated[1:]
+
+
+@pytest.mark.parametrize("value", [
+    "zzz",
+    cursor(["name", [1, 2], 3]),
+    cursor(["name", {"a": 1}, 3]),
+    cursor(["name", 7, 3]),
+    cursor(["name", "A", "3"]),
+    cursor(["name", "A", True]),
+    cursor(["rating", "5", 3]),
+    cursor(["rating", [5], 3]),
+    cursor(["relevance", "A", 3]),
+    cursor(["name", "A"]),
+])
+def test_malformed_cursor_is_rejected(client, value):
+    for sort_by in ("name", "rating"):
+        response = client.get("/api/restaurants", params={"sort_by": sort_by, "limit": 2, "cursor": value})
+        assert response.status_code == 400, response.text
+
+
+def test_cursor_must_match_the_sort(client):
+    next_cursor = client.get("/api/restaurants", params={"limit": 2}).headers["X-Next-Cursor"]
+    response = client.get("/api/restaurants", params={"sort_by": "rating", "limit": 2, "cursor": next_cursor})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Cursor does not match sort_by"
@@ -0,0 +1,66 @@
+"""Public and share-link group lists served from the response cache."""
+import gzip
+
+import pytest
+
+import compression
+import response_cache
+
+
+@pytest.fixture(scope="module")
+def shared(login):
+    client = login("response-cache-user")
+    group = client.post("/api/groups", json={"name": "response-cache-group"}).json()
+    token = client.post(f"/api/groups/{group['id']}/share").json()["share_token"]
+    return client, group, f"/api/share/{token}"
+
+
+def add_restaurant(client, name, group_id):
+    response = client.post("/api/restaurants", json={
+        "name": name, "address": "1 Main St", "latitude": 40, "longitude": -74, "price_range": "$",
+        "status": "Visited", "rating": 3, "cuisine_ids": [], "group_ids": [group_id],
+    })
+    assert response.status_code == 200, response.text
+
+
+def get_raw(client, path, accept_encoding):
+    # Read the body as sent, without httpx decoding it
+    with client.stream("GET", path, headers={"Accept-Encoding": accept_encoding}) as response:
+        assert response.status_code == 200
+        return response, b"".join(response.iter_raw())
+
+
+def test_share_served_compressed_from_cache(app_client, shared):
+    client, group, path = shared
+    add_restaurant(client, "Cached", group["id"])
+    response_cache.clear()
+    before = response_cache.stats()
+
+    response, body = get_raw(app_client, path, "gzip, deflate")
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert b'"Cached"' in gzip.decompress(body)
+    response, again = get_raw(app_client, path, "gzip")
+    assert again == body
+    assert response_cache.stats()["hits"] == before["hits"] + 1
+
+    # Refused or not offered: sent as it is
+    for accept_encoding in ("gzip;q=0", "identity"):
+        response, plain = get_raw(app_client, path, accept_encoding)
+        assert "Content-Encoding" not in response.headers
+        assert plain == gzip.decompress(body)
+    if compression.brotli is not None:
+        assert get_raw(app_client, path, "gzip, br")[0].headers["Content-Encoding"] == "br"
+
+
+def test_share_dropped_when_version_bumped(app_client, shared):
+    client, group, path = shared
+    tag = app_client.get(path, headers={"Accept-Encoding": "gzip"}).headers["ETag"]
+    invalidations = response_cache.stats()["invalidations"]
+
+    add_restaurant(client, "Added later", group["id"])
+    assert response_cache.stats()["invalidations"] > invalidations
+    response = app_client.get(path, headers={"Accept-Encoding": "gzip", "If-None-Match": tag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != tag
+    assert "Added later" in {r["name"] for r in response.json()}
@@ -0,0 +1,35 @@
+"""Restaurant search on /api/restaurants."""
+import pytest
+
+
+@pytest.fixture(scope="module")
+def client(login):
+    client = login("search-user")
+    for name, address in (("Siam Garden", "1 Main St"), ("Joe's Pizza!!!", "2 Oak Ave"), ("Dosa - House", "3 Elm Rd")):
+        response = client.post("/api/restaurants", json={
+            "name": name, "address": address, "latitude": 40, "longitude": -74, "price_range": "$", "status": "Visited",
+            "cuisine_ids": [], "group_ids": [],
+        })
+        assert response.status_code == 200, response.text
+    return client
+
+
+def names(response):
+    assert response.status_code == 200, response.text
+    return sorted(r["name"] for r in response.json())
+
+
+def test_word_search(client):
+    assert names(client.get("/api/restaurants", params={"search": "siam"})) == ["Siam Garden"]
+
+
+@pytest.mark.parametrize("search, expected", [
+    ("!!!", ["Joe's Pizza!!!"]),
+    (" - ", ["Dosa - House"]),
+    ("???", []),
+])
+def test_search_without_words_still_filters(client, search, expected):
+    # Nothing here for the full-text index to match: it must not turn into "no filter"
+    assert names(client.get("/api/restaurants", params={"search": search})) == expected
+    page = client.get("/api/restaurants", params={"search": search, "limit": 10})
+    assert names(page) == expected
@@ -0,0 +1,116 @@
+"""/api/sync, the offline replica's delta feed."""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+import models
+import sync
+import versions
+from database import SessionLocal, engine
+
+
+@pytest.fixture(scope="module")
+def client(login):
+    return login("sync-user")
+
+
+def add_restaurant(client, name, group_ids=()):
+    response = client.post("/api/restaurants", json={
+        "name": name, "address": "1 Main St", "latitude": 40, "longitude": -74, "price_range": "$",
+        "status": "Visited", "rating": 3, "cuisine_ids": [], "group_ids": list(group_ids),
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def fetch(client, since=None):
+    response = client.get("/api/sync", params={} if since is None else {"since": since})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def ids(rows):
+    return {row["id"] for row in rows}
+
+
+def test_full_sync(client, login):
+    group = client.post("/api/groups", json={"name": "sync-full-group"}).json()
+    restaurant = add_restaurant(client, "Full", [group["id"]])
+    login("sync-other-user").post("/api/groups", json={"name": "sync-other-group"})
+
+    payload = fetch(client)
+    assert payload["reset"] is True
+    assert restaurant["id"] in ids(payload["restaurants"])
+    assert ids(payload["groups"]) >= {group["id"]}
+    assert "sync-other-group" not in {g["name"] for g in payload["groups"]}
+    [row] = [r for r in payload["restaurants"] if r["id"] == restaurant["id"]]
+    assert row["group_ids"] == [group["id"]]
+    assert fetch(client, payload["cursor"])["restaurants"] == []
+
+
+def test_delta_after_cursor(client):
+    old = add_restaurant(client, "Old")
+    cursor = fetch(client)["cursor"]
+    new = add_restaurant(client, "New")
+    response = client.put(f"/api/restaurants/{old['id']}", json={**old, "name": "Old renamed", "cuisine_ids": [], "group_ids": []})
+    assert response.status_code == 200, response.text
+
+    payload = fetch(client, cursor)
+    assert payload["reset"] is False
+    assert payload["cursor"] > cursor
+    assert ids(payload["restaurants"]) == {old["id"], new["id"]}
+    assert {r["name"] for r in payload["restaurants"]} == {"Old renamed", "New"}
+
+
+def test_tombstones_for_deletes_and_unlinks(client):
+    group = client.post("/api/groups", json={"name": "sync-unlink-group"}).json()
+    cuisine = client.post("/api/cuisines", json={"name": "Sync cuisine"}).json()
+    kept = add_restaurant(client, "Kept", [group["id"]])
+    doomed = add_restaurant(client, "Doomed")
+    cursor = fetch(client)["cursor"]
+
+    # Unlinking restamps the restaurant; its group_ids no longer list the group
+    response = client.put(f"/api/restaurants/{kept['id']}", json={**kept, "cuisine_ids": [], "group_ids": []})
+    assert response.status_code == 200, response.text
+    assert client.delete(f"/api/restaurants/{doomed['id']}").status_code == 200
+    assert client.delete(f"/api/groups/{group['id']}").status_code == 200
+    assert client.delete(f"/api/cuisines/{cuisine['id']}").status_code == 200
+
+    payload = fetch(client, cursor)
+    assert [r["group_ids"] for r in payload["restaurants"] if r["id"] == kept["id"]] == [[]]
+    assert payload["deleted"] == {"restaurants": [doomed["id"]], "cuisines": [cuisine["id"]], "groups": [group["id"]]}
+
+
+def test_number_is_taken_at_commit(client):
+    with SessionLocal() as db:
+        before = versions.current(db, sync.SYNC)[0]
+        db.add(models.Cuisine(name="Sync pending cuisine"))
+        db.flush()
+        # Flushed but not committed: the counter is untouched (and unlocked)
+        assert versions.current(db, sync.SYNC)[0] == before
+        db.commit()
+        cuisine = db.query(models.Cuisine).filter(models.Cuisine.name == "Sync pending cuisine").one()
+        assert cuisine.change_seq == versions.current(db, sync.SYNC)[0] == before + 1
+
+
+def test_reset(client):
+    restaurant = add_restaurant(client, "Reset")
+    cursor = fetch(client)["cursor"]
+
+    # A cursor from another database (ahead of ours)
+    payload = fetch(client, cursor + 1000)
+    assert payload["reset"] is True
+    assert restaurant["id"] in ids(payload["restaurants"])
+
+    # A cursor older than the pruned tombstones
+    assert client.delete(f"/api/restaurants/{restaurant['id']}").status_code == 200
+    with SessionLocal() as db:
+        db.execute(update(models.Tombstone).values(deleted_at=datetime.utcnow() - timedelta(days=sync.TOMBSTONE_DAYS + 1)))
+        db.commit()
+    assert sync.prune_tombstones(engine) > 0
+    payload = fetch(client, cursor)
+    assert payload["reset"] is True
+    assert restaurant["id"] not in ids(payload["restaurants"])
+    assert payload["deleted"] == {"restaurants": [], "cuisines": [], "groups": []}
+    assert fetch(client, payload["cursor"])["reset"] is False
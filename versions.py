@@ -0,0 +1,108 @@
+import hashlib
+
+from fastapi import HTTPException, Response
+from sqlalchemy import select, text, tuple_
+
+import models
+
+# The cuisine list is global and cuisine names appear in every restaurant
+CUISINES = ("cuisines", 0)
+# The published-groups directory
+PUBLIC_GROUPS = ("public", 0)
+
+BUMP_SQL = text("""
+    INSERT INTO data_versions (scope, scope_id, version) VALUES (:scope, :scope_id, 1)
+    ON CONFLICT (scope, scope_id) DO UPDATE SET version = data_versions.version + 1
+""")
+
+
+# Called with the bumped (scope, scope_id) keys, e.g. to drop cached responses
+bump_listeners = []
+
+
+def bump(db, *scopes):
+    """Advance the version of each (scope, scope_id) inside the caller's transaction."""
+    keys = {(scope, scope_id) for scope, scope_id in scopes if scope_id is not None}
+    if keys:
+        db.execute(BUMP_SQL, [{"scope": scope, "scope_id": scope_id} for scope, scope_id in sorted(keys)])
+        for listener in bump_listeners:
+            listener(keys)
+
+
+def bump_groups(db, group_ids):
+    bump(db, *[("group", gid) for gid in group_ids])
+
+
+def bump_group_neighbours(db, group_id):
+    """Bump a group and every group sharing a restaurant with it.
+
+    Restaurant JSON lists all of a restaurant's groups, so renaming or
+    (un)publishing one group changes the payload of the others too.
+    Returns the neighbours.
+    """
+    rg = models.restaurant_groups
+    members = select(rg.c.restaurant_id).where(rg.c.group_id == group_id)
+    neighbours = set(db.execute(select(rg.c.group_id).where(rg.c.restaurant_id.in_(members)).distinct()).scalars())
+    bump_groups(db, {group_id, *neighbours})
+    neighbours.discard(group_id)
+    return neighbours
+
+
+def current(db, *scopes):
+    """Versions for `scopes` in one primary-key lookup (0 if never bumped)."""
+    V = models.DataVersion
+    rows = dict(
+        ((scope, scope_id), version)
+        for scope, scope_id, version in db.execute(
+            select(V.scope, V.scope_id, V.version).where(tuple_(V.scope, V.scope_id).in_(scopes))
+        )
+    )
+    return [rows.get(key, 0) for key in scopes]
+
+
+def etag(request, db, *scopes):
+    """Strong ETag for a response that depends only on `scopes` and the request.
+
+    Scope ids are part of the tag, so two users at the same version never
+    share one; the query string and Accept header cover different views
+    of the same data.
+    """
+    return make_etag(scopes, current(db, *scopes), request.url.query, request.headers.get("accept", ""))
+
+
+def make_etag(scopes, values, *extra):
+    parts = [f"{scope}:{scope_id}:{version}" for (scope, scope_id), version in zip(scopes, values)]
+    parts.extend(extra)
+    return '"' + hashlib.sha1("|".join(parts).encode()).hexdigest()[:20] + '"'
+
+
+def _client_has(request, tag):
+    candidates = request.headers.get("if-none-match")
+    if not candidates:
+        return False
+    return candidates.strip() == "*" or tag in [c.strip() for c in candidates.split(",")]
+
+
+def not_modified(request, tag, cache_control="private, no-cache"):
+    """A 304 if the client already holds `tag`, else None."""
+    if _client_has(request, tag):
+        return Response(status_code=304, headers={"ETag": tag, "Cache-Control": cache_control})
+    return None
+
+
+def check_etag(request, db, *scopes):
+    """etag() for `scopes`, raising a 304 if the client already holds it.
+
+    Handlers call this first and pass the tag to tagged() on the way out.
+    """
+    tag = etag(request, db, *scopes)
+    if _client_has(request, tag):
+        raise HTTPException(status_code=304, headers={"ETag": tag, "Cache-Control": "private, no-cache"})
+    return tag
+
+
+def tagged(response, tag):
+    # no-cache: the client may store it but must revalidate every time
+    response.headers["ETag"] = tag
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response